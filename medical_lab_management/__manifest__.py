@@ -45,6 +45,7 @@ Diagnosis → Printing → Signature → Completion
         'web',
         'report',
         'barcodes',
+        'bus',
     ],
     'data': [
         # Security
@@ -53,16 +54,22 @@ Diagnosis → Printing → Signature → Completion
         
         # Data
         'data/medical_lab_sequence.xml',
+        'data/medical_lab_cron.xml',
         'data/report_paperformat.xml',
         
         # Views
         'views/res_partner_views.xml',
+        'views/res_users_views.xml',
         'views/account_move_views.xml',
         'views/medical_lab_test_views.xml',
         'views/medical_lab_test_request_views.xml',
         'views/medical_lab_category_views.xml',
         'views/medical_lab_department_views.xml',
         'views/medical_lab_machine_views.xml',
+        'views/medical_lab_report_job_views.xml',
+        'views/medical_lab_tat_views.xml',
+        'views/medical_lab_critical_alert_views.xml',
+        'views/medical_lab_profiler_views.xml',
         'views/medical_lab_menus.xml',
         
         # Reports
@@ -73,6 +80,7 @@ Diagnosis → Printing → Signature → Completion
         
         # Wizards
         'wizard/sample_collection_wizard_view.xml',
+        'wizard/lab_batch_transition_wizard_view.xml',
     ],
     'demo': [
         'demo/medical_lab_demo.xml',
@@ -81,6 +89,8 @@ Diagnosis → Printing → Signature → Completion
         'web.assets_backend': [
             'medical_lab_management/static/src/scss/medical_lab.scss',
             'medical_lab_management/static/src/js/medical_lab_dashboard.js',
+            'medical_lab_management/static/src/js/medical_lab_offline.js',
+            'medical_lab_management/static/src/js/medical_lab_collection_station.js',
         ],
     },
     'installable': True,
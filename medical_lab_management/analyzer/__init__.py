@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Analyzer result ingestion (HL7 v2 ORU^R01 and ASTM E1394).
+
+The parsers are incremental: bytes are fed as they arrive from a socket or
+file and complete results are emitted as ``AnalyzerResult`` tuples, along
+with the acknowledgements the analyzer expects.
+"""
+
+from .common import AnalyzerResult
+from .hl7 import HL7Parser
+from .astm import ASTMParser
+
+PARSERS = {
+    'hl7': HL7Parser,
+    'astm': ASTMParser,
+}
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Incremental ASTM E1394 / LIS2-A2 parser."""
+
+from .common import AnalyzerResult
+
+ENQ, ACK, NAK, EOT = b'\x05', b'\x06', b'\x15', b'\x04'
+STX, ETX, ETB, CR, LF = b'\x02', b'\x03', b'\x17', b'\r', b'\n'
+
+
+class ASTMParser(object):
+    """Decode low-level ASTM frames and extract R records
+
+    Framed transmissions (ENQ, STX frames with checksums, EOT) are
+    acknowledged frame by frame; intermediate ETB frames are joined. Plain
+    record files (one record per line) are accepted as well.
+    """
+
+    def __init__(self, encoding='latin-1'):
+        self.encoding = encoding
+        self._buffer = b''
+        self._partial = b''
+        self._barcode = None
+        self._delimiters = ('|', '^')
+
+    def feed(self, data):
+        """Consume ``data``; return (results, replies) for complete records"""
+        self._buffer += data
+        results, replies = [], []
+        while self._buffer:
+            head = self._buffer[:1]
+            if head in (ENQ, EOT):
+                self._buffer = self._buffer[1:]
+                if head == ENQ:
+                    replies.append(ACK)
+                continue
+            if head == STX:
+                end = self._frame_end()
+                if end < 0:
+                    break
+                frame, self._buffer = self._buffer[:end], self._buffer[end:]
+                record = self._decode_frame(frame)
+                if record is None:
+                    replies.append(NAK)
+                    continue
+                replies.append(ACK)
+                if record:
+                    results.extend(self._parse_records(record))
+                continue
+            # Unframed record lines
+            end = self._line_end()
+            if end < 0:
+                break
+            line, self._buffer = self._buffer[:end], self._buffer[end:].lstrip(CR + LF)
+            results.extend(self._parse_records(line))
+        return results, replies
+
+    def close(self):
+        """Parse a trailing unterminated record line"""
+        data, self._buffer = self._buffer.strip(), b''
+        return self._parse_records(data) if data else []
+
+    def _frame_end(self):
+        """Index just past ``<ETX|ETB> C1 C2 CR LF`` or -1 when incomplete"""
+        positions = [p for p in (self._buffer.find(ETX), self._buffer.find(ETB)) if p >= 0]
+        if not positions or len(self._buffer) < min(positions) + 5:
+            return -1
+        return min(positions) + 5
+
+    def _line_end(self):
+        positions = [p for p in (self._buffer.find(CR), self._buffer.find(LF)) if p >= 0]
+        return min(positions) if positions else -1
+
+    def _decode_frame(self, frame):
+        """Return the record bytes completed by ``frame``, b'' for an ETB frame"""
+        marker_pos = max(frame.rfind(ETX), frame.rfind(ETB))
+        body = frame[1:marker_pos + 1]
+        checksum = frame[marker_pos + 1:marker_pos + 3]
+        if b'%02X' % (sum(body) % 256) != checksum.upper():
+            return None
+        text = body[1:-1]  # strip frame number and ETX/ETB
+        if frame[marker_pos:marker_pos + 1] == ETB:
+            self._partial += text
+            return b''
+        record, self._partial = self._partial + text, b''
+        return record
+
+    def _parse_records(self, data):
+        results = []
+        for line in data.decode(self.encoding).replace('\n', '\r').split('\r'):
+            line = line.strip()
+            if len(line) < 2:
+                continue
+            kind = line[0].upper()
+            if kind == 'H' and len(line) > 4:
+                # H|\^& : field, repeat, component and escape delimiters
+                self._delimiters = (line[1], line[3])
+                self._barcode = None
+                continue
+            field_sep, component = self._delimiters
+            fields = line.split(field_sep)
+            if kind == 'O' and len(fields) > 2:
+                # O-3 specimen id (O-2 as fallback), first component
+                specimens = [f.split(component)[0].strip() for f in fields[2:4]]
+                self._barcode = next((s for s in specimens if s), None)
+            elif kind == 'R' and self._barcode and len(fields) > 3:
+                # R-3 universal test id "^^^CODE"
+                code = next((c.strip() for c in reversed(fields[2].split(component)) if c.strip()), '')
+                if code:
+                    results.append(AnalyzerResult(
+                        self._barcode, code, fields[3].split(component)[0].strip(),
+                        fields[4] if len(fields) > 4 else '',
+                        fields[6] if len(fields) > 6 else '',
+                    ))
+            elif kind == 'L':
+                self._barcode = None
+        return results
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+# barcode: sample/visit barcode (AccountMove.barcode_id)
+# code: analyzer test code (MedicalLabTest.code)
+AnalyzerResult = namedtuple('AnalyzerResult', 'barcode code value unit flags')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Incremental HL7 v2 ORU^R01 parser with MLLP framing."""
+
+from .common import AnalyzerResult
+
+MLLP_START = b'\x0b'
+MLLP_END = b'\x1c\x0d'
+
+
+class HL7Parser(object):
+    """Split an MLLP byte stream into messages and extract OBX results
+
+    Streams without MLLP framing (plain file drops) are split on ``MSH``
+    segments instead; call ``close()`` to flush the last message.
+    """
+
+    def __init__(self, encoding='latin-1'):
+        self.encoding = encoding
+        self._buffer = b''
+
+    def feed(self, data):
+        """Consume ``data``; return (results, replies) for complete messages"""
+        results, replies = [], []
+        for message_results, control_id in self.feed_messages(data):
+            results.extend(message_results)
+            if control_id is not None:
+                replies.append(self.ack(control_id))
+        return results, replies
+
+    def feed_messages(self, data):
+        """Consume ``data``; return [(results, control id)] per complete message
+
+        Lets callers acknowledge each message only once its results are stored.
+        """
+        self._buffer += data
+        messages = []
+        while True:
+            message = self._next_message()
+            if message is None:
+                break
+            messages.append(self.parse_message(message))
+        return messages
+
+    def close(self):
+        """Parse whatever is left in the buffer (unframed file drops)"""
+        data, self._buffer = self._buffer.strip(MLLP_START + MLLP_END + b'\r\n'), b''
+        if not data:
+            return []
+        return self.parse_message(data.decode(self.encoding))[0]
+
+    def _next_message(self):
+        buffer = self._buffer
+        if buffer.lstrip(b'\r\n').startswith(MLLP_START):
+            end = buffer.find(MLLP_END)
+            if end < 0:
+                return None
+            start = buffer.find(MLLP_START)
+            self._buffer = buffer[end + len(MLLP_END):]
+            return buffer[start + 1:end].decode(self.encoding)
+        # Unframed: a message ends where the next MSH segment starts
+        end = min((p for p in (buffer.find(b'\rMSH'), buffer.find(b'\nMSH')) if p >= 0),
+                  default=-1)
+        if end < 0:
+            return None
+        self._buffer = buffer[end + 1:]
+        return buffer[:end].decode(self.encoding)
+
+    @staticmethod
+    def parse_message(message):
+        """Return (results, message control id) of one HL7 message"""
+        segments = [s for s in message.replace('\n', '\r').split('\r') if s.strip()]
+        if not segments or not segments[0].startswith('MSH'):
+            return [], None
+        sep = segments[0][3]
+        component = segments[0][4] if len(segments[0]) > 4 else '^'
+        msh = segments[0].split(sep)
+        # MSH-1 is the separator itself, so MSH-n sits at index n - 1
+        control_id = msh[9] if len(msh) > 9 else None
+
+        results = []
+        barcode = None
+        for segment in segments[1:]:
+            fields = segment.split(sep)
+            kind = fields[0]
+            if kind in ('OBR', 'SPM'):
+                # OBR-3 filler order / OBR-2 placer order, SPM-2 specimen id
+                candidates = fields[3:4] + fields[2:3] if kind == 'OBR' else fields[2:3]
+                for candidate in candidates:
+                    candidate = candidate.split(component)[0].strip()
+                    if candidate:
+                        barcode = candidate
+                        break
+            elif kind == 'OBX' and barcode and len(fields) > 5:
+                code = fields[3].split(component)[0].strip()
+                if code:
+                    results.append(AnalyzerResult(
+                        barcode, code, fields[5].strip(),
+                        fields[6].split(component)[0] if len(fields) > 6 else '',
+                        fields[8] if len(fields) > 8 else '',
+                    ))
+        return results, control_id
+
+    @staticmethod
+    def ack(control_id, code='AA'):
+        """MLLP framed acknowledgement for ``control_id``
+
+        ``code`` is AA (accepted), AE (error, resend) or AR (rejected).
+        """
+        message = f"MSH|^~\\&|LIS||ANALYZER||||ACK|{control_id}|P|2.5\rMSA|{code}|{control_id}\r"
+        return MLLP_START + message.encode('ascii', 'replace') + MLLP_END
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Batched, back-pressured result ingestion for analyzer connections."""
+
+import logging
+import queue
+import socket
+import threading
+import time
+
+from odoo import api, SUPERUSER_ID
+
+from . import PARSERS
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 65536
+
+
+class ResultIngestor(object):
+    """Commit analyzer results to the database in batched transactions
+
+    Readers ``submit`` parsed results into a bounded queue; a single writer
+    thread commits them every ``batch_size`` results or ``flush_interval``
+    seconds through ``medical.lab.machine._ingest_results``. When the queue
+    is full ``submit`` blocks, which stops the reader and pushes back on the
+    analyzer connection.
+
+    ``on_commit`` callbacks passed to ``submit`` run on the writer thread
+    with True once the submitted results are committed, False if their
+    batch failed. A batch holding a callback is committed as soon as the
+    queue is drained, without waiting for ``flush_interval``: the analyzer
+    sends nothing else until it gets its acknowledgement.
+    """
+
+    def __init__(self, registry, machine_id, batch_size=200, flush_interval=1.0,
+                 max_pending=5000):
+        self.registry = registry
+        self.machine_id = machine_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.stats = {'received': 0, 'matched': 0, 'unmatched': 0, 'failed': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='lab-analyzer-%s' % self.machine_id,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Commit everything still queued and stop the writer thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def submit(self, results, on_commit=None):
+        for result in results:
+            self.queue.put((result, None))
+            self.stats['received'] += 1
+        if on_commit:
+            # Queued after the results, so it lands in the batch of the last one
+            self.queue.put((None, on_commit))
+
+    def _run(self):
+        batch = []
+        waiting = False
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self.queue.empty() and not batch):
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0.01)))
+                # Take what is already queued so busy connections still share batches
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            waiting = waiting or any(callback for _result, callback in batch)
+            if batch and (waiting or len(batch) >= self.batch_size
+                          or time.monotonic() >= deadline or self._stop.is_set()):
+                self._commit(batch)
+                batch = []
+                waiting = False
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+    def _store(self, results):
+        """Store ``results`` in their own transaction; return the match stats"""
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            machine = env['medical.lab.machine'].browse(self.machine_id)
+            return machine._ingest_results(results)
+
+    def _commit(self, batch):
+        results = [result for result, _callback in batch if result is not None]
+        committed = True
+        try:
+            if results:
+                stats = self._store(results)
+                self.stats['matched'] += stats['matched']
+                self.stats['unmatched'] += stats['unmatched']
+        except Exception:
+            committed = False
+            self.stats['failed'] += len(results)
+            _logger.exception("Could not store %s analyzer results of machine %s",
+                              len(results), self.machine_id)
+        for _result, callback in batch:
+            if callback:
+                try:
+                    callback(committed)
+                except Exception:
+                    _logger.exception("Acknowledgement callback of machine %s failed",
+                                      self.machine_id)
+
+
+def ingest_stream(ingestor, stream, protocol, reply=None, ack_timeout=30):
+    """Feed a binary stream through a protocol parser into ``ingestor``
+
+    ``reply`` is called with each acknowledgement the analyzer expects.
+    HL7 application acknowledgements are only sent once the message's
+    results are committed (AA), or AE when their batch failed, so the
+    analyzer resends what was not stored. ASTM link-level ACK/NAK frames
+    confirm transmission only and are answered immediately.
+    """
+    parser = PARSERS[protocol]()
+    pending = []
+
+    def acknowledge(control_id):
+        done = threading.Event()
+        pending.append(done)
+
+        def on_commit(committed):
+            try:
+                reply(parser.ack(control_id, 'AA' if committed else 'AE'))
+            finally:
+                done.set()
+        return on_commit
+
+    while True:
+        data = stream.read(CHUNK_SIZE) if hasattr(stream, 'read') else stream.recv(CHUNK_SIZE)
+        if not data:
+            break
+        if reply and hasattr(parser, 'feed_messages'):
+            for results, control_id in parser.feed_messages(data):
+                ingestor.submit(results, acknowledge(control_id) if control_id is not None else None)
+            continue
+        results, replies = parser.feed(data)
+        ingestor.submit(results)
+        if reply:
+            for message in replies:
+                reply(message)
+    ingestor.submit(parser.close())
+    # Keep the connection open until every acknowledgement went out
+    for done in pending:
+        if not done.wait(ack_timeout):
+            _logger.warning("Gave up waiting for analyzer acknowledgements")
+            break
+
+
+def ingest_file(ingestor, path, protocol):
+    """Ingest a recorded or dropped message file"""
+    with open(path, 'rb') as stream:
+        ingest_stream(ingestor, stream, protocol)
+
+
+def serve(registry, machine_id, protocol, host='0.0.0.0', port=5000, **options):
+    """Listen for analyzer connections and ingest their results until interrupted
+
+    Typically started from ``odoo shell``::
+
+        from odoo.addons.medical_lab_management.analyzer.ingest import serve
+        serve(env.registry, machine.id, 'astm', port=machine.listen_port)
+    """
+    ingestor = ResultIngestor(registry, machine_id, **options).start()
+    server = socket.create_server((host, port))
+    _logger.info("Listening for %s results of machine %s on %s:%s", protocol, machine_id, host, port)
+    try:
+        while True:
+            conn, address = server.accept()
+            with conn:
+                # Acknowledgements are tiny; do not let Nagle delay them
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                _logger.info("Analyzer connected from %s:%s", *address[:2])
+                ingest_stream(ingestor, conn, protocol, reply=conn.sendall)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        ingestor.stop()
+    return ingestor.stats
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Replay recorded analyzer message files against a listening ingestor.
+
+    python -m odoo.addons.medical_lab_management.analyzer.simulator \\
+        astm samples/astm_results.txt --port 5000 --repeat 100
+"""
+
+import argparse
+import socket
+import time
+
+from .astm import ENQ, EOT, STX, ETX, ACK
+from .hl7 import MLLP_START, MLLP_END
+
+
+def hl7_frames(data):
+    """MLLP frame each message of a recorded HL7 file"""
+    messages = data.replace(b'\n', b'\r').split(b'\rMSH')
+    for i, message in enumerate(messages):
+        message = message.strip(b'\r')
+        if message:
+            yield MLLP_START + (message if i == 0 else b'MSH' + message) + b'\r' + MLLP_END
+
+
+def astm_frames(data):
+    """Wrap each record of a recorded ASTM file in a checksummed frame"""
+    yield ENQ
+    records = [r for r in data.replace(b'\n', b'\r').split(b'\r') if r.strip()]
+    for number, record in enumerate(records, 1):
+        body = b'%d' % (number % 8) + record + b'\r' + ETX
+        yield STX + body + b'%02X' % (sum(body) % 256) + b'\r\n'
+    yield EOT
+
+
+def _wait_for(conn, terminator):
+    """Block until the receiver's acknowledgement ending with ``terminator``"""
+    received = b''
+    while not received.endswith(terminator):
+        data = conn.recv(4096)
+        if not data:
+            raise ConnectionError("Receiver closed the connection")
+        received += data
+
+
+FRAMERS = {'hl7': hl7_frames, 'astm': astm_frames}
+
+
+def replay(path, protocol, host='127.0.0.1', port=5000, repeat=1, rate=None):
+    """Send the recorded file ``repeat`` times; return messages per second"""
+    with open(path, 'rb') as stream:
+        frames = list(FRAMERS[protocol](stream.read()))
+    sent = 0
+    start = time.monotonic()
+    with socket.create_connection((host, port)) as conn:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for _i in range(repeat):
+            for frame in frames:
+                conn.sendall(frame)
+                if protocol == 'astm' and frame != EOT:
+                    _wait_for(conn, ACK)
+                elif protocol == 'hl7':
+                    _wait_for(conn, MLLP_END)
+                sent += 1
+                if rate:
+                    time.sleep(1.0 / rate)
+    return sent / max(time.monotonic() - start, 1e-6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('protocol', choices=sorted(FRAMERS))
+    parser.add_argument('path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--rate', type=float, help='frames per second (default: unthrottled)')
+    args = parser.parse_args()
+    throughput = replay(args.path, args.protocol, args.host, args.port, args.repeat, args.rate)
+    print("%.0f frames/s" % throughput)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Performance benchmarks for the medical lab module.
+
+Benchmarks run inside ``odoo shell`` against a scratch database and roll back
+everything they insert, e.g.::
+
+    from odoo.addons.medical_lab_management.benchmarks import partner_search
+    partner_search.run(env)
+"""
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the benchmarks."""
+
+import statistics
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def rolled_back(env, name='medical_lab_benchmark'):
+    """Run the block in a savepoint that is always rolled back"""
+    env.cr.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    finally:
+        env.cr.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        env.invalidate_all()
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of already sorted ``samples``"""
+    return samples[max(int(len(samples) * fraction + 0.5) - 1, 0)]
+
+
+def summarize(samples, queries=None):
+    """Latency percentiles in ms (and mean query count) of raw samples"""
+    samples = sorted(samples)
+    summary = {
+        'runs': len(samples),
+        'median_ms': round(statistics.median(samples), 2),
+        'p90_ms': round(percentile(samples, 0.90), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'p99_ms': round(percentile(samples, 0.99), 2),
+        'max_ms': round(samples[-1], 2),
+    }
+    if queries:
+        summary['queries'] = round(statistics.mean(queries), 1)
+    return summary
+
+
+class Timer:
+    """Collect wall time and SQL query count of repeated timed blocks"""
+
+    def __init__(self, cr):
+        self.cr = cr
+        self.samples = []
+        self.queries = []
+
+    @contextmanager
+    def __call__(self):
+        queries = self.cr.sql_log_count
+        start = time.perf_counter()
+        yield
+        self.samples.append((time.perf_counter() - start) * 1000)
+        self.queries.append(self.cr.sql_log_count - queries)
+
+    def summary(self):
+        return summarize(self.samples, self.queries)
+
+
+def measure(func, repeat=20, before=None, cr=None):
+    """Call ``func`` ``repeat`` times; return its latency percentiles in ms
+
+    With ``cr`` the mean number of queries per call is included too.
+    """
+    samples = []
+    queries = []
+    for _i in range(repeat):
+        if before:
+            before()
+        count = cr.sql_log_count if cr else 0
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+        if cr:
+            queries.append(cr.sql_log_count - count)
+    return summarize(samples, queries)
+
+
+def clone_rows(cr, table, template_id, count, overrides):
+    """Insert ``count`` copies of a template row; return the new ids
+
+    ``overrides`` maps column names to SQL expressions that may use ``n``,
+    the 1-based copy number.
+    """
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = %s AND column_name != 'id'
+    """, (table,))
+    columns = [row[0] for row in cr.fetchall()]
+    values = [overrides.get(column, f't."{column}"') for column in columns]
+    cr.execute(f"""
+        INSERT INTO "{table}" ({', '.join(f'"{c}"' for c in columns)})
+        SELECT {', '.join(values)}
+          FROM "{table}" t, generate_series(1, %s) AS n
+         WHERE t.id = %s
+     RETURNING id
+    """, (count, template_id))
+    return [row[0] for row in cr.fetchall()]
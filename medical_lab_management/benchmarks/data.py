@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Synthetic lab data for the benchmarks.
+
+Everything goes through the ORM so sequences, barcodes and stored computes
+are filled the same way as in production; only the spread of visits over
+the workflow states is forced with SQL afterwards.
+"""
+
+import random
+
+BATCH_SIZE = 500
+SAMPLE_TYPES = ('blood', 'urine', 'stool', 'swab')
+# sample_status -> status of the visit's test requests
+VISIT_STATES = {
+    'draft': 'pending',
+    'invoiced': 'pending',
+    'sample_collected': 'collected',
+    'in_diagnosis': 'in_progress',
+    'ready_to_print': 'completed',
+    'printed': 'printed',
+    'signed': 'printed',
+    'done': 'printed',
+}
+
+
+def _batched(vals_list, size=BATCH_SIZE):
+    for start in range(0, len(vals_list), size):
+        yield vals_list[start:start + size]
+
+
+def _create(model, vals_list):
+    records = model.browse()
+    for batch in _batched(vals_list):
+        records |= model.create(batch)
+    return records
+
+
+def create_tests(env, count, rng):
+    """Quantitative tests, each with gender/age ranges and a dated price"""
+    departments = _create(env['medical.lab.department'], [
+        {'name': f'Bench Department {n}', 'code': f'BD{n}'} for n in range(1, 5)
+    ])
+    tests = _create(env['medical.lab.test'], [{
+        'name': f'Bench Test {n}',
+        'code': f'BT{n:04d}',
+        'sample_type': SAMPLE_TYPES[n % len(SAMPLE_TYPES)],
+        'result_type': 'quantitative',
+        'list_price': rng.randint(5, 200),
+        'processing_time': rng.choice((2, 4, 24, 48)),
+        'department_id': departments[n % len(departments)].id,
+    } for n in range(1, count + 1)])
+    _create(env['medical.lab.test.range'], [{
+        'test_id': test.id,
+        'gender': gender,
+        'age_from': age_from,
+        'age_to': age_to,
+        'min_value': 10.0,
+        'max_value': 20.0,
+        'critical_min': 2.0,
+        'critical_max': 50.0,
+    } for test in tests
+        for gender in ('male', 'female')
+        for age_from, age_to in ((0, 17), (18, 150))])
+    _create(env['medical.lab.test.price'], [{
+        'test_id': test.id,
+        'price': test.list_price * 1.1,
+        'date_start': '2020-01-01',
+    } for test in tests])
+    return tests
+
+
+def create_partners(env, patients, doctors, rng):
+    Partner = env['res.partner']
+    doctor_records = _create(Partner, [
+        {'name': f'Bench Doctor {n}', 'is_doctor': True} for n in range(1, doctors + 1)
+    ])
+    patient_records = _create(Partner, [{
+        'name': f'Bench Patient {n}',
+        'is_patient': True,
+        'gender': rng.choice(('male', 'female')),
+        'date_of_birth': f'{rng.randint(1940, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'mobile': f'+1555{n:07d}',
+    } for n in range(1, patients + 1)])
+    return patient_records, doctor_records
+
+
+def visit_vals(patient, doctor, tests):
+    """Values of one lab invoice for ``tests``"""
+    return {
+        'move_type': 'out_invoice',
+        'is_lab_invoice': True,
+        'partner_id': patient.id,
+        'patient_id': patient.id,
+        'referring_doctor_id': doctor.id,
+        'invoice_line_ids': [(0, 0, {
+            'name': test.name,
+            'quantity': 1,
+            'price_unit': test.list_price,
+        }) for test in tests],
+        'lab_test_ids': [(0, 0, {'test_id': test.id}) for test in tests],
+    }
+
+
+def create_visits(env, count, patients, doctors, tests, rng, tests_per_visit=(1, 6)):
+    """Lab invoices spread evenly over every ``sample_status``"""
+    moves = _create(env['account.move'], [
+        visit_vals(rng.choice(patients), rng.choice(doctors),
+                   rng.sample(tests, rng.randint(*tests_per_visit)))
+        for _n in range(count)
+    ])
+    env['account.move'].flush()
+    env['medical.lab.test.request'].flush()
+    states = list(VISIT_STATES)
+    cr = env.cr
+    for index, (sample_status, request_status) in enumerate(VISIT_STATES.items()):
+        ids = tuple(moves.ids[index::len(states)])
+        if not ids:
+            continue
+        cr.execute("""
+            UPDATE account_move
+               SET sample_status = %s,
+                   state = CASE WHEN %s = 'draft' THEN 'draft' ELSE 'posted' END,
+                   sample_collection_time = CASE WHEN %s IN ('draft', 'invoiced') THEN NULL
+                                                 ELSE now() at time zone 'UTC' END
+             WHERE id IN %s
+        """, (sample_status, sample_status, sample_status, ids))
+        cr.execute("""
+            UPDATE medical_lab_test_request
+               SET status = %s,
+                   result_value = CASE WHEN %s IN ('completed', 'printed')
+                                       THEN (10 + random() * 10)::numeric(6, 2)::text END
+             WHERE invoice_id IN %s
+        """, (request_status, request_status, ids))
+    env.invalidate_all()
+    return moves
+
+
+def generate(env, patients=1000, doctors=50, tests=100, visits=2000, seed=42):
+    """Create a full synthetic data set and return its records by kind"""
+    rng = random.Random(seed)
+    test_records = create_tests(env, tests, rng)
+    patient_records, doctor_records = create_partners(env, patients, doctors, rng)
+    visit_records = create_visits(env, visits, list(patient_records), list(doctor_records),
+                                  list(test_records), rng)
+    env.cr.execute("ANALYZE res_partner")
+    env.cr.execute("ANALYZE account_move")
+    env.cr.execute("ANALYZE medical_lab_test_request")
+    return {
+        'tests': test_records,
+        'patients': patient_records,
+        'doctors': doctor_records,
+        'visits': visit_records,
+    }
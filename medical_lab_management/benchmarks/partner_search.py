@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Patient search latency at growing partner table sizes."""
+
+from .common import measure, rolled_back
+
+SIZES = (10000, 100000, 1000000)
+QUERIES = ('PAT/2024/00042', 'DOC/0007', 'Patient 4242', 'atient 99')
+
+
+def _populate(cr, total):
+    """Insert synthetic patients, doctors and plain partners up to ``total`` rows"""
+    cr.execute("SELECT COUNT(*) FROM res_partner")
+    missing = total - cr.fetchone()[0]
+    if missing <= 0:
+        return
+    cr.execute("""
+        INSERT INTO res_partner (name, display_name, active, is_patient, is_doctor,
+                                 patient_id, doctor_id, type)
+        SELECT 'Patient ' || n, 'Patient ' || n, true,
+               n %% 10 < 8, n %% 100 = 99,
+               CASE WHEN n %% 10 < 8 THEN 'PAT/2024/' || lpad(n::text, 5, '0') END,
+               CASE WHEN n %% 100 = 99 THEN 'DOC/' || lpad(n::text, 4, '0') END,
+               'contact'
+          FROM generate_series(1, %s) AS n
+    """, (missing,))
+    cr.execute("ANALYZE res_partner")
+
+
+def run(env, sizes=SIZES, queries=QUERIES, repeat=20):
+    """Time ``res.partner.name_search`` for each size and return the results
+
+    Rows are inserted inside a savepoint that is rolled back afterwards.
+    """
+    Partner = env['res.partner']
+    results = []
+    with rolled_back(env):
+        for size in sizes:
+            _populate(env.cr, size)
+            for query in queries:
+                timing = measure(lambda: Partner.name_search(query, limit=8), repeat,
+                                 before=Partner.invalidate_cache)
+                results.append(dict(timing, partners=size, query=query))
+                print("%(partners)9d  %(query)-16s  median %(median_ms)8.2f ms  "
+                      "p95 %(p95_ms)8.2f ms" % results[-1])
+    return results
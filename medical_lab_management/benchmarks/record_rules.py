@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Test request list latency for a technician with and without department rules.
+
+Needs one test request and at least two departments.
+"""
+
+import time
+
+from .common import clone_rows, measure, rolled_back
+
+REQUESTS = 1000000
+LIST_FIELDS = ['invoice_id', 'test_id', 'status', 'department_id', 'expected_completion']
+
+
+def _populate(env, count):
+    cr = env.cr
+    template = env['medical.lab.test.request'].search([], limit=1)
+    departments = env['medical.lab.department'].search([])
+    if not template or len(departments) < 2:
+        raise RuntimeError("The rule benchmark needs a test request and two departments")
+    env['medical.lab.test.request'].flush()
+    clone_rows(cr, 'medical_lab_test_request', template.id, count, {
+        # '%%' because clone_rows passes query parameters
+        'department_id': f"(ARRAY[{','.join(map(str, departments.ids))}])[1 + n %% {len(departments)}]",
+    })
+    cr.execute("ANALYZE medical_lab_test_request")
+    return departments
+
+
+def run(env, count=REQUESTS, repeat=20):
+    """Compare list searches of a department-scoped technician against no rule"""
+    results = {}
+    with rolled_back(env):
+        start = time.perf_counter()
+        departments = _populate(env, count)
+        results['populate_s'] = round(time.perf_counter() - start, 1)
+
+        technician = env['res.users'].create({
+            'name': 'Benchmark Technician',
+            'login': 'medical_lab_benchmark_technician',
+            'groups_id': [(6, 0, [env.ref('medical_lab_management.group_lab_technician').id])],
+            'lab_department_ids': [(6, 0, departments[:1].ids)],
+        })
+        rule = env.ref('medical_lab_management.medical_lab_test_request_rule_technician')
+        Request = env['medical.lab.test.request'].with_user(technician)
+
+        def list_view():
+            Request.search_read([('status', '=', 'pending')], LIST_FIELDS,
+                                order='id desc', limit=80)
+            Request.search_count([('status', '=', 'pending')])
+
+        results['with_rule'] = measure(list_view, repeat, before=env.invalidate_all)
+        rule.active = False
+        results['without_rule'] = measure(list_view, repeat, before=env.invalidate_all)
+        print(results)
+    return results
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Turnaround-time analytics over synthetic visits.
+
+Needs one lab invoice with at least one test request to use as a template.
+"""
+
+import time
+
+from .common import clone_rows, measure, rolled_back
+
+VISITS = 1000000
+
+
+def _populate(env, visits):
+    cr = env.cr
+    request = env['medical.lab.test.request'].search([], limit=1)
+    tests = env['medical.lab.test'].with_context(active_test=False).search([])
+    if not request or not tests:
+        raise RuntimeError("The TAT benchmark needs a lab invoice with a test request")
+    env['account.move'].flush()
+    env['medical.lab.test.request'].flush()
+
+    move_ids = clone_rows(cr, 'account_move', request.invoice_id.id, visits, {
+        'name': "'/'",
+        'state': "'draft'",
+        'sample_status': "'done'",
+        'barcode_id': "'BENCH' || n",
+    })
+    first_id = move_ids[0]
+    if move_ids != list(range(first_id, first_id + visits)):
+        raise RuntimeError("Cloned visits did not get contiguous ids")
+    clone_rows(cr, 'medical_lab_test_request', request.id, visits, {
+        'invoice_id': f"{first_id} + n - 1",
+        # '%%' because clone_rows passes query parameters
+        'test_id': f"(ARRAY[{','.join(map(str, tests.ids))}])[1 + n %% {len(tests)}]",
+        'diagnosis_date': 'NULL',
+    })
+    cr.execute("""
+        UPDATE medical_lab_test_request r
+           SET department_id = t.department_id, machine_id = t.machine_id
+          FROM medical_lab_test t
+         WHERE t.id = r.test_id AND r.invoice_id >= %s
+    """, (first_id,))
+    # Collected within the last year, resulted within 48 h, delivered within 24 h
+    cr.execute("""
+        WITH visit AS (
+            SELECT id AS move_id,
+                   now() at time zone 'UTC' - (id %% 365) * interval '1 day' AS collected,
+                   random() * interval '48 hours' AS to_result,
+                   random() * interval '24 hours' AS to_delivery
+              FROM generate_series(%s, %s) AS id
+        )
+        INSERT INTO medical_lab_status_transition (move_id, from_status, to_status, transition_time)
+        SELECT move_id, s.from_status, s.to_status, s.at
+          FROM visit,
+       LATERAL (VALUES ('invoiced', 'sample_collected', collected),
+                       ('in_diagnosis', 'ready_to_print', collected + to_result),
+                       ('signed', 'done', collected + to_result + to_delivery))
+               AS s (from_status, to_status, at)
+    """, (first_id, first_id + visits - 1))
+    cr.execute("ANALYZE medical_lab_status_transition")
+    cr.execute("ANALYZE medical_lab_test_request")
+
+
+def run(env, visits=VISITS, repeat=20):
+    """Populate synthetic visits, refresh the TAT view and time its queries"""
+    Report = env['medical.lab.tat.report']
+    results = {}
+    with rolled_back(env):
+        start = time.perf_counter()
+        _populate(env, visits)
+        results['populate_s'] = round(time.perf_counter() - start, 1)
+
+        start = time.perf_counter()
+        Report._cron_refresh()
+        results['refresh_s'] = round(time.perf_counter() - start, 1)
+
+        for dimension in ('test', 'department', 'machine'):
+            results[dimension] = measure(lambda: Report.get_tat_stats(dimension), repeat,
+                                         before=Report.invalidate_cache)
+        print(results)
+    return results
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""End-to-end lab workflow benchmark with a machine-readable baseline.
+
+Generates a synthetic data set, times the reception-to-delivery path and
+writes latency percentiles and query counts as JSON. A previous baseline
+can be passed to flag regressions::
+
+    from odoo.addons.medical_lab_management.benchmarks import workflow
+    results = workflow.run(env, output='/tmp/lab_baseline.json')
+    workflow.run(env, baseline='/tmp/lab_baseline.json')
+
+``run_concurrent`` drives the reception-to-results path from several
+threads at once, each with its own cursor, and reports throughput and
+latency percentiles under contention. It commits, so run it on a copy of
+the database::
+
+    workflow.run_concurrent(env, threads=8, visits_per_thread=25, commit=True)
+
+PRD targets (median): patient search < 1 s, invoice creation < 2 s.
+"""
+
+import json
+import random
+import threading
+import time
+
+from odoo import api, fields
+
+from . import data
+from .common import Timer, measure, rolled_back, summarize
+
+TARGETS_MS = {
+    'name_search_patient_id': 1000,
+    'name_search_name': 1000,
+    'create_visit': 2000,
+}
+# Allowed slowdown against a baseline before a scenario counts as a regression
+TOLERANCE = 1.25
+WORKFLOW_STEPS = (
+    'action_post',
+    'action_update_sample_collected',
+    'action_start_diagnosis',
+    'enter_results',
+    'action_ready_to_print',
+    'action_mark_printed',
+    'action_mark_signed',
+    'action_mark_done',
+)
+# Steps of one visit in the concurrent scenario, each committed on its own
+CONCURRENT_STEPS = (
+    'create_visit',
+    'action_post',
+    'action_update_sample_collected',
+    'action_start_diagnosis',
+    'enter_results',
+)
+REPORTS = (
+    'action_report_lab_worksheet',
+    'action_report_lab_barcode',
+    'action_report_lab_results',
+)
+
+
+def _search_scenarios(env, dataset, repeat):
+    Partner = env['res.partner']
+    patients = dataset['patients']
+    results = {}
+    for name, term in (('name_search_patient_id', lambda p: p.patient_id),
+                       ('name_search_name', lambda p: p.name[-6:])):
+        terms = [term(patient) for patient in patients[:repeat]]
+        results[name] = measure(lambda: Partner.name_search(terms.pop(), limit=8),
+                                len(terms), before=Partner.invalidate_cache, cr=env.cr)
+    return results
+
+
+def _workflow_scenarios(env, dataset, repeat, rng):
+    """Create visits one at a time and walk each through every workflow step"""
+    Move = env['account.move']
+    patients, doctors, tests = (list(dataset[kind]) for kind in ('patients', 'doctors', 'tests'))
+    timers = {step: Timer(env.cr) for step in ('create_visit',) + WORKFLOW_STEPS}
+    for _i in range(repeat):
+        vals = data.visit_vals(rng.choice(patients), rng.choice(doctors), rng.sample(tests, 4))
+        env.invalidate_all()
+        with timers['create_visit']():
+            move = Move.create(vals)
+            move.flush()
+        for step in WORKFLOW_STEPS:
+            env.invalidate_all()
+            with timers[step]():
+                if step == 'enter_results':
+                    move.lab_test_ids.write({
+                        'result_value': f'{rng.uniform(1, 60):.2f}',
+                        'status': 'completed',
+                        'diagnosis_date': fields.Datetime.now(),
+                    })
+                else:
+                    getattr(move, step)()
+                move.flush()
+    return {step: timer.summary() for step, timer in timers.items()}
+
+
+def _batch_create_scenario(env, dataset, size, rng):
+    patients, doctors, tests = (list(dataset[kind]) for kind in ('patients', 'doctors', 'tests'))
+    vals_list = [data.visit_vals(rng.choice(patients), rng.choice(doctors), rng.sample(tests, 4))
+                 for _n in range(size)]
+    timer = Timer(env.cr)
+    with timer():
+        env['account.move'].create(vals_list).flush()
+    return dict(timer.summary(), visits=size)
+
+
+def _dashboard_scenarios(env, repeat):
+    Move = env['account.move']
+    return {
+        'dashboard_cold': measure(lambda: Move.get_lab_dashboard_data(use_cache=False),
+                                  repeat, cr=env.cr),
+        'dashboard_cached': measure(Move.get_lab_dashboard_data, repeat, cr=env.cr),
+    }
+
+
+def _report_scenarios(env, dataset, repeat):
+    """Render report HTML (PDF conversion depends on wkhtmltopdf, not the module)"""
+    results = {}
+    visits = dataset['visits'].filtered(lambda m: m.sample_status in ('ready_to_print', 'done'))
+    for xmlid in REPORTS:
+        report = env.ref(f'medical_lab_management.{xmlid}', raise_if_not_found=False)
+        if not report or not visits:
+            continue
+        res_ids = visits[:20].ids
+        results[f'report_{xmlid}'] = measure(lambda: report._render_qweb_html(res_ids),
+                                             repeat, before=env.invalidate_all, cr=env.cr)
+    return results
+
+
+def _concurrent_dataset(env, patients, doctors, tests, seed):
+    """Committed bench tests and partners, reused by later runs"""
+    rng = random.Random(seed)
+    test_records = env['medical.lab.test'].search([('code', '=like', 'BT%')])
+    if not test_records:
+        test_records = data.create_tests(env, tests, rng)
+    patient_records = env['res.partner'].search(
+        [('is_patient', '=', True), ('name', '=like', 'Bench Patient %')])
+    doctor_records = env['res.partner'].search(
+        [('is_doctor', '=', True), ('name', '=like', 'Bench Doctor %')])
+    if not patient_records or not doctor_records:
+        patient_records, doctor_records = data.create_partners(env, patients, doctors, rng)
+    env.cr.commit()
+    return {
+        'tests': test_records.ids,
+        'patients': patient_records.ids,
+        'doctors': doctor_records.ids,
+    }
+
+
+def _concurrent_worker(registry, uid, dataset, count, seed, start, samples, errors):
+    """Walk ``count`` visits through ``CONCURRENT_STEPS`` in one thread
+
+    Every step is its own transaction, as it would be for separate requests
+    from reception, collection and the bench. A failed step (e.g. a
+    serialization failure) is rolled back, counted and ends that visit.
+    """
+    rng = random.Random(seed)
+    start.wait()
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, {})
+        Move = env['account.move']
+        patients = list(env['res.partner'].browse(dataset['patients']))
+        doctors = list(env['res.partner'].browse(dataset['doctors']))
+        tests = list(env['medical.lab.test'].browse(dataset['tests']))
+        for _i in range(count):
+            visit_start = time.perf_counter()
+            move = Move.browse()
+            for step in CONCURRENT_STEPS:
+                step_start = time.perf_counter()
+                try:
+                    if step == 'create_visit':
+                        move = Move.create(data.visit_vals(
+                            rng.choice(patients), rng.choice(doctors), rng.sample(tests, 4)))
+                    elif step == 'enter_results':
+                        move.lab_test_ids.write({
+                            'result_value': f'{rng.uniform(1, 60):.2f}',
+                            'status': 'completed',
+                            'diagnosis_date': fields.Datetime.now(),
+                        })
+                    else:
+                        getattr(move, step)()
+                    cr.commit()
+                except Exception as e:
+                    cr.rollback()
+                    errors.append((step, type(e).__name__))
+                    break
+                samples[step].append((time.perf_counter() - step_start) * 1000)
+            else:
+                samples['visit'].append((time.perf_counter() - visit_start) * 1000)
+
+
+def run_concurrent(env, threads=8, visits_per_thread=25, patients=200, doctors=20, tests=50,
+                   seed=42, output=None, commit=False):
+    """Run the reception-to-results workflow from ``threads`` threads at once
+
+    Each thread has its own cursor and commits every step, so the bench data
+    and the visits stay in the database: pass ``commit=True`` to confirm.
+    Returns throughput (completed visits per second), per step and per visit
+    latency percentiles and the failed steps, and writes them to ``output``
+    (JSON) when given.
+    """
+    if not commit:
+        raise ValueError("run_concurrent commits its data; pass commit=True on a disposable database")
+    dataset = _concurrent_dataset(env, patients, doctors, tests, seed)
+    samples = {step: [] for step in CONCURRENT_STEPS + ('visit',)}
+    errors = []
+    start = threading.Barrier(threads + 1)
+    workers = [
+        threading.Thread(target=_concurrent_worker, name=f'lab-bench-{n}', args=(
+            env.registry, env.uid, dataset, visits_per_thread, seed + n, start, samples, errors))
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    wall = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - wall
+
+    completed = len(samples['visit'])
+    results = {
+        'date': fields.Datetime.to_string(fields.Datetime.now()),
+        'threads': threads,
+        'visits': threads * visits_per_thread,
+        'completed': completed,
+        'wall_s': round(wall, 2),
+        'throughput_visits_s': round(completed / wall, 2) if wall else 0.0,
+        'failed_steps': {},
+        'scenarios': {f'concurrent_{name}': summarize(values)
+                      for name, values in samples.items() if values},
+    }
+    for step, error in errors:
+        key = f'{step}: {error}'
+        results['failed_steps'][key] = results['failed_steps'].get(key, 0) + 1
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    print(f"{threads} threads, {completed}/{results['visits']} visits in {results['wall_s']} s"
+          f" = {results['throughput_visits_s']} visits/s")
+    for name, summary in sorted(results['scenarios'].items()):
+        print("%-34s  median %8.2f ms  p95 %8.2f ms  p99 %8.2f ms" % (
+            name, summary['median_ms'], summary['p95_ms'], summary['p99_ms']))
+    for key, count in sorted(results['failed_steps'].items()):
+        print(f"failed: {key} x{count}")
+    return results
+
+
+def compare(baseline, results, tolerance=TOLERANCE):
+    """Return the scenarios slower than ``tolerance`` x baseline or with more queries"""
+    regressions = {}
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if current['median_ms'] > previous['median_ms'] * tolerance:
+            regressions[name] = {'median_ms': (previous['median_ms'], current['median_ms'])}
+        if current.get('queries', 0) > previous.get('queries', 0):
+            regressions.setdefault(name, {})['queries'] = (previous.get('queries'), current['queries'])
+    return regressions
+
+
+def run(env, patients=1000, doctors=50, tests=100, visits=2000, repeat=30,
+        batch_size=500, seed=42, output=None, baseline=None):
+    """Run every scenario inside a rolled back savepoint
+
+    Writes the results to ``output`` (JSON) when given and compares them with
+    the ``baseline`` file when given. Returns the results.
+    """
+    rng = random.Random(seed)
+    results = {
+        'date': fields.Datetime.to_string(fields.Datetime.now()),
+        'dataset': {'patients': patients, 'doctors': doctors, 'tests': tests, 'visits': visits},
+        'scenarios': {},
+    }
+    with rolled_back(env):
+        start = time.perf_counter()
+        dataset = data.generate(env, patients, doctors, tests, visits, seed)
+        results['populate_s'] = round(time.perf_counter() - start, 1)
+
+        scenarios = results['scenarios']
+        scenarios.update(_search_scenarios(env, dataset, repeat))
+        scenarios.update(_workflow_scenarios(env, dataset, repeat, rng))
+        scenarios['create_visit_batch'] = _batch_create_scenario(env, dataset, batch_size, rng)
+        scenarios.update(_dashboard_scenarios(env, repeat))
+        scenarios.update(_report_scenarios(env, dataset, repeat))
+
+    results['over_target'] = sorted(
+        name for name, limit in TARGETS_MS.items()
+        if name in results['scenarios'] and results['scenarios'][name]['median_ms'] > limit
+    )
+    if baseline:
+        with open(baseline) as f:
+            results['regressions'] = compare(json.load(f), results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    for name, summary in sorted(results['scenarios'].items()):
+        print("%-34s  median %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  %6s queries" % (
+            name, summary['median_ms'], summary['p95_ms'], summary['p99_ms'],
+            summary.get('queries', '-')))
+    for name in results['over_target']:
+        print(f"over PRD target: {name}")
+    for name, change in results.get('regressions', {}).items():
+        print(f"regression: {name} {change}")
+    return results
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+
+from odoo import fields, http
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+from ..models.medical_lab_profiler import PROFILE_BUFFER_SIZE, clear_samples, flush_samples
+
+# Patients with a visit in this many days are cached on reception stations
+RECENT_PATIENT_DAYS = 30
+
+
+class MedicalLabOffline(http.Controller):
+    """Batched endpoints for the offline reception/collection client"""
+
+    @http.route('/medical_lab/offline/snapshot', type='json', auth='user')
+    def snapshot(self, since=None):
+        """Test catalog, recent patients and today's visits for the local cache
+
+        With ``since`` (a server timestamp from a previous snapshot) only
+        tests and visits changed after it are returned. Patients are sent
+        when their record changed or when they have a visit changed since
+        then, so a returning patient arrives with their new visit.
+        ``visit_ids`` lists all of today's visits so the client can drop
+        the others.
+        """
+        env = request.env
+        server_time = fields.Datetime.to_string(fields.Datetime.now())
+        changed = [('write_date', '>', since)] if since else []
+        today = fields.Date.context_today(env.user)
+        visit_domain = [('is_lab_invoice', '=', True), ('invoice_date', '=', today)]
+
+        tests = env['medical.lab.test'].with_context(active_test=False).search_read(
+            changed, ['name', 'code', 'shortcut', 'sample_type', 'list_price', 'active'])
+        visits = env['account.move'].search_read(
+            changed + visit_domain,
+            ['name', 'barcode_id', 'patient_id', 'sample_status', 'sample_collection_time'])
+        recent = today - timedelta(days=RECENT_PATIENT_DAYS)
+        env['account.move'].flush(['is_lab_invoice', 'invoice_date', 'patient_id'])
+        env.cr.execute("""
+            SELECT m.patient_id
+              FROM account_move m
+              JOIN res_partner p ON p.id = m.patient_id
+             WHERE m.is_lab_invoice AND m.invoice_date >= %s
+          GROUP BY m.patient_id, p.write_date
+            HAVING %s IS NULL OR MAX(m.write_date) > %s OR p.write_date > %s
+        """, (recent, since, since, since))
+        patient_ids = [row[0] for row in env.cr.fetchall()]
+        patients = env['res.partner'].search_read(
+            [('id', 'in', patient_ids)],
+            ['name', 'patient_id', 'gender', 'date_of_birth', 'phone', 'mobile'])
+        return {
+            'server_time': server_time,
+            'tests': tests,
+            'patients': patients,
+            'visits': visits,
+            'visit_ids': env['account.move'].search(visit_domain).ids,
+        }
+
+    @http.route('/medical_lab/offline/sync', type='json', auth='user')
+    def sync(self, scans):
+        """Apply queued collection scans in one batch
+
+        ``scans`` is a list of ``{barcode, scanned_at, expected_status}``.
+        Returns one outcome per scan, see
+        ``account.move.collect_scanned_samples``.
+        """
+        outcomes = request.env['account.move'].collect_scanned_samples(scans)
+        return {
+            'server_time': fields.Datetime.to_string(fields.Datetime.now()),
+            'outcomes': outcomes,
+        }
+
+
+class MedicalLabProfiler(http.Controller):
+
+    @http.route('/medical_lab/profiler', type='json', auth='user')
+    def profiler(self, since=None, raw=False, clear=False):
+        """Hot path samples stored by all workers, for lab managers only
+
+        Returns the per-method summary, plus the raw samples with ``raw``.
+        ``since`` (epoch seconds) limits both to newer samples; ``clear``
+        deletes the stored samples after reading.
+        """
+        env = request.env
+        if not env.user.has_group('medical_lab_management.group_lab_manager'):
+            raise AccessError("Only lab managers can read profiling data.")
+        flush_samples(env.registry, force=True)
+        Sample = env['medical.lab.profile.sample'].sudo()
+        since = since and datetime.utcfromtimestamp(since)
+        summary = Sample._summary(since)
+        result = {'summary': summary, 'count': sum(line['calls'] for line in summary)}
+        if raw:
+            result['samples'] = Sample.search_read(
+                since and [('sampled_at', '>', since)] or [], limit=PROFILE_BUFFER_SIZE)
+        if clear:
+            clear_samples(env)
+        return result
+
@@ -2,10 +2,21 @@
 
 from . import res_partner
 from . import account_move
+from . import ir_sequence
+from . import res_users
+# Defines the category tree mixin of the test models
+from . import medical_lab_category
 from . import medical_lab_test
 from . import medical_lab_test_request
-from . import medical_lab_category
 from . import medical_lab_department
 from . import medical_lab_machine
 from . import medical_lab_test_price
-from . import medical_lab_test_range
\ No newline at end of file
+from . import medical_lab_test_range
+from . import medical_lab_report_job
+from . import medical_lab_critical_alert
+from . import medical_lab_result_history
+from . import medical_lab_archive
+# Reads the archive table, so it is set up after it
+from . import medical_lab_tat
+from . import medical_lab_catalog
+from . import medical_lab_profiler
\ No newline at end of file
@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError
 import barcode
-from barcode.writer import ImageWriter
+from barcode.writer import ImageWriter, SVGWriter
 import base64
+import logging
+import time
 from io import BytesIO
+from .medical_lab_profiler import profiled
+
+_logger = logging.getLogger(__name__)
+
+# Longest time the registry cache serves dashboard statistics
+DASHBOARD_CACHE_TTL = 30
+
+# Workflow action -> (allowed current sample_status values, error message)
+LAB_TRANSITION_RULES = {
+    'action_update_sample_collected': (
+        ('invoiced',), "Sample can only be collected after invoicing."),
+    'action_start_diagnosis': (
+        ('sample_collected',), "Cannot start diagnosis before sample collection."),
+}
 
 
 class AccountMove(models.Model):
@@ -20,7 +36,10 @@ class AccountMove(models.Model):
                                          domain=[('is_doctor', '=', True)],
                                          states={'draft': [('readonly', False)]})
     barcode_id = fields.Char('Barcode ID', readonly=True, copy=False, index=True)
-    barcode_image = fields.Binary('Barcode Image', compute='_compute_barcode_image')
+    barcode_image = fields.Binary('Barcode Image', compute='_compute_barcode_image',
+                                  store=True, attachment=True)
+    barcode_svg = fields.Binary('Barcode SVG', compute='_compute_barcode_image',
+                                store=True, attachment=True)
     visit_notes = fields.Text('Visit Notes')
     
     # Test Management
@@ -49,30 +68,154 @@ class AccountMove(models.Model):
     sample_collection_time = fields.Datetime('Sample Collection Time')
     expected_delivery_date = fields.Date('Expected Delivery Date')
     actual_delivery_date = fields.Date('Actual Delivery Date')
+    lab_archived = fields.Boolean('Results Archived', default=False, copy=False, readonly=True,
+                                  help='Test requests of this visit were moved to the archive')
 
-    @api.model
-    def create(self, vals):
-        """Generate barcode ID for lab invoices"""
-        if vals.get('is_lab_invoice') and not vals.get('barcode_id'):
-            vals['barcode_id'] = self.env['ir.sequence'].next_by_code('medical.lab.barcode') or '/'
-        return super(AccountMove, self).create(vals)
+    def init(self):
+        """Partial indexes for the per-patient and per-doctor lab invoice counters"""
+        super(AccountMove, self).init()
+        for column in ('patient_id', 'referring_doctor_id'):
+            self.env.cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS account_move_lab_{column}_idx
+                    ON account_move ({column})
+                 WHERE is_lab_invoice AND {column} IS NOT NULL
+            """)
+
+    @api.model_create_multi
+    @profiled
+    def create(self, vals_list):
+        """Generate barcode IDs for lab invoices, one sequence call per batch"""
+        missing = [vals for vals in vals_list
+                   if vals.get('is_lab_invoice') and not vals.get('barcode_id')]
+        codes = self.env['ir.sequence'].next_block_by_code('medical.lab.barcode', len(missing))
+        for vals, code in zip(missing, codes):
+            vals['barcode_id'] = code or '/'
+        for vals in vals_list:
+            # Lab invoices created from their tests alone are priced from the catalog
+            if vals.get('is_lab_invoice') and not vals.get('invoice_line_ids') \
+                    and not vals.get('line_ids'):
+                vals['invoice_line_ids'] = self._lab_invoice_line_vals(vals)
+        moves = super(AccountMove, self).create(vals_list)
+        self.env['res.partner']._queue_invoice_count_deltas(moves._lab_counter_contributions())
+        if any(moves.mapped('is_lab_invoice')):
+            moves._invalidate_lab_dashboard_cache()
+        return moves
+
+    def _lab_counter_contributions(self):
+        """Return {partner_id: [lab invoices, referred invoices]} these moves count for"""
+        counts = {}
+        for move in self.filtered('is_lab_invoice'):
+            if move.patient_id:
+                counts.setdefault(move.patient_id.id, [0, 0])[0] += 1
+            if move.referring_doctor_id:
+                counts.setdefault(move.referring_doctor_id.id, [0, 0])[1] += 1
+        return counts
 
     @api.depends('barcode_id')
+    @profiled
     def _compute_barcode_image(self):
-        """Generate barcode image from barcode ID"""
+        """Render barcode images once, when the barcode ID is assigned
+
+        Images are stored as attachments, so reads and sticker printing do
+        not render anything. Moves sharing a barcode value share one render.
+        """
+        rendered = {}
         for move in self:
-            if move.barcode_id and move.barcode_id != '/':
-                try:
-                    # Generate Code128 barcode
-                    code128 = barcode.get('code128', move.barcode_id, writer=ImageWriter())
-                    buffer = BytesIO()
-                    code128.write(buffer)
-                    buffer.seek(0)
-                    move.barcode_image = base64.b64encode(buffer.read())
-                except Exception:
-                    move.barcode_image = False
-            else:
+            value = move.barcode_id
+            if not value or value == '/':
                 move.barcode_image = False
+                move.barcode_svg = False
+                continue
+            if value not in rendered:
+                rendered[value] = (
+                    self._render_barcode(value, 'png'),
+                    self._render_barcode(value, 'svg'),
+                )
+            move.barcode_image, move.barcode_svg = rendered[value]
+
+    @api.model
+    def _render_barcode(self, value, fmt='png'):
+        """Return a base64 encoded Code128 image of ``value`` (png or svg)"""
+        writer = ImageWriter() if fmt == 'png' else SVGWriter()
+        try:
+            code128 = barcode.get('code128', value, writer=writer)
+            buffer = BytesIO()
+            code128.write(buffer)
+            return base64.b64encode(buffer.getvalue())
+        except Exception:
+            _logger.exception("Could not render %s barcode for %s", fmt, value)
+            return False
+
+    @api.model
+    def backfill_barcode_images(self, batch_size=500):
+        """Render missing barcode images of existing lab invoices
+
+        Meant to be run from ``odoo shell`` after upgrading. Each batch is
+        marked for recomputation and flushed, so the images are written with
+        one UPDATE per batch without going through ``write``, then evicted
+        from the cache so memory stays bounded.
+        """
+        moves = self.search([
+            ('is_lab_invoice', '=', True),
+            ('barcode_id', 'not in', [False, '/']),
+            '|', ('barcode_image', '=', False), ('barcode_svg', '=', False),
+        ])
+        done = 0
+        for start in range(0, len(moves), batch_size):
+            batch = moves[start:start + batch_size]
+            for field_name in ('barcode_image', 'barcode_svg'):
+                self.env.add_to_compute(self._fields[field_name], batch)
+            batch.flush(['barcode_image', 'barcode_svg'])
+            batch.invalidate_cache()
+            done += len(batch)
+        _logger.info("Rendered barcode images for %s lab invoices", done)
+        return done
+
+    def get_patient_ages(self):
+        """Return {move_id: patient age in whole years} at the visit date
+
+        The visit date is the sample collection date, falling back to the
+        invoice date and then the creation date. One query per recordset.
+        """
+        if not self.ids:
+            return {}
+        self.flush(['patient_id', 'sample_collection_time', 'invoice_date'])
+        self.env['res.partner'].flush(['date_of_birth'])
+        self.env.cr.execute("""
+            SELECT m.id,
+                   date_part('year', age(COALESCE(m.sample_collection_time::date,
+                                                  m.invoice_date,
+                                                  m.create_date::date),
+                                         p.date_of_birth))::int
+              FROM account_move m
+              JOIN res_partner p ON p.id = m.patient_id
+             WHERE m.id IN %s AND p.date_of_birth IS NOT NULL
+        """, (tuple(self.ids),))
+        ages = dict.fromkeys(self.ids)
+        ages.update(self.env.cr.fetchall())
+        return ages
+
+    @api.model
+    def _lab_invoice_line_vals(self, vals):
+        """Invoice line commands for the tests of new lab invoice ``vals``
+
+        One line per test at the price effective for the patient's pricelist
+        on the invoice date (see ``medical.lab.test.get_effective_prices``).
+        """
+        test_ids = [command[2]['test_id'] for command in vals.get('lab_test_ids') or []
+                    if command[0] == 0 and command[2].get('test_id')]
+        if not test_ids:
+            return []
+        partner = self.env['res.partner'].browse(vals.get('patient_id') or vals.get('partner_id'))
+        pricelist = 'property_product_pricelist' in partner._fields and partner.property_product_pricelist
+        tests = self.env['medical.lab.test'].browse(test_ids)
+        prices = tests.get_effective_prices(pricelist or None,
+                                            fields.Date.to_date(vals.get('invoice_date')))
+        return [(0, 0, {
+            'name': test.name,
+            'quantity': 1,
+            'price_unit': prices[test.id],
+        }) for test in tests]
 
     @api.onchange('patient_id')
     def _onchange_patient_id(self):
@@ -80,118 +223,282 @@ class AccountMove(models.Model):
         if self.patient_id:
             self.partner_id = self.patient_id
 
+    @profiled
     def action_post(self):
         """Override to update lab status when invoice is posted"""
         res = super(AccountMove, self).action_post()
-        for move in self.filtered('is_lab_invoice'):
-            if move.sample_status == 'draft':
-                move.sample_status = 'invoiced'
+        self.filtered(
+            lambda m: m.is_lab_invoice and m.sample_status == 'draft'
+        ).write({'sample_status': 'invoiced'})
         return res
 
+    def _lab_transition_failures(self, action):
+        """Return {move: reason} for the moves that cannot run ``action``"""
+        failures = {}
+        rule = LAB_TRANSITION_RULES.get(action)
+        if rule:
+            allowed_states, message = rule
+            for move in self:
+                if move.sample_status not in allowed_states:
+                    failures[move] = message
+        if action == 'action_ready_to_print':
+            # Include the tests of departments the user's record rules hide
+            pending = self._all_lab_tests().filtered(lambda t: t.status != 'completed')
+            for move in pending.mapped('invoice_id'):
+                failures[move] = "All tests must be completed before printing."
+        return failures
+
+    def _all_lab_tests(self):
+        """Test requests of every department, for status cascades and checks
+
+        Technicians only see their departments' requests; a visit-level
+        transition must still move and check the others.
+        """
+        return self.sudo().lab_test_ids
+
+    def _check_lab_transition(self, action):
+        """Validate a whole batch, reporting every failing visit at once"""
+        failures = self._lab_transition_failures(action)
+        if failures:
+            raise ValidationError("\n".join(
+                f"{move.barcode_id or move.name}: {reason}"
+                for move, reason in failures.items()
+            ))
+
+    @profiled
     def action_update_sample_collected(self):
-        """Mark sample as collected"""
-        self.ensure_one()
-        if self.sample_status != 'invoiced':
-            raise ValidationError("Sample can only be collected after invoicing.")
-        
-        self.write({
-            'sample_status': 'sample_collected',
-            'sample_collection_time': fields.Datetime.now()
-        })
+        """Mark samples as collected"""
+        self._collect_samples()
+
+    def _collect_samples(self, collection_times=None):
+        """Mark samples collected, stamping each visit with its own scan time
+
+        ``collection_times`` maps move ids to datetimes (default: now).
+        Visits sharing a time are written together.
+        """
+        self._check_lab_transition('action_update_sample_collected')
+        now = fields.Datetime.now()
+        by_time = {}
+        for move in self:
+            by_time.setdefault((collection_times or {}).get(move.id) or now, []).append(move.id)
+        for collection_time, move_ids in by_time.items():
+            self.browse(move_ids).write({
+                'sample_status': 'sample_collected',
+                'sample_collection_time': collection_time
+            })
         
         # Update all test requests
-        self.lab_test_ids.write({'status': 'collected'})
+        self._all_lab_tests().write({'status': 'collected'})
 
+    @api.model
+    @profiled
+    def collect_scanned_samples(self, scans):
+        """Collect a batch of scanned tubes, each stamped with its scan time
+
+        ``scans`` is a list of ``{barcode, scanned_at}`` with an optional
+        ``expected_status``, the status the scanning station last saw. All
+        barcodes are resolved with one indexed search. Returns one outcome
+        per scan: ``collected``, ``unknown``, ``duplicate`` (already
+        collected or scanned twice), ``conflict`` (status changed since the
+        station saw it) or ``wrong_state``.
+        """
+        found = self.search([
+            ('is_lab_invoice', '=', True),
+            ('barcode_id', 'in', list({scan['barcode'] for scan in scans})),
+        ])
+        moves = {move.barcode_id: move for move in found}
+        failures = found._lab_transition_failures('action_update_sample_collected')
+        outcomes = []
+        collect = self.browse()
+        collection_times = {}
+        for scan in scans:
+            move = moves.get(scan['barcode'])
+            outcome = {'barcode': scan['barcode']}
+            expected = scan.get('expected_status')
+            if not move:
+                outcome['result'] = 'unknown'
+            elif move.sample_status == 'sample_collected' or move in collect:
+                outcome.update(result='duplicate', sample_status='sample_collected')
+            elif expected and move.sample_status != expected:
+                outcome.update(result='conflict', sample_status=move.sample_status)
+            elif move in failures:
+                outcome.update(result='wrong_state', sample_status=move.sample_status)
+            else:
+                collect |= move
+                collection_times[move.id] = fields.Datetime.to_datetime(scan.get('scanned_at'))
+                outcome.update(result='collected', sample_status='sample_collected')
+            outcomes.append(outcome)
+        collect._collect_samples(collection_times)
+        return outcomes
+
+    @profiled
     def action_start_diagnosis(self):
         """Start diagnosis process"""
-        self.ensure_one()
-        if self.sample_status != 'sample_collected':
-            raise ValidationError("Cannot start diagnosis before sample collection.")
-        
-        self.sample_status = 'in_diagnosis'
-        self.lab_test_ids.write({'status': 'in_progress'})
+        self._check_lab_transition('action_start_diagnosis')
+        self.write({'sample_status': 'in_diagnosis'})
+        self._all_lab_tests().write({'status': 'in_progress'})
 
+    @profiled
     def action_ready_to_print(self):
         """Mark as ready to print"""
-        self.ensure_one()
-        if not all(test.status == 'completed' for test in self.lab_test_ids):
-            raise ValidationError("All tests must be completed before printing.")
-        
-        self.sample_status = 'ready_to_print'
+        self._check_lab_transition('action_ready_to_print')
+        self.write({'sample_status': 'ready_to_print'})
 
+    @profiled
     def action_mark_printed(self):
         """Mark results as printed"""
-        self.ensure_one()
         self.write({
             'sample_status': 'printed',
             'result_printed': True
         })
-        self.lab_test_ids.write({'status': 'printed'})
+        self._all_lab_tests().write({'status': 'printed'})
 
+    @profiled
     def action_mark_signed(self):
         """Mark results as signed"""
-        self.ensure_one()
-        self.sample_status = 'signed'
+        self.write({'sample_status': 'signed'})
 
+    @profiled
     def action_mark_done(self):
         """Mark process as complete"""
-        self.ensure_one()
         self.write({
             'sample_status': 'done',
             'actual_delivery_date': fields.Date.today()
         })
 
+    def _print_lab_report(self, report_ref):
+        """Queue a merged PDF of the selected visits and open its job"""
+        job = self.env['medical.lab.report.job'].enqueue(
+            f'medical_lab_management.{report_ref}', self)
+        return job.action_open()
+
+    @profiled
     def action_print_worksheet(self):
-        """Print lab worksheet"""
-        self.ensure_one()
-        self.worksheet_printed = True
-        return self.env.ref('medical_lab_management.action_report_lab_worksheet').report_action(self)
+        """Print lab worksheets"""
+        self.filtered(lambda m: not m.worksheet_printed).write({'worksheet_printed': True})
+        return self._print_lab_report('action_report_lab_worksheet')
 
+    @profiled
     def action_print_barcode(self):
-        """Print barcode sticker"""
-        self.ensure_one()
-        self.barcode_printed = True
-        return self.env.ref('medical_lab_management.action_report_lab_barcode').report_action(self)
+        """Print barcode stickers"""
+        self.filtered(lambda m: not m.barcode_printed).write({'barcode_printed': True})
+        return self._print_lab_report('action_report_lab_barcode')
 
+    @profiled
     def action_print_receipt(self):
-        """Print payment receipt"""
-        self.ensure_one()
-        return self.env.ref('medical_lab_management.action_report_lab_receipt').report_action(self)
+        """Print payment receipts"""
+        return self._print_lab_report('action_report_lab_receipt')
 
+    @profiled
     def action_print_results(self):
         """Print test results"""
-        self.ensure_one()
-        if self.sample_status not in ['ready_to_print', 'printed', 'signed', 'done']:
+        not_ready = self.filtered(
+            lambda m: m.sample_status not in ['ready_to_print', 'printed', 'signed', 'done'])
+        if not_ready:
             raise ValidationError("Results can only be printed when ready.")
-        return self.env.ref('medical_lab_management.action_report_lab_results').report_action(self)
+        return self._print_lab_report('action_report_lab_results')
+
+    def write(self, vals):
+        """Log status transitions and drop cached dashboard statistics
+
+        Every ``sample_status`` change of a lab invoice, whichever action
+        made it, is appended to the transition log used for TAT analysis.
+        Recomputed ``payment_state`` values bypass ``write``; see
+        ``_compute_amount``.
+        """
+        counter_fields = {'patient_id', 'referring_doctor_id', 'is_lab_invoice'} & set(vals)
+        old_counts = self._lab_counter_contributions() if counter_fields else None
+        transitions = [
+            (move.id, move.sample_status, vals['sample_status'])
+            for move in self
+            if 'sample_status' in vals and move.is_lab_invoice
+            and move.sample_status != vals['sample_status']
+        ]
+        res = super(AccountMove, self).write(vals)
+        self.env['medical.lab.status.transition']._log(transitions)
+        if counter_fields:
+            self.env['res.partner']._queue_invoice_count_deltas(
+                self._lab_counter_contributions(), old_counts)
+        if {'sample_status', 'payment_state', 'state', 'is_lab_invoice'} & set(vals):
+            self._invalidate_lab_dashboard_cache()
+        return res
+
+    def unlink(self):
+        counts = self._lab_counter_contributions()
+        requests = self._all_lab_tests()
+        tests, request_ids = requests.test_id, requests.ids
+        res = super(AccountMove, self).unlink()
+        # Test requests go with the visit through the database cascade
+        self.env['medical.lab.result.history']._purge(request_ids)
+        self.env['res.partner']._queue_invoice_count_deltas({}, counts)
+        self.env['medical.lab.test']._refresh_stored_test_count(tests.ids)
+        self._invalidate_lab_dashboard_cache()
+        return res
+
+    def _compute_amount(self):
+        """Payments recompute ``payment_state`` and the residual here, not in ``write``"""
+        res = super(AccountMove, self)._compute_amount()
+        if any(move.is_lab_invoice for move in self):
+            self._invalidate_lab_dashboard_cache()
+        return res
+
+    def _invalidate_lab_dashboard_cache(self):
+        """Drop the cached dashboard statistics, in every worker"""
+        self.clear_caches()
 
     @api.model
-    def get_lab_dashboard_data(self):
-        """Get dashboard statistics for lab management"""
-        today = fields.Date.today()
-        
-        # Today's statistics
-        today_invoices = self.search_count([
-            ('is_lab_invoice', '=', True),
-            ('invoice_date', '=', today)
-        ])
-        
+    @profiled
+    def get_lab_dashboard_data(self, use_cache=True):
+        """Get dashboard statistics for lab management
+
+        All figures are computed by a single aggregate query and kept in the
+        registry cache per company set, for at most ``DASHBOARD_CACHE_TTL``
+        seconds (the date of today's visits moves on by itself).
+        """
+        if not use_cache:
+            return self._read_lab_dashboard_data()
+        return self._get_lab_dashboard_data_cached(
+            tuple(sorted(self.env.companies.ids)), int(time.time() // DASHBOARD_CACHE_TTL))
+
+    @api.model
+    @tools.ormcache('company_ids', 'period')
+    def _get_lab_dashboard_data_cached(self, company_ids, period):
+        return self.with_context(allowed_company_ids=list(company_ids))._read_lab_dashboard_data()
+
+    @api.model
+    def _read_lab_dashboard_data(self):
+        """Aggregate status counts, today's visits and amount due in one query"""
+        self.flush(['is_lab_invoice', 'sample_status', 'invoice_date',
+                    'payment_state', 'state', 'amount_residual', 'company_id'])
+        self.env.cr.execute("""
+            SELECT sample_status,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE invoice_date = %(today)s),
+                   COALESCE(SUM(amount_residual) FILTER (
+                       WHERE state = 'posted' AND payment_state != 'paid'), 0)
+              FROM account_move
+             WHERE is_lab_invoice
+               AND company_id IN %(company_ids)s
+          GROUP BY sample_status
+        """, {
+            'today': fields.Date.today(),
+            'company_ids': tuple(self.env.companies.ids),
+        })
+
+        counts = {}
+        today_invoices = 0
+        total_due = 0.0
+        for status, count, today_count, due in self.env.cr.fetchall():
+            counts[status] = count
+            today_invoices += today_count
+            total_due += due
+
         # Status wise count
-        status_data = {}
-        for status, label in self._fields['sample_status'].selection:
-            count = self.search_count([
-                ('is_lab_invoice', '=', True),
-                ('sample_status', '=', status)
-            ])
-            status_data[status] = {'label': label, 'count': count}
-        
-        # Financial summary
-        total_due = sum(self.search([
-            ('is_lab_invoice', '=', True),
-            ('payment_state', '!=', 'paid'),
-            ('state', '=', 'posted')
-        ]).mapped('amount_residual'))
-        
+        status_data = {
+            status: {'label': label, 'count': counts.get(status, 0)}
+            for status, label in self._fields['sample_status'].selection
+        }
+
         return {
             'today_count': today_invoices,
             'status_summary': status_data,
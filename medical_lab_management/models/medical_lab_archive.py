@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# System parameter: age in days after which done visits are archived
+ARCHIVE_AFTER_PARAM = 'medical_lab_management.archive_after_days'
+ARCHIVE_AFTER_DEFAULT = 365
+
+ARCHIVED_COLUMNS = ['id', 'invoice_id', 'test_id', 'status', 'result_value', 'result_status',
+                    'technician_id', 'doctor_id', 'diagnosis_date', 'notes', 'department_id',
+                    'machine_id', 'collection_time']
+
+
+class MedicalLabTestRequestArchive(models.Model):
+    _name = 'medical.lab.test.request.archive'
+    _description = 'Archived Medical Lab Test Request'
+    _order = 'collection_time desc, id desc'
+    # Rows keep the id of the archived request and are only written by the mover
+    _log_access = False
+
+    invoice_id = fields.Many2one('account.move', string='Lab Invoice', readonly=True, index=True)
+    patient_id = fields.Many2one('res.partner', string='Patient', readonly=True, index=True)
+    barcode_id = fields.Char('Barcode ID', readonly=True)
+    test_id = fields.Many2one('medical.lab.test', string='Test', readonly=True)
+    department_id = fields.Many2one('medical.lab.department', string='Department', readonly=True)
+    machine_id = fields.Many2one('medical.lab.machine', string='Machine', readonly=True)
+    status = fields.Char('Status', readonly=True)
+    result_value = fields.Text('Result Value', readonly=True)
+    result_status = fields.Char('Result Status', readonly=True)
+    technician_id = fields.Many2one('res.users', string='Technician', readonly=True)
+    doctor_id = fields.Many2one('res.users', string='Doctor', readonly=True)
+    diagnosis_date = fields.Datetime('Diagnosis Date', readonly=True)
+    collection_time = fields.Datetime('Collection Time', readonly=True)
+    notes = fields.Text('Notes', readonly=True)
+    archived_date = fields.Datetime('Archived On', readonly=True)
+
+    @api.model
+    def _archive_chunk(self, cutoff, chunk_size):
+        """Move one chunk of old, done test requests to the archive
+
+        Rows are locked with SKIP LOCKED so the mover never waits on, or
+        blocks, visits being worked on. Critical value alerts of the moved
+        requests are re-linked to their archived copy. Returns the number
+        of moved rows.
+        """
+        cr = self.env.cr
+        cr.execute("SET LOCAL lock_timeout = '2s'")
+        columns = ', '.join(ARCHIVED_COLUMNS)
+        source = ', '.join(f'r.{column}' for column in ARCHIVED_COLUMNS)
+        cr.execute("""
+            SELECT r.id
+              FROM medical_lab_test_request r
+              JOIN account_move m ON m.id = r.invoice_id
+             WHERE m.is_lab_invoice
+               AND m.sample_status = 'done'
+               AND COALESCE(m.actual_delivery_date, m.invoice_date) < %s
+             ORDER BY r.id
+             LIMIT %s
+               FOR UPDATE OF r SKIP LOCKED
+        """, (cutoff, chunk_size))
+        chunk = tuple(row[0] for row in cr.fetchall())
+        if not chunk:
+            return 0
+        cr.execute(f"""
+            INSERT INTO medical_lab_test_request_archive
+                   ({columns}, patient_id, barcode_id, archived_date)
+            SELECT {source}, m.patient_id, m.barcode_id, now() at time zone 'UTC'
+              FROM medical_lab_test_request r
+              JOIN account_move m ON m.id = r.invoice_id
+             WHERE r.id IN %s
+                ON CONFLICT (id) DO NOTHING
+        """, (chunk,))
+        # Critical value alerts are part of the audit trail: point them at the
+        # archived copy (same id) before the request goes away
+        cr.execute("""
+            UPDATE medical_lab_critical_alert
+               SET archive_request_id = request_id
+             WHERE request_id IN %s
+        """, (chunk,))
+        cr.execute("""
+            DELETE FROM medical_lab_test_request
+             WHERE id IN %s
+         RETURNING invoice_id, test_id
+        """, (chunk,))
+        rows = cr.fetchall()
+        if rows:
+            cr.execute("""
+                UPDATE account_move SET lab_archived = true
+                 WHERE id IN %s AND NOT lab_archived
+            """, (tuple({row[0] for row in rows}),))
+            self.env['medical.lab.test']._refresh_stored_test_count(list({row[1] for row in rows}))
+        return len(rows)
+
+    @api.model
+    def _cron_archive(self, chunk_size=5000, time_budget=600):
+        """Archive done visits older than the configured age, chunk by chunk
+
+        Each chunk is committed on its own, so the run is resumable and
+        stops cleanly when the time budget is spent.
+        """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            ARCHIVE_AFTER_PARAM, ARCHIVE_AFTER_DEFAULT))
+        cutoff = fields.Date.context_today(self) - timedelta(days=days)
+        self.env['medical.lab.test.request'].flush()
+        self.env['account.move'].flush(['sample_status', 'actual_delivery_date', 'invoice_date'])
+        deadline = time.monotonic() + time_budget
+        total = 0
+        while time.monotonic() < deadline:
+            moved = self._archive_chunk(cutoff, chunk_size)
+            self.env.cr.commit()
+            total += moved
+            if moved < chunk_size:
+                break
+        self.env.invalidate_all()
+        _logger.info("Archived %s lab test requests completed before %s", total, cutoff)
+        return total
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+
+from odoo import models, api, tools
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+CATALOG_BATCH_SIZE = 500
+# Catalog sections in load order; each is keyed on its own field
+CATALOG_SECTIONS = ('departments', 'machines', 'categories', 'tests', 'ranges', 'prices')
+CATALOG_KEYS = {
+    'departments': ('medical.lab.department', 'code'),
+    'machines': ('medical.lab.machine', 'name'),
+    'categories': ('medical.lab.test.category', 'code'),
+    'tests': ('medical.lab.test', 'code'),
+}
+# Catalog columns holding a reference to another section, and the section
+CATALOG_REFERENCES = {
+    'department': 'departments',
+    'machine': 'machines',
+    'parent': 'categories',
+    'test': 'tests',
+}
+# Fast creation: no chatter messages or tracking for catalog records
+CATALOG_CONTEXT = {'tracking_disable': True, 'mail_create_nolog': True, 'mail_notrack': True,
+                   'active_test': False}
+
+
+class MedicalLabCatalogLoader(models.AbstractModel):
+    _name = 'medical.lab.catalog.loader'
+    _description = 'Medical Lab Test Catalog Loader'
+
+    @api.model
+    def load_file(self, path, update=True, progress=None):
+        """Load a JSON catalog file, or a directory of ``<section>.csv`` files"""
+        if os.path.isdir(path):
+            sections = {}
+            for section in CATALOG_SECTIONS:
+                section_path = os.path.join(path, f'{section}.csv')
+                if os.path.exists(section_path):
+                    with open(section_path, newline='', encoding='utf-8') as f:
+                        sections[section] = f.read()
+            return self.load_csv(sections, update, progress)
+        with open(path, encoding='utf-8') as f:
+            return self.load_json(f.read(), update, progress)
+
+    @api.model
+    def load_json(self, text, update=True, progress=None):
+        """Load a catalog from JSON
+
+        The document has one list per section. Tests may nest their
+        ``ranges`` and ``prices``; references use codes (machines: names),
+        e.g. ``{"code": "GLU", "department": "BIO", "categories": ["CHEM"]}``.
+        """
+        catalog = json.loads(text)
+        if not isinstance(catalog, dict):
+            raise UserError("A catalog must be a JSON object with one list per section.")
+        catalog = {section: list(catalog.get(section) or []) for section in CATALOG_SECTIONS}
+        for test in catalog['tests']:
+            for section in ('ranges', 'prices'):
+                for row in test.pop(section, None) or []:
+                    catalog[section].append(dict(row, test=test['code']))
+        return self._load(catalog, update, progress)
+
+    @api.model
+    def load_csv(self, sections, update=True, progress=None):
+        """Load a catalog from CSV texts given as {section: csv text}
+
+        Ranges and prices carry a ``test`` column with the test code; test
+        categories are ``;``-separated codes. Empty cells are left unset.
+        """
+        catalog = {section: [] for section in CATALOG_SECTIONS}
+        for section, text in sections.items():
+            if section not in catalog:
+                raise UserError(f"Unknown catalog section: {section}")
+            for row in csv.DictReader(io.StringIO(text)):
+                row = {key.strip(): value.strip() for key, value in row.items()
+                       if key and value and value.strip()}
+                if section == 'tests' and 'categories' in row:
+                    row['categories'] = [code.strip() for code in row['categories'].split(';')
+                                         if code.strip()]
+                catalog[section].append(row)
+        return self._load(catalog, update, progress)
+
+    @api.model
+    def _coerce(self, model, row):
+        """Convert CSV strings to the types of the model's fields"""
+        vals = {}
+        for name, value in row.items():
+            field = model._fields.get(name)
+            if field is None:
+                raise UserError(f"Unknown {model._description} column: {name}")
+            if isinstance(value, str):
+                if field.type == 'float':
+                    value = float(value)
+                elif field.type == 'integer':
+                    value = int(value)
+                elif field.type == 'boolean':
+                    value = tools.str2bool(value)
+            vals[name] = value
+        return vals
+
+    @api.model
+    def _prefetch_ids(self, model_name, key, values):
+        """Map key values to ids of existing records with one query"""
+        Model = self.env[model_name]
+        if not values:
+            return {}
+        Model.flush([key])
+        self.env.cr.execute(
+            f'SELECT "{key}", id FROM "{Model._table}" WHERE "{key}" IN %s',
+            (tuple(values),))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _upsert(self, section, rows, ids, update, report, created):
+        """Create missing records in batches and update existing ones by key
+
+        Keys of the created records are added to ``created``.
+        """
+        model_name, key = CATALOG_KEYS[section]
+        Model = self.env[model_name].with_context(**CATALOG_CONTEXT)
+        section_ids = ids.setdefault(section, {})
+        section_ids.update(self._prefetch_ids(
+            model_name, key, [row[key] for row in rows if row.get(key)]))
+        to_create = []
+        updated = 0
+        seen = set()
+        for row in rows:
+            if not row.get(key):
+                raise UserError(f"Every {section} row needs a '{key}'.")
+            if row[key] in seen:
+                raise UserError(f"Duplicate {section} '{row[key]}'.")
+            seen.add(row[key])
+            vals = self._coerce(Model, self._resolve(row, ids))
+            if row[key] in section_ids:
+                if update:
+                    Model.browse(section_ids[row[key]]).write(vals)
+                    updated += 1
+            else:
+                to_create.append(vals)
+        for start in range(0, len(to_create), CATALOG_BATCH_SIZE):
+            batch = to_create[start:start + CATALOG_BATCH_SIZE]
+            for vals, record in zip(batch, Model.create(batch)):
+                section_ids[vals[key]] = record.id
+                created.add(vals[key])
+            report(section, start + len(batch), len(to_create))
+        return {'created': len(to_create), 'updated': updated}
+
+    @api.model
+    def _prefetch_references(self, catalog, ids):
+        """Ids of existing records referenced by the catalog, one query per section"""
+        referenced = {section: set() for section in CATALOG_KEYS}
+        for rows in catalog.values():
+            for row in rows:
+                for name, section in CATALOG_REFERENCES.items():
+                    if row.get(name):
+                        referenced[section].add(row[name])
+                referenced['categories'].update(row.get('categories') or ())
+        for section, values in referenced.items():
+            ids.setdefault(section, {}).update(
+                self._prefetch_ids(*CATALOG_KEYS[section], values))
+
+    @api.model
+    def _resolve(self, row, ids):
+        """Replace code references of a row by record ids"""
+        vals = {}
+        for name, value in row.items():
+            if name in CATALOG_REFERENCES:
+                section = CATALOG_REFERENCES[name]
+                if value not in ids.get(section, {}):
+                    raise UserError(f"Unknown {name} '{value}'.")
+                vals[f'{name}_id'] = ids[section][value]
+            elif name == 'categories':
+                missing = [code for code in value if code not in ids['categories']]
+                if missing:
+                    raise UserError(f"Unknown categories: {', '.join(missing)}")
+                vals['category_ids'] = [(6, 0, [ids['categories'][code] for code in value])]
+            elif name == 'pricelist':
+                vals['pricelist_id'] = ids['pricelists'][value]
+            elif name == 'selection_options' and not isinstance(value, str):
+                vals[name] = json.dumps(value)
+            else:
+                vals[name] = value
+        return vals
+
+    @api.model
+    def _replace_lines(self, section, rows, ids, report):
+        """Replace ranges or prices of the loaded tests with batched creates"""
+        model_name = {'ranges': 'medical.lab.test.range', 'prices': 'medical.lab.test.price'}[section]
+        Model = self.env[model_name].with_context(**CATALOG_CONTEXT)
+        test_ids = {ids['tests'][row['test']] for row in rows if row.get('test') in ids['tests']}
+        if test_ids:
+            Model.search([('test_id', 'in', list(test_ids))]).unlink()
+        vals_list = [self._coerce(Model, self._resolve(row, ids)) for row in rows]
+        for start in range(0, len(vals_list), CATALOG_BATCH_SIZE):
+            Model.create(vals_list[start:start + CATALOG_BATCH_SIZE])
+            report(section, min(start + CATALOG_BATCH_SIZE, len(vals_list)), len(vals_list))
+        return {'created': len(vals_list), 'replaced_tests': len(test_ids)}
+
+    @api.model
+    def _load(self, catalog, update=True, progress=None):
+        """Load all sections in the current transaction
+
+        Nothing is committed: a failing row rolls the whole catalog back
+        with the caller's transaction. ``progress(section, done, total)``
+        is called after every batch. Returns counts per section.
+        """
+        start = time.perf_counter()
+
+        def report(section, done, total):
+            _logger.info("Lab catalog: %s %d/%d", section, done, total)
+            if progress:
+                progress(section, done, total)
+
+        ids = {}
+        pricelist_names = {row['pricelist'] for row in catalog['prices'] if row.get('pricelist')}
+        if pricelist_names:
+            pricelists = self.env['product.pricelist'].search([('name', 'in', list(pricelist_names))])
+            ids['pricelists'] = {pricelist.name: pricelist.id for pricelist in pricelists}
+            missing = pricelist_names - set(ids['pricelists'])
+            if missing:
+                raise UserError(f"Unknown pricelists: {', '.join(sorted(missing))}")
+
+        self._prefetch_references(catalog, ids)
+        summary = {}
+        created = {}
+        for section in ('departments', 'machines', 'categories', 'tests'):
+            created[section] = set()
+            levels = (self._category_levels(catalog['categories'])
+                      if section == 'categories' else [catalog[section]])
+            counts = {'created': 0, 'updated': 0}
+            for rows in levels:
+                for name, count in self._upsert(section, rows, ids, update, report,
+                                                created[section]).items():
+                    counts[name] += count
+            summary[section] = counts
+        if not update:
+            # Lines of tests that already existed are left alone
+            for section in ('ranges', 'prices'):
+                catalog[section] = [row for row in catalog[section]
+                                    if row.get('test') in created['tests']]
+        for section in ('ranges', 'prices'):
+            summary[section] = self._replace_lines(section, catalog[section], ids, report)
+        summary['seconds'] = round(time.perf_counter() - start, 2)
+        _logger.info("Lab catalog loaded: %s", summary)
+        return summary
+
+    @api.model
+    def _category_levels(self, rows):
+        """Split category rows by depth so parents are created before children"""
+        by_code = {row['code']: row for row in rows if row.get('code')}
+        depths = {}
+
+        def depth(code, path=()):
+            if code in path:
+                raise UserError(f"Recursive category: {code}")
+            if code not in depths:
+                parent = by_code[code].get('parent')
+                depths[code] = depth(parent, path + (code,)) + 1 if parent in by_code else 0
+            return depths[code]
+
+        levels = {}
+        for row in rows:
+            levels.setdefault(depth(row['code']) if row.get('code') else 0, []).append(row)
+        return [levels[level] for level in sorted(levels)]
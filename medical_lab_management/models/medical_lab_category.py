@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+
+
+class MedicalLabTestCategory(models.Model):
+    _name = 'medical.lab.test.category'
+    _description = 'Medical Lab Test Category'
+    _order = 'sequence, name'
+    _parent_store = True
+    _parent_name = 'parent_id'
+
+    name = fields.Char('Category Name', required=True)
+    code = fields.Char('Category Code')
+    parent_id = fields.Many2one('medical.lab.test.category', string='Parent Category',
+                                index=True, ondelete='restrict')
+    child_ids = fields.One2many('medical.lab.test.category', 'parent_id', string='Child Categories')
+    parent_path = fields.Char(index=True)
+    sequence = fields.Integer('Sequence', default=10)
+
+    def init(self):
+        # Descendant lookups are prefix matches on parent_path
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS medical_lab_test_category_parent_path_prefix_idx
+                ON medical_lab_test_category (parent_path text_pattern_ops)
+        """)
+
+    @api.constrains('parent_id')
+    def _check_category_recursion(self):
+        if not self._check_recursion():
+            raise ValidationError("You cannot create recursive categories.")
+
+    @tools.ormcache()
+    def _get_category_test_map(self):
+        """Map each category to the ids of the tests in it or any descendant
+
+        Built with one query over ``parent_path`` and kept in the registry
+        cache until a category or a test's categories change.
+        """
+        self.flush(['parent_path'])
+        self.env['medical.lab.test'].flush(['category_ids'])
+        self.env.cr.execute("""
+            SELECT c.id, array_agg(DISTINCT rel.test_id)
+              FROM medical_lab_test_category c
+              JOIN medical_lab_test_category d ON d.parent_path LIKE c.parent_path || '%'
+              JOIN lab_test_category_rel rel ON rel.category_id = d.id
+          GROUP BY c.id
+        """)
+        return {category_id: frozenset(test_ids) for category_id, test_ids in self.env.cr.fetchall()}
+
+    @api.model
+    def get_test_ids(self, category_ids):
+        """Ids of the tests in any of ``category_ids`` or their descendants"""
+        if isinstance(category_ids, int):
+            category_ids = [category_ids]
+        test_map = self._get_category_test_map()
+        return sorted(set().union(*(test_map.get(category_id, ()) for category_id in category_ids)))
+
+    @api.model
+    def _search_domain(self, operator, value, field='id'):
+        """Domain on ``field`` (a test id field) for a category search"""
+        if operator in ('in', 'not in', '=', '!='):
+            category_ids = value if isinstance(value, (list, tuple)) else [value]
+            category_ids = [category_id for category_id in category_ids if category_id]
+        else:
+            category_ids = self._search([('name', operator, value)])
+        test_ids = self.get_test_ids(list(category_ids))
+        positive = operator not in ('not in', '!=')
+        return [(field, 'in' if positive else 'not in', test_ids)]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        categories = super(MedicalLabTestCategory, self).create(vals_list)
+        self.clear_caches()
+        return categories
+
+    def write(self, vals):
+        res = super(MedicalLabTestCategory, self).write(vals)
+        if 'parent_id' in vals:
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super(MedicalLabTestCategory, self).unlink()
+        self.clear_caches()
+        return res
+
+
+class MedicalLabCategoryTreeMixin(models.AbstractModel):
+    _name = 'medical.lab.category.tree.mixin'
+    _description = 'Search by Test Category Tree'
+    # Field holding the test id, searched for the tests of the category tree
+    _category_test_field = 'test_id'
+
+    category_tree_id = fields.Many2one('medical.lab.test.category', string='Category Tree',
+                                       compute='_compute_category_tree_id',
+                                       search='_search_category_tree_id',
+                                       help='Search by a category or any of its subcategories')
+
+    def _compute_category_tree_id(self):
+        self.category_tree_id = False
+
+    def _search_category_tree_id(self, operator, value):
+        return self.env['medical.lab.test.category']._search_domain(
+            operator, value, self._category_test_field)
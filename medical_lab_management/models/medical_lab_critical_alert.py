@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from markupsafe import Markup
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class MedicalLabCriticalAlert(models.Model):
+    _name = 'medical.lab.critical.alert'
+    _description = 'Medical Lab Critical Value Alert'
+    _order = 'create_date desc, id desc'
+
+    # Alerts outlive their request: archiving moves the link to archive_request_id
+    request_id = fields.Many2one('medical.lab.test.request', string='Test Request',
+                                 ondelete='set null', index=True)
+    archive_request_id = fields.Many2one('medical.lab.test.request.archive',
+                                         string='Archived Test Request', readonly=True,
+                                         ondelete='set null', index=True)
+    invoice_id = fields.Many2one('account.move', string='Lab Invoice',
+                                 related='request_id.invoice_id', store=True)
+    test_id = fields.Many2one('medical.lab.test', string='Test',
+                              related='request_id.test_id', store=True)
+    patient_id = fields.Many2one('res.partner', string='Patient',
+                                 related='invoice_id.patient_id')
+    doctor_id = fields.Many2one('res.partner', string='Referring Doctor',
+                                related='request_id.invoice_id.referring_doctor_id', store=True)
+    result_value = fields.Text('Result Value', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('notified', 'Notified'),
+        ('acknowledged', 'Acknowledged')
+    ], string='State', default='pending', required=True, index=True)
+    notified_time = fields.Datetime('Notified At', readonly=True)
+    acknowledged_by = fields.Many2one('res.users', string='Acknowledged By', readonly=True)
+
+    @api.model
+    def _raise_for(self, requests):
+        """Queue one alert per critical request and wake up the notifier
+
+        Requests already alerted for the same value are skipped, so
+        re-imports do not notify twice. Runs as superuser: whoever may enter
+        a result raises its alert, with or without access to alerts.
+        """
+        if not requests:
+            return self.browse()
+        Alert = self.sudo()
+        existing = Alert.search([('request_id', 'in', requests.ids)])
+        seen = {(alert.request_id.id, alert.result_value) for alert in existing}
+        alerts = Alert.create([
+            {'request_id': request.id, 'result_value': request.result_value}
+            for request in requests
+            if (request.id, request.result_value) not in seen
+        ])
+        if alerts:
+            self.env.ref('medical_lab_management.ir_cron_notify_critical_alerts').sudo()._trigger()
+        return alerts
+
+    def _notify(self):
+        """Notify referring doctors: chatter message on the visit and a sticky popup
+
+        Referring doctors without a login cannot see either, so the lab
+        users responsible for the tests are mentioned instead and get a
+        to-do activity on the visit.
+        """
+        notifications = []
+        for invoice, alerts in self._group_by_invoice().items():
+            # Markup escapes the interpolated patient names and result values
+            lines = Markup().join(
+                Markup("<li>%s: <b>%s</b></li>") % (alert.test_id.display_name, alert.result_value)
+                for alert in alerts
+            )
+            doctor = invoice.referring_doctor_id
+            body = Markup("<p>Critical result(s) for %s:</p><ul>%s</ul>") % (
+                invoice.patient_id.display_name, lines)
+            recipients = doctor.user_ids or alerts._responsible_users()
+            invoice.message_post(
+                body=body,
+                partner_ids=(doctor | recipients.partner_id).ids,
+                subtype_xmlid='mail.mt_comment',
+            )
+            if not doctor.user_ids:
+                for user in recipients:
+                    invoice.activity_schedule(
+                        'mail.mail_activity_data_todo', user_id=user.id,
+                        summary="Critical lab result", note=body)
+            for partner in recipients.partner_id:
+                notifications.append((partner, 'simple_notification', {
+                    'title': "Critical lab result",
+                    'message': f"{invoice.patient_id.display_name} ({invoice.barcode_id}): "
+                               + ", ".join(f"{a.test_id.code} {a.result_value}" for a in alerts),
+                    'sticky': True,
+                    'type': 'danger',
+                }))
+        if notifications:
+            self.env['bus.bus']._sendmany(notifications)
+        self.write({'state': 'notified', 'notified_time': fields.Datetime.now()})
+
+    def _responsible_users(self):
+        """Lab users who follow up the alerts
+
+        Department managers of the tests, else the lab doctors of the
+        requests, else the lab managers.
+        """
+        users = self.test_id.department_id.manager_id or self.request_id.doctor_id
+        return users or self.env.ref('medical_lab_management.group_lab_manager').users
+
+    def _group_by_invoice(self):
+        groups = {}
+        for alert in self:
+            groups.setdefault(alert.invoice_id, self.browse())
+            groups[alert.invoice_id] |= alert
+        return groups
+
+    def action_acknowledge(self):
+        self.write({'state': 'acknowledged', 'acknowledged_by': self.env.uid})
+
+    @api.model
+    def _cron_notify(self):
+        alerts = self.search([('state', '=', 'pending')], order='id')
+        if alerts:
+            alerts._notify()
+            _logger.info("Sent %s critical value alerts", len(alerts))
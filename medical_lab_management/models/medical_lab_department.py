@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class MedicalLabDepartment(models.Model):
+    _name = 'medical.lab.department'
+    _description = 'Medical Lab Department'
+    _order = 'name'
+
+    name = fields.Char('Department Name', required=True)
+    code = fields.Char('Department Code')
+    manager_id = fields.Many2one('res.users', string='Department Manager')
+    location = fields.Char('Location')
+    active = fields.Boolean('Active', default=True)
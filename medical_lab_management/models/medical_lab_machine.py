@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import shutil
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+from ..analyzer import PARSERS
+from ..analyzer.ingest import CHUNK_SIZE
+
+_logger = logging.getLogger(__name__)
+
+
+class MedicalLabMachine(models.Model):
+    _name = 'medical.lab.machine'
+    _description = 'Medical Lab Machine'
+    _order = 'name'
+
+    name = fields.Char('Machine Name', required=True)
+    model = fields.Char('Model')
+    serial_number = fields.Char('Serial Number')
+    department_id = fields.Many2one('medical.lab.department', string='Department')
+    status = fields.Selection([
+        ('active', 'Active'),
+        ('maintenance', 'Under Maintenance'),
+        ('inactive', 'Inactive')
+    ], string='Status', default='active')
+
+    # Result Import
+    protocol = fields.Selection([
+        ('hl7', 'HL7 v2 (ORU^R01)'),
+        ('astm', 'ASTM E1394'),
+    ], string='Protocol')
+    listen_port = fields.Integer('Listen Port', help='TCP port the analyzer connects to')
+    drop_folder = fields.Char('Drop Folder', help='Folder the analyzer writes result files to')
+    import_batch_size = fields.Integer('Import Batch Size', default=200,
+                                       help='Results committed per transaction')
+
+    def write(self, vals):
+        res = super(MedicalLabMachine, self).write(vals)
+        if 'status' in vals:
+            # Machines entering or leaving maintenance change whole queues
+            channels = {f'medical_lab_queue_machine_{machine.id}' for machine in self}
+            channels |= {f'medical_lab_queue_department_{machine.department_id.id}'
+                         for machine in self if machine.department_id}
+            self.env['bus.bus']._sendmany([
+                (channel, 'medical_lab_queue', {'reload': True}) for channel in sorted(channels)
+            ])
+        return res
+
+    def _ingest_results(self, results):
+        """Store a batch of analyzer results on the matching test requests
+
+        Requests are matched on the visit barcode and the test code with two
+        searches for the whole batch; results are then classified against
+        the normal ranges, and critical values raised, in one pass.
+        """
+        self.ensure_one()
+        barcodes = list({result.barcode for result in results})
+        codes = list({result.code for result in results})
+        moves = self.env['account.move'].search([
+            ('is_lab_invoice', '=', True),
+            ('barcode_id', 'in', barcodes),
+        ])
+        requests = self.env['medical.lab.test.request'].search([
+            ('invoice_id', 'in', moves.ids),
+            ('test_id.code', 'in', codes),
+            ('status', 'in', ['collected', 'in_progress', 'completed']),
+        ])
+        by_key = {(req.invoice_id.barcode_id, req.test_id.code): req for req in requests}
+
+        matched = []
+        for result in results:
+            request = by_key.get((result.barcode, result.code))
+            if request:
+                matched.append((request, result))
+            else:
+                _logger.warning("%s: no pending %s test for sample %s",
+                                self.name, result.code, result.barcode)
+        if not matched:
+            return {'matched': 0, 'unmatched': len(results)}
+
+        now = fields.Datetime.now()
+        Request = self.env['medical.lab.test.request'].with_context(medical_lab_defer_results=True)
+        for request, result in matched:
+            Request.browse(request.id).write({
+                'result_value': result.value,
+                'status': 'completed',
+                'diagnosis_date': now,
+            })
+        # Classify the whole batch and raise critical alerts in one go
+        request_ids = list(dict.fromkeys(request.id for request, _r in matched))
+        Request.browse(request_ids)._apply_result_status()
+        return {'matched': len(matched), 'unmatched': len(results) - len(matched)}
+
+    def _import_file(self, path, commit=False):
+        """Stream a result file through the protocol parser in batches
+
+        With ``commit`` (cron only) every batch is committed on its own.
+        """
+        self.ensure_one()
+        parser = PARSERS[self.protocol]()
+        batch_size = self.import_batch_size or 200
+        pending = []
+        stats = {'matched': 0, 'unmatched': 0}
+
+        def _flush_batch(batch):
+            batch_stats = self._ingest_results(batch)
+            for key in stats:
+                stats[key] += batch_stats[key]
+            if commit:
+                self.env.cr.commit()
+
+        with open(path, 'rb') as stream:
+            for data in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                pending.extend(parser.feed(data)[0])
+                while len(pending) >= batch_size:
+                    _flush_batch(pending[:batch_size])
+                    pending = pending[batch_size:]
+        pending.extend(parser.close())
+        if pending:
+            _flush_batch(pending)
+        return stats
+
+    def action_import_drop_folder(self):
+        """Import every result file waiting in the machines' drop folders
+
+        Runs in the caller's transaction; files are moved to the
+        ``processed`` sub-folder once it is committed.
+        """
+        return self._import_drop_folders(commit=False)
+
+    def _import_drop_folders(self, commit):
+        """Import the drop folders; files move to ``processed`` once committed
+
+        With ``commit`` each batch and file is committed as it goes, so an
+        interrupted run resumes with the remaining files.
+        """
+        moves = []
+        for machine in self:
+            if not machine.protocol or not machine.drop_folder:
+                raise UserError(f"{machine.name}: set a protocol and a drop folder first.")
+            if not os.path.isdir(machine.drop_folder):
+                _logger.warning("%s: drop folder %s does not exist", machine.name, machine.drop_folder)
+                continue
+            done_folder = os.path.join(machine.drop_folder, 'processed')
+            os.makedirs(done_folder, exist_ok=True)
+            for name in sorted(os.listdir(machine.drop_folder)):
+                path = os.path.join(machine.drop_folder, name)
+                if not os.path.isfile(path):
+                    continue
+                stats = machine._import_file(path, commit)
+                if commit:
+                    shutil.move(path, os.path.join(done_folder, name))
+                else:
+                    moves.append((path, os.path.join(done_folder, name)))
+                _logger.info("%s: imported %s (%s matched, %s unmatched)",
+                             machine.name, name, stats['matched'], stats['unmatched'])
+        if moves:
+            def move_files():
+                for source, target in moves:
+                    shutil.move(source, target)
+            self.env.cr.postcommit.add(move_files)
+        return True
+
+    @api.model
+    def _cron_import_drop_folders(self):
+        self.search([
+            ('status', '=', 'active'),
+            ('protocol', '!=', False),
+            ('drop_folder', '!=', False),
+        ])._import_drop_folders(commit=True)
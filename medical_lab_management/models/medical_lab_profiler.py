@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+import odoo
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.tools.cache import STAT
+
+_logger = logging.getLogger(__name__)
+
+# System parameter with the share of calls to profile, 0 (off) to 1 (every call)
+PROFILE_RATE_PARAM = 'medical_lab_management.profiling_sample_rate'
+# Samples a worker keeps before writing them to medical_lab_profile_sample;
+# older ones are dropped first if the table cannot be written
+PROFILE_BUFFER_SIZE = 5000
+PROFILE_FLUSH_SIZE = 200
+PROFILE_FLUSH_INTERVAL = 60
+PROFILE_KEEP_DAYS = 7
+
+# Samples of this worker process not yet written, per database
+_pending = defaultdict(lambda: deque(maxlen=PROFILE_BUFFER_SIZE))
+_last_flush = {}
+_samples_lock = threading.Lock()
+
+
+def profile_rate(env):
+    """Configured sampling rate; the parameter read is served from the registry cache"""
+    try:
+        return float(env['ir.config_parameter'].sudo().get_param(PROFILE_RATE_PARAM) or 0.0)
+    except ValueError:
+        return 0.0
+
+
+def _ormcache_misses(dbname):
+    """Registry ormcache misses of ``dbname`` so far in this process
+
+    ``STAT`` is shared by every thread of the process, so the difference
+    around a call only belongs to that call when the process serves one
+    request at a time (prefork workers). Returns None otherwise.
+    """
+    if not odoo.multi_process:
+        return None
+    return sum(stat.miss for key, stat in list(STAT.items()) if key[0] == dbname)
+
+
+def flush_samples(registry, force=False):
+    """Write the pending samples of this worker for ``registry`` to the sample table
+
+    Without ``force`` this only happens once ``PROFILE_FLUSH_SIZE`` samples
+    are pending or ``PROFILE_FLUSH_INTERVAL`` seconds after the last write.
+    Uses its own cursor so the caller's transaction is left alone.
+    """
+    dbname = registry.db_name
+    with _samples_lock:
+        pending = _pending[dbname]
+        if not pending:
+            return
+        due = (len(pending) >= PROFILE_FLUSH_SIZE
+               or time.time() - _last_flush.get(dbname, 0) >= PROFILE_FLUSH_INTERVAL)
+        if not (force or due):
+            return
+        batch = list(pending)
+        pending.clear()
+        _last_flush[dbname] = time.time()
+    try:
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['medical.lab.profile.sample'].create(batch)
+    except Exception:
+        _logger.warning("Could not store %d profiling samples", len(batch), exc_info=True)
+
+
+def clear_samples(env):
+    """Drop the stored samples and the ones still pending in this worker"""
+    with _samples_lock:
+        _pending[env.cr.dbname].clear()
+    env.cr.execute("DELETE FROM medical_lab_profile_sample")
+
+
+def profiled(method):
+    """Record query count, ormcache misses and wall time of sampled calls
+
+    Only a ``profile_rate`` share of calls is measured; the others pay one
+    cached parameter read and a random draw.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        rate = profile_rate(self.env)
+        if rate <= 0 or random.random() >= rate:
+            return method(self, *args, **kwargs)
+        cr = self.env.cr
+        dbname = cr.dbname
+        queries = cr.sql_log_count
+        misses = _ormcache_misses(dbname)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            wall_ms = (time.perf_counter() - start) * 1000
+            sample = {
+                'sampled_at': fields.Datetime.now(),
+                'model_name': self._name,
+                'method': name,
+                'records': len(self._ids),
+                'wall_ms': round(wall_ms, 3),
+                'queries': cr.sql_log_count - queries,
+                'ormcache_misses': None if misses is None else _ormcache_misses(dbname) - misses,
+                'user_id': self.env.uid,
+                'worker_pid': os.getpid(),
+            }
+            with _samples_lock:
+                _pending[dbname].append(sample)
+            flush_samples(self.env.registry)
+
+    return wrapper
+
+
+class MedicalLabProfileSample(models.Model):
+    _name = 'medical.lab.profile.sample'
+    _description = 'Lab Hot Path Profile Sample'
+    _order = 'sampled_at desc, id desc'
+    # Only written by flush_samples
+    _log_access = False
+
+    sampled_at = fields.Datetime('Sampled At', readonly=True, index=True)
+    model_name = fields.Char('Model', readonly=True)
+    method = fields.Char('Method', readonly=True)
+    records = fields.Integer('Records', readonly=True)
+    wall_ms = fields.Float('Time (ms)', readonly=True)
+    queries = fields.Integer('Queries', readonly=True)
+    ormcache_misses = fields.Integer(
+        'Ormcache Misses', readonly=True,
+        help="Registry ormcache misses during the call (not record cache misses). "
+             "Only measured in prefork workers, empty otherwise.")
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    worker_pid = fields.Integer('Worker PID', readonly=True)
+
+    @api.model
+    def _summary(self, since=None):
+        """Per method call count, wall time percentiles and mean query/miss counts"""
+        self.env.cr.execute("""
+            SELECT model_name, method, count(*), avg(wall_ms),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY wall_ms), max(wall_ms),
+                   avg(queries), avg(ormcache_misses)
+              FROM medical_lab_profile_sample
+             WHERE %s IS NULL OR sampled_at > %s
+          GROUP BY model_name, method
+          ORDER BY model_name, method
+        """, (since, since))
+        return [{
+            'model': model,
+            'method': method,
+            'calls': calls,
+            'wall_avg_ms': round(wall_avg, 3),
+            'wall_p95_ms': round(wall_p95, 3),
+            'wall_max_ms': wall_max,
+            'queries_avg': round(float(queries_avg), 2),
+            'ormcache_misses_avg': None if misses_avg is None else round(float(misses_avg), 2),
+        } for model, method, calls, wall_avg, wall_p95, wall_max, queries_avg, misses_avg
+            in self.env.cr.fetchall()]
+
+    @api.autovacuum
+    def _gc_samples(self):
+        self.env.cr.execute(
+            "DELETE FROM medical_lab_profile_sample WHERE sampled_at < %s",
+            (fields.Datetime.now() - timedelta(days=PROFILE_KEEP_DAYS),))
+
+
+class MedicalLabProfileReport(models.TransientModel):
+    _name = 'medical.lab.profile.report'
+    _description = 'Lab Hot Path Profile'
+    _order = 'wall_avg_ms desc'
+
+    model_name = fields.Char('Model', readonly=True)
+    method = fields.Char('Method', readonly=True)
+    calls = fields.Integer('Sampled Calls', readonly=True)
+    wall_avg_ms = fields.Float('Avg Time (ms)', readonly=True)
+    wall_p95_ms = fields.Float('P95 Time (ms)', readonly=True)
+    wall_max_ms = fields.Float('Max Time (ms)', readonly=True)
+    queries_avg = fields.Float('Avg Queries', readonly=True)
+    ormcache_misses_avg = fields.Float('Avg Ormcache Misses', readonly=True)
+
+    @api.model
+    def action_open_report(self):
+        """Summarize the stored samples of all workers into rows and open them"""
+        flush_samples(self.env.registry, force=True)
+        self.search([('create_uid', '=', self.env.uid)]).unlink()
+        vals_list = self.env['medical.lab.profile.sample'].sudo()._summary()
+        for vals in vals_list:
+            vals['model_name'] = vals.pop('model')
+        rows = self.create(vals_list)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Lab Hot Path Profile',
+            'res_model': self._name,
+            'view_mode': 'tree',
+            'domain': [('id', 'in', rows.ids)],
+        }
+
+    @api.model
+    def action_clear_samples(self):
+        clear_samples(self.env)
+        return self.action_open_report()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import odoo
+from odoo import models, fields, api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# Reports rendered concurrently by one server process (wkhtmltopdf instances)
+REPORT_WORKERS = 4
+_executor = None
+_executor_lock = threading.Lock()
+
+# Records printed with a visit, whose changes invalidate a cached PDF
+CACHE_DEPENDENCIES = ('patient_id', 'referring_doctor_id', 'lab_test_ids', 'lab_test_ids.test_id')
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS,
+                                           thread_name_prefix='lab-report')
+        return _executor
+
+
+def _render_jobs(dbname, job_ids):
+    """Worker entry point: render queued jobs with a fresh cursor"""
+    threading.current_thread().dbname = dbname
+    try:
+        with odoo.registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['medical.lab.report.job'].browse(job_ids)._render()
+    except Exception:
+        _logger.exception("Lab report jobs %s failed", job_ids)
+
+
+class MedicalLabReportJob(models.Model):
+    _name = 'medical.lab.report.job'
+    _description = 'Medical Lab Report Rendering Job'
+    _order = 'id desc'
+
+    name = fields.Char('Report', required=True)
+    report_ref = fields.Char('Report XML ID', required=True)
+    res_model = fields.Char('Model', required=True)
+    res_ids = fields.Char('Record IDs', required=True)
+    cache_key = fields.Char('Cache Key', index=True, copy=False)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], string='State', default='queued', required=True, index=True)
+    attachment_id = fields.Many2one('ir.attachment', string='PDF', readonly=True)
+    error = fields.Text('Error', readonly=True)
+    user_id = fields.Many2one('res.users', string='Requested By', default=lambda self: self.env.user)
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
+    lang = fields.Char('Language', default=lambda self: self.env.lang)
+
+    @api.model
+    def _cache_key(self, report_ref, records):
+        """Key a rendering by report, requester, records and their last modification
+
+        The requester's user, language and companies are part of the key:
+        the PDF is rendered with their access rights and translations.
+        Patients, doctors, test requests and tests printed with the records
+        count as well, so editing a result invalidates the rendering.
+        """
+        parts = [report_ref, str(self.env.uid), self.env.lang or '',
+                 ','.join(str(company_id) for company_id in sorted(self.env.companies.ids))]
+        for record in records:
+            parts.append(f"{record.id}:{record.write_date}")
+            for path in CACHE_DEPENDENCIES:
+                if path.split('.')[0] in record._fields:
+                    related = record.mapped(path)
+                    parts.append(','.join(f"{r.id}:{r.write_date}" for r in related.sorted('id')))
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    @api.model
+    def enqueue(self, report_ref, records):
+        """Queue one merged PDF of ``records``; reuse a cached rendering if any
+
+        Records are printed in id order. Returns the job, which may already
+        be done when the same user rendered the same records before and
+        nothing printed on them changed since.
+        """
+        records = records.sorted('id')
+        cache_key = self._cache_key(report_ref, records)
+        cached = self.search([
+            ('cache_key', '=', cache_key),
+            ('state', '=', 'done'),
+            ('user_id', '=', self.env.uid),
+            ('company_id', '=', self.env.company.id),
+            ('lang', '=', self.env.lang),
+        ], limit=1)
+        if cached and cached.attachment_id:
+            return cached
+        report = self.env.ref(report_ref)
+        job = self.create({
+            'name': report.name,
+            'report_ref': report_ref,
+            'res_model': records._name,
+            'res_ids': ','.join(str(record_id) for record_id in records.ids),
+            'cache_key': cache_key,
+        })
+        dbname = self.env.cr.dbname
+        self.env.cr.postcommit.add(lambda: _get_executor().submit(_render_jobs, dbname, job.ids))
+        return job
+
+    def _claim(self):
+        """Atomically switch queued jobs to running; return the claimed ones"""
+        if not self.ids:
+            return self.browse()
+        self.flush(['state'])
+        self.env.cr.execute("""
+            UPDATE medical_lab_report_job SET state = 'running', write_date = now() at time zone 'UTC'
+             WHERE id IN %s AND state = 'queued'
+         RETURNING id
+        """, (tuple(self.ids),))
+        claimed = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.invalidate_cache(['state'])
+        self.env.cr.commit()
+        return claimed
+
+    def _render(self):
+        for job in self._claim():
+            try:
+                report = self.env.ref(job.report_ref).with_user(job.user_id).with_company(
+                    job.company_id).with_context(lang=job.lang)
+                res_ids = [int(res_id) for res_id in job.res_ids.split(',')]
+                pdf, _format = report._render_qweb_pdf(res_ids)
+                attachment = self.env['ir.attachment'].create({
+                    'name': f"{job.name}.pdf",
+                    'datas': base64.b64encode(pdf),
+                    'mimetype': 'application/pdf',
+                    'res_model': job._name,
+                    'res_id': job.id,
+                })
+                job.write({'state': 'done', 'attachment_id': attachment.id})
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Rendering lab report job %s failed", job.id)
+                job.write({'state': 'failed', 'error': str(e)})
+            self.env.cr.commit()
+
+    def get_status(self):
+        """Polling endpoint for the UI: state and download URL of each job"""
+        return [{
+            'id': job.id,
+            'state': job.state,
+            'error': job.error or False,
+            'url': job.attachment_id and f"/web/content/{job.attachment_id.id}?download=true" or False,
+        } for job in self]
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/web/content/{self.attachment_id.id}?download=true",
+            'target': 'self',
+        }
+
+    def action_open(self):
+        """Download a finished job or show the job while it renders"""
+        self.ensure_one()
+        if self.state == 'done' and self.attachment_id:
+            return self.action_download()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.model
+    def _cron_process_queue(self):
+        """Render jobs left behind by a restarted server, and purge old ones"""
+        stale = fields.Datetime.now() - timedelta(minutes=5)
+        self.search([('state', '=', 'running'), ('write_date', '<', stale)]).write({'state': 'queued'})
+        self.search([('state', '=', 'queued'), ('create_date', '<', stale)])._render()
+        old_jobs = self.search([('create_date', '<', fields.Datetime.now() - timedelta(days=7))])
+        old_jobs.attachment_id.unlink()
+        old_jobs.unlink()
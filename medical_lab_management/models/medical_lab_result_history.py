@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+# Numeric results are parsed once, when the history row is written
+NUMERIC_RESULT_SQL = r"""
+    CASE WHEN trim(r.result_value) ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+         THEN trim(r.result_value)::float END
+"""
+
+
+class MedicalLabResultHistory(models.Model):
+    _name = 'medical.lab.result.history'
+    _description = 'Medical Lab Cumulative Result History'
+    _order = 'patient_id, test_id, collection_time desc'
+    # Read-optimized copy of entered results; the request is referenced by
+    # id only so history stays available once visits are archived.
+    _log_access = False
+
+    patient_id = fields.Many2one('res.partner', string='Patient', required=True,
+                                 ondelete='cascade')
+    test_id = fields.Many2one('medical.lab.test', string='Test', required=True,
+                              ondelete='cascade')
+    collection_time = fields.Datetime('Collection Time', required=True)
+    request_id = fields.Integer('Test Request', required=True)
+    value_text = fields.Char('Result')
+    value_numeric = fields.Float('Numeric Result')
+    result_status = fields.Char('Result Status', size=16)
+
+    _sql_constraints = [
+        ('request_unique', 'unique(request_id)', 'A test request has one history entry.'),
+    ]
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS medical_lab_result_history_trend_idx
+                ON medical_lab_result_history (patient_id, test_id, collection_time DESC)
+        """)
+
+    @api.model
+    def _sync(self, request_ids):
+        """Upsert the history rows of the given test requests in one statement"""
+        if not request_ids:
+            return
+        self.env['medical.lab.test.request'].flush(
+            ['result_value', 'result_status', 'collection_time', 'test_id', 'invoice_id'])
+        self.env['account.move'].flush(['patient_id'])
+        self.env.cr.execute("""
+            DELETE FROM medical_lab_result_history h
+             USING medical_lab_test_request r
+             WHERE h.request_id = r.id AND r.id IN %s
+               AND COALESCE(trim(r.result_value), '') = ''
+        """, (tuple(request_ids),))
+        self.env.cr.execute("""
+            INSERT INTO medical_lab_result_history
+                   (request_id, patient_id, test_id, collection_time,
+                    value_text, value_numeric, result_status)
+            SELECT r.id, m.patient_id, r.test_id, COALESCE(r.collection_time, m.create_date),
+                   trim(r.result_value), %s, r.result_status
+              FROM medical_lab_test_request r
+              JOIN account_move m ON m.id = r.invoice_id
+             WHERE r.id IN %%s AND m.patient_id IS NOT NULL
+               AND COALESCE(trim(r.result_value), '') != ''
+                ON CONFLICT (request_id) DO UPDATE
+               SET patient_id = EXCLUDED.patient_id,
+                   test_id = EXCLUDED.test_id,
+                   collection_time = EXCLUDED.collection_time,
+                   value_text = EXCLUDED.value_text,
+                   value_numeric = EXCLUDED.value_numeric,
+                   result_status = EXCLUDED.result_status
+        """ % NUMERIC_RESULT_SQL, (tuple(request_ids),))
+        self.invalidate_cache()
+
+    @api.model
+    def _purge(self, request_ids):
+        """Drop the history rows of deleted test requests"""
+        if not request_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM medical_lab_result_history WHERE request_id IN %s", (tuple(request_ids),))
+        self.invalidate_cache()
+
+    @api.model
+    def rebuild(self):
+        """Fill the history from every test request with a result"""
+        self.env.cr.execute("""
+            SELECT id FROM medical_lab_test_request
+             WHERE COALESCE(trim(result_value), '') != ''
+        """)
+        request_ids = [row[0] for row in self.env.cr.fetchall()]
+        for start in range(0, len(request_ids), 10000):
+            self._sync(request_ids[start:start + 10000])
+
+    @api.model
+    def get_trend(self, patient_id, test_id, limit=50):
+        """Latest results of a test for a patient, newest first"""
+        return self.search_read(
+            [('patient_id', '=', patient_id), ('test_id', '=', test_id)],
+            ['collection_time', 'value_text', 'value_numeric', 'result_status', 'request_id'],
+            limit=limit,
+        )
+
+    @api.model
+    def get_previous_values(self, request_ids):
+        """Return {request_id: (value_text, value_numeric, collection_time)}
+
+        The previous value is the latest earlier result of the same test
+        for the same patient. One index-backed query for the whole batch.
+        """
+        if not request_ids:
+            return {}
+        self.env['medical.lab.test.request'].flush(['collection_time', 'test_id', 'invoice_id'])
+        self.env['account.move'].flush(['patient_id'])
+        self.env.cr.execute("""
+            SELECT r.id, prev.value_text, prev.value_numeric, prev.collection_time
+              FROM medical_lab_test_request r
+              JOIN account_move m ON m.id = r.invoice_id
+      CROSS JOIN LATERAL (
+                    SELECT h.value_text, h.value_numeric, h.collection_time
+                      FROM medical_lab_result_history h
+                     WHERE h.patient_id = m.patient_id
+                       AND h.test_id = r.test_id
+                       AND h.request_id != r.id
+                       AND h.collection_time < COALESCE(r.collection_time, m.create_date)
+                  ORDER BY h.collection_time DESC
+                     LIMIT 1
+                   ) prev
+             WHERE r.id IN %s
+        """, (tuple(request_ids),))
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def get_deltas(self, request_ids, previous=None):
+        """Return {request_id: current - previous} for numeric results of a batch
+
+        ``previous`` may pass an already fetched ``get_previous_values`` result.
+        """
+        if previous is None:
+            previous = self.get_previous_values(request_ids)
+        if not previous:
+            return {}
+        self.env.cr.execute("""
+            SELECT request_id, value_numeric FROM medical_lab_result_history
+             WHERE request_id IN %s AND value_numeric IS NOT NULL
+        """, (tuple(previous),))
+        deltas = {}
+        for request_id, value in self.env.cr.fetchall():
+            prev_numeric = previous[request_id][1]
+            if prev_numeric is not None:
+                deltas[request_id] = value - prev_numeric
+        return deltas
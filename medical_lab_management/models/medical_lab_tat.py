@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+TAT_DIMENSIONS = [
+    ('test', 'Test'),
+    ('department', 'Department'),
+    ('machine', 'Machine'),
+]
+
+
+class MedicalLabStatusTransition(models.Model):
+    _name = 'medical.lab.status.transition'
+    _description = 'Medical Lab Status Transition'
+    _order = 'transition_time, id'
+    # Append-only log: no audit columns, and a plain integer visit reference so
+    # history survives archiving or deleting the visit.
+    _log_access = False
+
+    move_id = fields.Integer('Lab Invoice', required=True, index=True)
+    from_status = fields.Char('From', size=16)
+    to_status = fields.Char('To', size=16, required=True)
+    transition_time = fields.Datetime('Time', required=True)
+    user_id = fields.Integer('User')
+
+    @api.model
+    def _log(self, transitions):
+        """Append ``(move_id, from_status, to_status)`` rows in one INSERT"""
+        if not transitions:
+            return
+        move_ids, from_states, to_states = zip(*transitions)
+        self.env.cr.execute("""
+            INSERT INTO medical_lab_status_transition
+                   (move_id, from_status, to_status, transition_time, user_id)
+            SELECT unnest(%s::int[]), unnest(%s::varchar[]), unnest(%s::varchar[]),
+                   now() at time zone 'UTC', %s
+        """, (list(move_ids), list(from_states), list(to_states), self.env.uid))
+
+
+class MedicalLabTatReport(models.Model):
+    _name = 'medical.lab.tat.report'
+    _description = 'Medical Lab Turnaround Time Analysis'
+    _inherit = ['medical.lab.category.tree.mixin']
+    _auto = False
+    _order = 'month desc, dimension, sample_count desc'
+
+    month = fields.Date('Month', readonly=True)
+    dimension = fields.Selection(TAT_DIMENSIONS, string='Grouped By', readonly=True)
+    dimension_key = fields.Integer('Dimension Key', readonly=True)
+    test_id = fields.Many2one('medical.lab.test', string='Test', readonly=True)
+    department_id = fields.Many2one('medical.lab.department', string='Department', readonly=True)
+    machine_id = fields.Many2one('medical.lab.machine', string='Machine', readonly=True)
+    sample_count = fields.Integer('Samples', readonly=True)
+    result_p50 = fields.Float('Collection → Result P50 (h)', readonly=True)
+    result_p90 = fields.Float('Collection → Result P90 (h)', readonly=True)
+    result_p95 = fields.Float('Collection → Result P95 (h)', readonly=True)
+    delivery_p50 = fields.Float('Result → Delivery P50 (h)', readonly=True)
+    delivery_p90 = fields.Float('Result → Delivery P90 (h)', readonly=True)
+    delivery_p95 = fields.Float('Result → Delivery P95 (h)', readonly=True)
+
+    def init(self):
+        """Materialize monthly TAT percentiles per test, department and machine
+
+        Durations come from the transition log: collection is the first move
+        to ``sample_collected``, the result is the request's diagnosis date
+        (or the visit becoming ``ready_to_print``) and delivery is ``done``.
+        """
+        cr = self.env.cr
+        cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s" % self._table)
+        cr.execute("""
+            CREATE MATERIALIZED VIEW %s AS (
+                WITH visit AS (
+                    SELECT move_id,
+                           MIN(transition_time) FILTER (WHERE to_status = 'sample_collected') AS collected,
+                           MIN(transition_time) FILTER (WHERE to_status = 'ready_to_print') AS resulted,
+                           MIN(transition_time) FILTER (WHERE to_status = 'done') AS delivered
+                      FROM medical_lab_status_transition
+                  GROUP BY move_id
+                ), sample AS (
+                    SELECT date_trunc('month', v.collected)::date AS month,
+                           r.test_id, r.department_id, r.machine_id,
+                           EXTRACT(EPOCH FROM COALESCE(r.diagnosis_date, v.resulted) - v.collected) / 3600
+                               AS result_hours,
+                           EXTRACT(EPOCH FROM v.delivered - COALESCE(r.diagnosis_date, v.resulted)) / 3600
+                               AS delivery_hours
+                      FROM visit v
+                      -- Archived requests keep counting in the statistics
+                      JOIN (SELECT invoice_id, test_id, department_id, machine_id, diagnosis_date
+                              FROM medical_lab_test_request
+                             UNION ALL
+                            SELECT invoice_id, test_id, department_id, machine_id, diagnosis_date
+                              FROM medical_lab_test_request_archive) r ON r.invoice_id = v.move_id
+                     WHERE v.collected IS NOT NULL
+                ), stats AS (
+                    SELECT month,
+                           CASE WHEN GROUPING(test_id) = 0 THEN 'test'
+                                WHEN GROUPING(department_id) = 0 THEN 'department'
+                                ELSE 'machine' END AS dimension,
+                           test_id, department_id, machine_id,
+                           COUNT(*) AS sample_count,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY result_hours) AS result_p50,
+                           percentile_cont(0.9) WITHIN GROUP (ORDER BY result_hours) AS result_p90,
+                           percentile_cont(0.95) WITHIN GROUP (ORDER BY result_hours) AS result_p95,
+                           percentile_cont(0.5) WITHIN GROUP (ORDER BY delivery_hours) AS delivery_p50,
+                           percentile_cont(0.9) WITHIN GROUP (ORDER BY delivery_hours) AS delivery_p90,
+                           percentile_cont(0.95) WITHIN GROUP (ORDER BY delivery_hours) AS delivery_p95
+                      FROM sample
+                  GROUP BY month, GROUPING SETS ((test_id), (department_id), (machine_id))
+                )
+                SELECT row_number() OVER (ORDER BY month, dimension, test_id, department_id, machine_id) AS id,
+                       -- Plain non-null key of the row within its month and dimension,
+                       -- needed for the unique index of REFRESH ... CONCURRENTLY
+                       COALESCE(CASE dimension WHEN 'test' THEN test_id
+                                               WHEN 'department' THEN department_id
+                                               ELSE machine_id END, 0) AS dimension_key,
+                       stats.*
+                  FROM stats
+            )
+        """ % self._table)
+        cr.execute("""
+            CREATE UNIQUE INDEX %s_key_idx ON %s (month, dimension, dimension_key)
+        """ % (self._table, self._table))
+
+    @api.model
+    def _cron_refresh(self):
+        """Refresh the materialized percentiles without blocking readers"""
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+
+    @api.model
+    def get_tat_stats(self, dimension='test', date_from=None, date_to=None, category_id=None):
+        """Monthly TAT percentiles of one dimension, read from the materialized view
+
+        ``category_id`` keeps the tests of a category and its subcategories
+        (only meaningful for the test dimension).
+        """
+        domain = [('dimension', '=', dimension)]
+        if category_id:
+            domain.append(('category_tree_id', '=', category_id))
+        if date_from:
+            domain.append(('month', '>=', date_from))
+        if date_to:
+            domain.append(('month', '<=', date_to))
+        return self.search_read(domain, [
+            'month', 'test_id', 'department_id', 'machine_id', 'sample_count',
+            'result_p50', 'result_p90', 'result_p95',
+            'delivery_p50', 'delivery_p90', 'delivery_p95',
+        ])
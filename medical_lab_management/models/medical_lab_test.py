@@ -1,15 +1,52 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 import json
+import re
+from bisect import bisect_right
 from odoo.exceptions import ValidationError
+from odoo.modules.module import get_module_resource
+from .medical_lab_profiler import profiled
+
+# System parameter switching the lab counters to their materialized columns
+STORED_COUNTERS_PARAM = 'medical_lab_management.stored_counters'
+
+# Compiled range entry: (age_from, age_to, order, min, max, critical_min, critical_max, range_id)
+RANGE_AGE_FROM, RANGE_AGE_TO, RANGE_ORDER = 0, 1, 2
+RANGE_MIN, RANGE_MAX, RANGE_CRITICAL_MIN, RANGE_CRITICAL_MAX, RANGE_ID = 3, 4, 5, 6, 7
+
+# Custom result templates use {{ name }} placeholders from this list
+TEMPLATE_PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+TEMPLATE_PLACEHOLDERS = (
+    'test_name', 'test_code', 'result', 'result_status', 'unit', 'normal_range',
+    'methodology', 'notes', 'patient_name', 'patient_code', 'gender', 'age',
+    'collection_time', 'diagnosis_date', 'technician', 'doctor', 'barcode',
+)
+
+
+def stored_counters_enabled(env):
+    """Whether lab counters are read from their materialized columns"""
+    return tools.str2bool(env['ir.config_parameter'].sudo().get_param(STORED_COUNTERS_PARAM, 'False'))
+
+
+def _to_float(value):
+    """Return ``value`` as a float, or None when it is not numeric"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
 
 
 class MedicalLabTest(models.Model):
     _name = 'medical.lab.test'
     _description = 'Medical Lab Test Configuration'
     _order = 'sequence, name'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'medical.lab.category.tree.mixin']
+    _category_test_field = 'id'
 
     name = fields.Char('Test Name', required=True, tracking=True)
     code = fields.Char('Test Code', required=True, copy=False, index=True)
@@ -76,6 +113,9 @@ class MedicalLabTest(models.Model):
     
     # Statistics
     test_count = fields.Integer('Total Tests', compute='_compute_test_count')
+    stored_test_count = fields.Integer('Stored Test Count', readonly=True, copy=False,
+                                       help='Materialized counter, maintained when stored '
+                                            'counters are enabled')
     
     _sql_constraints = [
         ('code_unique', 'unique(code)', 'Test code must be unique!'),
@@ -90,6 +130,7 @@ class MedicalLabTest(models.Model):
         return result
 
     @api.model
+    @profiled
     def name_search(self, name='', args=None, operator='ilike', limit=100):
         if args is None:
             args = []
@@ -99,11 +140,66 @@ class MedicalLabTest(models.Model):
                         ('shortcut', operator, name)]
         return self.search(domain, limit=limit).name_get()
 
+    @profiled
     def _compute_test_count(self):
         """Count total test requests for this test"""
-        TestRequest = self.env['medical.lab.test.request']
+        if stored_counters_enabled(self.env):
+            for test in self:
+                test.test_count = test.stored_test_count
+            return
+        counts = {}
+        if self.ids:
+            groups = self.env['medical.lab.test.request'].read_group(
+                [('test_id', 'in', self.ids)], ['test_id'], ['test_id'])
+            counts = {group['test_id'][0]: group['test_id_count'] for group in groups}
         for test in self:
-            test.test_count = TestRequest.search_count([('test_id', '=', test.id)])
+            test.test_count = counts.get(test.id, 0)
+
+    @api.model
+    def _refresh_stored_test_count(self, test_ids):
+        """Recount the materialized test count of the given tests"""
+        if not test_ids or not stored_counters_enabled(self.env):
+            return
+        self.env['medical.lab.test.request'].flush(['test_id'])
+        self.env.cr.execute("""
+            UPDATE medical_lab_test t
+               SET stored_test_count = (SELECT COUNT(*) FROM medical_lab_test_request r
+                                         WHERE r.test_id = t.id)
+             WHERE t.id IN %s
+        """, (tuple(test_ids),))
+        self.browse(test_ids).invalidate_cache(['stored_test_count'])
+
+    @api.model
+    def _parse_selection_options_text(self, text):
+        """Parse and validate selection options JSON; raise ValueError if invalid"""
+        options = json.loads(text)
+        if not isinstance(options, list):
+            raise ValueError("Options must be a list")
+        for opt in options:
+            if not isinstance(opt, dict) or 'value' not in opt:
+                raise ValueError("Each option must have a 'value' key")
+        return options
+
+    @tools.ormcache('test_id', 'write_date')
+    def _get_parsed_selection_options(self, test_id, write_date, text):
+        """Parsed options and value -> label map, cached per test version
+
+        Keyed by test id and write date, so a write never serves stale
+        options; ``write`` also clears the cache when the options change.
+        """
+        try:
+            options = self._parse_selection_options_text(text)
+        except ValueError:
+            # json.JSONDecodeError is a ValueError
+            return (), {}
+        labels = {str(opt['value']): opt.get('label', opt['value']) for opt in options}
+        return tuple(options), labels
+
+    def _selection_options_entry(self):
+        if self.result_type == 'selection' and self.selection_options:
+            return self._get_parsed_selection_options(
+                self.id, self.write_date, self.selection_options)
+        return (), {}
 
     @api.constrains('selection_options')
     def _check_selection_options(self):
@@ -111,95 +207,236 @@ class MedicalLabTest(models.Model):
         for test in self:
             if test.result_type == 'selection' and test.selection_options:
                 try:
-                    options = json.loads(test.selection_options)
-                    if not isinstance(options, list):
-                        raise ValueError("Options must be a list")
-                    for opt in options:
-                        if not isinstance(opt, dict) or 'value' not in opt:
-                            raise ValueError("Each option must have a 'value' key")
-                except (json.JSONDecodeError, ValueError) as e:
+                    test._parse_selection_options_text(test.selection_options)
+                except ValueError as e:
                     raise ValidationError(f"Invalid selection options format: {str(e)}")
 
     def get_selection_options(self):
         """Get parsed selection options"""
         self.ensure_one()
-        if self.result_type == 'selection' and self.selection_options:
-            try:
-                return json.loads(self.selection_options)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return list(self._selection_options_entry()[0])
+
+    def get_selection_options_map(self):
+        """Get parsed selection options of every test as {test_id: options}"""
+        return {test.id: list(test._selection_options_entry()[0]) for test in self}
+
+    def get_selection_label(self, value):
+        """Return the label of a selection result value, or the value itself"""
+        self.ensure_one()
+        return self._selection_options_entry()[1].get(str(value), value)
+
+    def get_selection_labels(self, values):
+        """Return labels for ``values`` aligned with the tests of ``self``
+
+        ``self`` is a single test applied to every value or a recordset
+        aligned with ``values`` (browse with repeated ids), as in
+        ``evaluate_results``.
+        """
+        tests = list(self) * len(values) if len(self.ids) == 1 else list(self)
+        if len(tests) != len(values):
+            raise ValueError("get_selection_labels needs one test or one test per value")
+        labels = {}
+        result = []
+        for test, value in zip(tests, values):
+            if test.id not in labels:
+                labels[test.id] = test._selection_options_entry()[1]
+            result.append(labels[test.id].get(str(value), value))
+        return result
+
+    @api.model
+    def _compile_template_text(self, text):
+        """Split a custom template into literal chunks and placeholder names
+
+        Returns ``(literals, names)`` with one more literal than names;
+        raises ValueError on unknown or malformed placeholders.
+        """
+        parts = TEMPLATE_PLACEHOLDER_RE.split(text)
+        literals, names = tuple(parts[0::2]), tuple(parts[1::2])
+        unknown = sorted(set(names) - set(TEMPLATE_PLACEHOLDERS))
+        if unknown:
+            raise ValueError(f"Unknown placeholders: {', '.join(unknown)}")
+        if any('{{' in literal or '}}' in literal for literal in literals):
+            raise ValueError("Placeholders must look like {{ name }}")
+        return literals, names
+
+    @tools.ormcache('test_id', 'write_date')
+    def _get_compiled_template(self, test_id, write_date, text):
+        """Compiled custom template, cached per test version"""
+        return self._compile_template_text(text)
+
+    def _template_entry(self):
+        if self.report_template == 'custom' and self.custom_template:
+            return self._get_compiled_template(self.id, self.write_date, self.custom_template)
+        return None
+
+    @api.constrains('report_template', 'custom_template')
+    def _check_custom_template(self):
+        """Validate placeholders of custom templates"""
+        for test in self:
+            if test.report_template == 'custom' and test.custom_template:
+                try:
+                    test._compile_template_text(test.custom_template)
+                except ValueError as e:
+                    raise ValidationError(f"Invalid custom template: {str(e)}")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        tests = super(MedicalLabTest, self).create(vals_list)
+        if any(vals.get('category_ids') for vals in vals_list):
+            # Drops the category -> tests map
+            self.clear_caches()
+        return tests
+
+    def write(self, vals):
+        res = super(MedicalLabTest, self).write(vals)
+        if {'result_type', 'selection_options', 'report_template', 'custom_template',
+                'category_ids'} & set(vals):
+            # Drops the range index, parsed selection options, compiled templates
+            # and the category -> tests map
+            self._invalidate_range_index()
+        return res
+
+    def unlink(self):
+        res = super(MedicalLabTest, self).unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    def _invalidate_range_index(self):
+        """Drop the compiled normal-range index of this registry"""
+        self.clear_caches()
+
+    @tools.ormcache()
+    def _get_range_index(self):
+        """Compile normal ranges into test -> gender -> sorted age intervals
+
+        Built lazily with one query and kept in the registry cache until a
+        range (or a test's result type) is written. Each gender bucket is a
+        ``(starts, entries)`` pair sorted by lower age bound for bisection;
+        ``first`` keeps the fallback range of the test.
+        """
+        self.env['medical.lab.test.range'].flush()
+        self.flush(['result_type'])
+        self.env.cr.execute("""
+            SELECT r.test_id, r.gender, r.age_from, r.age_to, r.min_value, r.max_value,
+                   r.critical_min, r.critical_max, r.id
+              FROM medical_lab_test_range r
+              JOIN medical_lab_test t ON t.id = r.test_id
+             WHERE t.result_type = 'range'
+          ORDER BY r.test_id, r.id
+        """)
+        ranges = {}
+        for order, row in enumerate(self.env.cr.fetchall()):
+            test_id, gender, age_from, age_to, min_value, max_value, cmin, cmax, range_id = row
+            # Float columns cannot be empty: 0.0 (or NULL) means no critical bound
+            entry = (age_from or 0, age_to or float('inf'), order,
+                     min_value or 0.0, max_value or 0.0, cmin or None, cmax or None, range_id)
+            ranges.setdefault(test_id, []).append((gender or 'all', entry))
+
+        index = {}
+        for test_id, test_ranges in ranges.items():
+            compiled = {'first': test_ranges[0][1]}
+            for key in ('all', 'male', 'female'):
+                entries = sorted(
+                    (entry for gender, entry in test_ranges if gender in ('all', key)),
+                    key=lambda e: (e[RANGE_AGE_FROM], e[RANGE_ORDER]),
+                )
+                compiled[key] = ([e[RANGE_AGE_FROM] for e in entries], entries)
+            index[test_id] = compiled
+        return index
+
+    @api.model
+    def _lookup_range(self, index, test_id, gender, age):
+        """Return the compiled range entry matching gender and age"""
+        compiled = index.get(test_id)
+        if not compiled:
+            return None
+        starts, entries = compiled[gender if gender in ('male', 'female') else 'all']
+        if age is None:
+            candidates = entries
+        else:
+            candidates = [e for e in entries[:bisect_right(starts, age)]
+                          if age <= e[RANGE_AGE_TO]]
+        if candidates:
+            return min(candidates, key=lambda e: e[RANGE_ORDER])
+        # Return first range if no specific match
+        return compiled['first']
+
+    def get_effective_prices(self, pricelist=None, on_date=None):
+        """Return {test_id: price} effective for a pricelist on a date
+
+        Prices of the pricelist win over prices without a pricelist, which
+        win over ``list_price``. Period lookups use the cached per-pricelist
+        intervals, so pricing a whole invoice costs at most one query.
+        """
+        Price = self.env['medical.lab.test.price']
+        on_date = on_date or fields.Date.context_today(self)
+        specific = Price._get_price_intervals(pricelist.id) if pricelist else {}
+        generic = Price._get_price_intervals(None)
+        prices = {}
+        for test in self:
+            price = Price._find_price(specific, test.id, on_date)
+            if price is None:
+                price = Price._find_price(generic, test.id, on_date)
+            prices[test.id] = test.list_price if price is None else price
+        return prices
 
     def get_normal_range(self, gender='all', age=None):
         """Get applicable normal range based on gender and age"""
         self.ensure_one()
         if self.result_type != 'range':
             return None
-            
-        # Find matching range
-        for range_rec in self.normal_ranges:
-            if range_rec.gender != 'all' and range_rec.gender != gender:
-                continue
-            if age is not None:
-                if range_rec.age_from and age < range_rec.age_from:
-                    continue
-                if range_rec.age_to and age > range_rec.age_to:
-                    continue
-            return range_rec
-            
-        # Return first range if no specific match
-        return self.normal_ranges[0] if self.normal_ranges else None
+        entry = self._lookup_range(self._get_range_index(), self.id, gender, age)
+        return self.env['medical.lab.test.range'].browse(entry[RANGE_ID]) if entry else None
 
+    @profiled
     def evaluate_result(self, value, gender='all', age=None):
         """Evaluate test result against normal ranges"""
         self.ensure_one()
-        
-        if self.result_type == 'range':
-            normal_range = self.get_normal_range(gender, age)
-            if normal_range and isinstance(value, (int, float)):
-                if value < normal_range.min_value:
-                    return 'low'
-                elif value > normal_range.max_value:
-                    return 'high'
-                else:
-                    return 'normal'
-        
-        return None
+        return self.evaluate_results([value], gender, age)[0]
+
+    @profiled
+    def evaluate_results(self, values, genders='all', ages=None):
+        """Classify a batch of results in one pass
+
+        ``self`` is either a single test applied to every value or a
+        recordset aligned with ``values`` (browse with repeated ids for
+        panels). ``genders`` and ``ages`` are lists aligned with ``values``
+        or scalars applied to all of them. Returns a list of 'critical',
+        'low', 'high', 'normal' or None (no range or non-numeric value).
+        """
+        count = len(values)
+        test_ids = self.ids * count if len(self.ids) == 1 else self.ids
+        if len(test_ids) != count:
+            raise ValueError("evaluate_results needs one test or one test per value")
+        if not isinstance(genders, (list, tuple)):
+            genders = [genders] * count
+        if not isinstance(ages, (list, tuple)):
+            ages = [ages] * count
+
+        index = self._get_range_index()
+        results = []
+        for test_id, value, gender, age in zip(test_ids, values, genders, ages):
+            value = _to_float(value)
+            entry = value is not None and self._lookup_range(index, test_id, gender, age)
+            if not entry:
+                results.append(None)
+            elif ((entry[RANGE_CRITICAL_MIN] is not None and value < entry[RANGE_CRITICAL_MIN])
+                    or (entry[RANGE_CRITICAL_MAX] is not None and value > entry[RANGE_CRITICAL_MAX])):
+                results.append('critical')
+            elif value < entry[RANGE_MIN]:
+                results.append('low')
+            elif value > entry[RANGE_MAX]:
+                results.append('high')
+            else:
+                results.append('normal')
+        return results
 
     @api.model
     def create_common_tests(self):
-        """Create common lab tests - used for initial setup"""
-        common_tests = [
-            {
-                'name': 'Complete Blood Count',
-                'code': 'CBC',
-                'sample_type': 'blood',
-                'result_type': 'range',
-                'unit': 'cells/μL',
-                'list_price': 25.0,
-            },
-            {
-                'name': 'Blood Glucose',
-                'code': 'GLU',
-                'sample_type': 'blood',
-                'result_type': 'range',
-                'unit': 'mg/dL',
-                'list_price': 15.0,
-            },
-            {
-                'name': 'COVID-19 RT-PCR',
-                'code': 'COV19',
-                'sample_type': 'swab',
-                'result_type': 'selection',
-                'selection_options': json.dumps([
-                    {'value': 'positive', 'label': 'Positive'},
-                    {'value': 'negative', 'label': 'Negative'},
-                    {'value': 'inconclusive', 'label': 'Inconclusive'}
-                ]),
-                'list_price': 100.0,
-            },
-        ]
-        
-        for test_vals in common_tests:
-            if not self.search([('code', '=', test_vals['code'])]):
-                self.create(test_vals)
\ No newline at end of file
+        """Create common lab tests - used for initial setup
+
+        Existing tests (by code) are left untouched.
+        """
+        path = get_module_resource('medical_lab_management', 'data', 'medical_lab_common_tests.json')
+        return self.env['medical.lab.catalog.loader'].load_file(path, update=False)
\ No newline at end of file
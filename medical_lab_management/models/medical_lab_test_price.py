@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+
+
+class MedicalLabTestPrice(models.Model):
+    _name = 'medical.lab.test.price'
+    _description = 'Medical Lab Test Price'
+    _order = 'test_id, pricelist_id, date_start'
+
+    test_id = fields.Many2one('medical.lab.test', string='Test', required=True,
+                              ondelete='cascade')
+    pricelist_id = fields.Many2one('product.pricelist', string='Pricelist')
+    price = fields.Float('Price', required=True, digits='Product Price')
+    currency_id = fields.Many2one('res.currency', related='pricelist_id.currency_id')
+    date_start = fields.Date('Start Date')
+    date_end = fields.Date('End Date')
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS medical_lab_test_price_lookup_idx
+                ON medical_lab_test_price (pricelist_id, test_id, date_start, date_end, price)
+        """)
+
+    @api.constrains('test_id', 'pricelist_id', 'date_start', 'date_end')
+    def _check_overlapping_periods(self):
+        """Prevent two prices of a test and pricelist from applying on the same day"""
+        for price in self:
+            if price.date_start and price.date_end and price.date_start > price.date_end:
+                raise ValidationError("The start date must be before the end date.")
+        self.flush(['test_id', 'pricelist_id', 'date_start', 'date_end'])
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM medical_lab_test_price a
+              JOIN medical_lab_test_price b
+                ON b.test_id = a.test_id
+               AND b.pricelist_id IS NOT DISTINCT FROM a.pricelist_id
+               AND b.id != a.id
+               AND daterange(a.date_start, a.date_end, '[]')
+                   && daterange(b.date_start, b.date_end, '[]')
+             WHERE a.id IN %s
+             LIMIT 1
+        """, (tuple(self.ids),))
+        row = self.env.cr.fetchone()
+        if row:
+            price = self.browse(row[0])
+            raise ValidationError(
+                f"{price.test_id.display_name}: the price period overlaps another price "
+                f"of the same pricelist.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        prices = super(MedicalLabTestPrice, self).create(vals_list)
+        self.clear_caches()
+        return prices
+
+    def write(self, vals):
+        res = super(MedicalLabTestPrice, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super(MedicalLabTestPrice, self).unlink()
+        self.clear_caches()
+        return res
+
+    @tools.ormcache('pricelist_id')
+    def _get_price_intervals(self, pricelist_id):
+        """Return {test_id: ((date_start, date_end, price), ...)} of a pricelist
+
+        Loaded with one index-backed query per pricelist and kept in the
+        registry cache until a price is written. ``pricelist_id`` may be
+        None for prices that apply to every pricelist.
+        """
+        self.flush(['test_id', 'pricelist_id', 'date_start', 'date_end', 'price'])
+        self.env.cr.execute("""
+            SELECT test_id, date_start, date_end, price
+              FROM medical_lab_test_price
+             WHERE pricelist_id IS NOT DISTINCT FROM %s
+          ORDER BY test_id, date_start NULLS FIRST
+        """, (pricelist_id,))
+        intervals = {}
+        for test_id, date_start, date_end, price in self.env.cr.fetchall():
+            intervals.setdefault(test_id, []).append((date_start, date_end, price))
+        return {test_id: tuple(rows) for test_id, rows in intervals.items()}
+
+    @api.model
+    def _find_price(self, intervals, test_id, on_date):
+        for date_start, date_end, price in intervals.get(test_id, ()):
+            if (not date_start or date_start <= on_date) and (not date_end or on_date <= date_end):
+                return price
+        return None
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class MedicalLabTestRange(models.Model):
+    _name = 'medical.lab.test.range'
+    _description = 'Medical Lab Test Normal Range'
+    _order = 'test_id, id'
+
+    test_id = fields.Many2one('medical.lab.test', string='Test', required=True,
+                              ondelete='cascade', index=True)
+    gender = fields.Selection([
+        ('all', 'All'),
+        ('male', 'Male'),
+        ('female', 'Female')
+    ], string='Gender', default='all')
+    age_from = fields.Integer('Age From (Years)')
+    age_to = fields.Integer('Age To (Years)')
+    min_value = fields.Float('Minimum Value')
+    max_value = fields.Float('Maximum Value')
+    critical_min = fields.Float('Critical Low', help='Results below this value are critical. '
+                                                    'Leave at 0 to disable.')
+    critical_max = fields.Float('Critical High', help='Results above this value are critical. '
+                                                      'Leave at 0 to disable.')
+    unit = fields.Char('Unit')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(MedicalLabTestRange, self).create(vals_list)
+        self.env['medical.lab.test']._invalidate_range_index()
+        return records
+
+    def write(self, vals):
+        res = super(MedicalLabTestRange, self).write(vals)
+        self.env['medical.lab.test']._invalidate_range_index()
+        return res
+
+    def unlink(self):
+        res = super(MedicalLabTestRange, self).unlink()
+        self.env['medical.lab.test']._invalidate_range_index()
+        return res
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from markupsafe import Markup, escape
+
+from odoo import models, fields, api, tools
+
+from .medical_lab_test import RANGE_MIN, RANGE_MAX
+
+# Statuses a request waits in on a bench work queue
+QUEUE_STATUSES = ('collected', 'in_progress')
+QUEUE_FIELDS = ['invoice_id', 'test_id', 'status', 'department_id', 'machine_id',
+                'collection_time', 'expected_completion']
+
+
+class MedicalLabTestRequest(models.Model):
+    _name = 'medical.lab.test.request'
+    _description = 'Medical Lab Test Request'
+    _inherit = ['medical.lab.category.tree.mixin']
+    _order = 'invoice_id, id'
+
+    invoice_id = fields.Many2one('account.move', string='Lab Invoice', required=True,
+                                 ondelete='cascade', index=True)
+    test_id = fields.Many2one('medical.lab.test', string='Test', required=True, index=True)
+    patient_id = fields.Many2one('res.partner', string='Patient',
+                                 related='invoice_id.patient_id')
+    status = fields.Selection([
+        ('pending', 'Pending'),
+        ('collected', 'Sample Collected'),
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+        ('verified', 'Verified'),
+        ('printed', 'Printed')
+    ], string='Status', default='pending')
+    result_value = fields.Text('Result Value')
+    result_status = fields.Selection([
+        ('normal', 'Normal'),
+        ('low', 'Low'),
+        ('high', 'High'),
+        ('critical', 'Critical')
+    ], string='Result Status')
+    technician_id = fields.Many2one('res.users', string='Technician')
+    doctor_id = fields.Many2one('res.users', string='Doctor')
+    diagnosis_date = fields.Datetime('Diagnosis Date')
+    notes = fields.Text('Notes')
+    previous_result_value = fields.Char('Previous Result', compute='_compute_previous_result')
+    result_delta = fields.Float('Change', compute='_compute_previous_result')
+
+    # Work Queue
+    department_id = fields.Many2one('medical.lab.department', string='Department',
+                                    related='test_id.department_id', store=True, index=True)
+    machine_id = fields.Many2one('medical.lab.machine', string='Machine',
+                                 related='test_id.machine_id', store=True)
+    collection_time = fields.Datetime('Collection Time',
+                                      related='invoice_id.sample_collection_time', store=True)
+    expected_completion = fields.Datetime('Expected Completion',
+                                          compute='_compute_expected_completion', store=True)
+
+    def _compute_previous_result(self):
+        """Previous value of the same test for the patient, from the history store"""
+        History = self.env['medical.lab.result.history']
+        request_ids = [request_id for request_id in self.ids if isinstance(request_id, int)]
+        previous = History.get_previous_values(request_ids)
+        deltas = History.get_deltas(request_ids, previous)
+        for request in self:
+            prev = previous.get(request.id)
+            request.previous_result_value = prev[0] if prev else False
+            request.result_delta = deltas.get(request.id, 0.0)
+
+    def init(self):
+        """Covering indexes for the pending department and machine queues"""
+        for column in ('department_id', 'machine_id'):
+            self.env.cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS medical_lab_test_request_{column}_queue_idx
+                    ON medical_lab_test_request ({column}, expected_completion, id)
+                 WHERE status IN ('collected', 'in_progress')
+            """)
+
+    @api.depends('collection_time', 'test_id.processing_time')
+    def _compute_expected_completion(self):
+        for request in self:
+            if request.collection_time:
+                request.expected_completion = request.collection_time + timedelta(
+                    hours=request.test_id.processing_time or 0)
+            else:
+                request.expected_completion = False
+
+    @api.model
+    def _queue_domain(self, department_id=None, machine_id=None):
+        domain = [
+            ('status', 'in', list(QUEUE_STATUSES)),
+            '|', ('machine_id', '=', False), ('machine_id.status', '!=', 'maintenance'),
+        ]
+        if department_id:
+            domain.append(('department_id', '=', department_id))
+        if machine_id:
+            domain.append(('machine_id', '=', machine_id))
+        return domain
+
+    @api.model
+    def get_work_queue(self, department_id=None, machine_id=None, limit=200):
+        """Pending requests of a bench ordered by expected completion
+
+        Bench screens load this once, then apply the incremental updates
+        pushed on ``_queue_channels`` instead of searching again.
+        """
+        return self.search_read(self._queue_domain(department_id, machine_id), QUEUE_FIELDS,
+                                order='expected_completion, id', limit=limit)
+
+    def _queue_channels(self):
+        """Bus channels of the department and machine queues of the requests"""
+        channels = set()
+        for request in self:
+            if request.department_id:
+                channels.add(f'medical_lab_queue_department_{request.department_id.id}')
+            if request.machine_id:
+                channels.add(f'medical_lab_queue_machine_{request.machine_id.id}')
+        return channels
+
+    def _notify_queues(self, channels=None):
+        """Push the current queue rows of the requests to their bench channels"""
+        if not self:
+            return
+        channels = (channels or set()) | self._queue_channels()
+        queued = self.filtered(lambda r: r.status in QUEUE_STATUSES
+                               and r.machine_id.status != 'maintenance')
+        message = {
+            'upserted': queued.read(QUEUE_FIELDS) if queued else [],
+            'removed': (self - queued).ids,
+        }
+        self.env['bus.bus']._sendmany([
+            (channel, 'medical_lab_queue', message) for channel in sorted(channels)
+        ])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        requests = super(MedicalLabTestRequest, self).create(vals_list)
+        self.env['medical.lab.test']._refresh_stored_test_count(requests.test_id.ids)
+        requests.filtered(lambda r: r.status in QUEUE_STATUSES)._notify_queues()
+        with_results = requests.filtered('result_value')
+        if with_results and not self.env.context.get('medical_lab_defer_results'):
+            # Statuses given explicitly are kept, the others are evaluated
+            to_evaluate = self.browse([request.id for request, vals in zip(requests, vals_list)
+                                       if 'result_status' not in vals])
+            with_results._apply_result_status(evaluate=to_evaluate & with_results)
+        return requests
+
+    def write(self, vals):
+        old_tests = self.test_id if 'test_id' in vals else self.env['medical.lab.test']
+        queue_change = {'status', 'test_id', 'invoice_id'} & set(vals)
+        old_channels = self._queue_channels() if queue_change else set()
+        res = super(MedicalLabTestRequest, self).write(vals)
+        if 'test_id' in vals:
+            self.env['medical.lab.test']._refresh_stored_test_count((old_tests | self.test_id).ids)
+        if queue_change:
+            self._notify_queues(old_channels)
+        if (('result_value' in vals or vals.get('result_status') == 'critical')
+                and not self.env.context.get('medical_lab_defer_results')):
+            self._apply_result_status(evaluate=self.browse() if 'result_status' in vals else None)
+        return res
+
+    def _evaluate_result_status(self):
+        """Classify the result values of the requests in one pass
+
+        Returns {request: status}; patient ages are taken at each visit's
+        collection date with one query for the batch.
+        """
+        requests = self.filtered('result_value')
+        if not requests:
+            return {}
+        ages = requests.invoice_id.get_patient_ages()
+        statuses = self.env['medical.lab.test'].browse(
+            [request.test_id.id for request in requests]
+        ).evaluate_results(
+            [request.result_value for request in requests],
+            [request.invoice_id.patient_id.gender for request in requests],
+            [ages.get(request.invoice_id.id) for request in requests],
+        )
+        return dict(zip(requests, statuses))
+
+    def _apply_result_status(self, evaluate=None):
+        """Store evaluated result statuses and raise alerts for critical values
+
+        ``evaluate`` limits the evaluation to some of the requests (default:
+        all); the others keep the status they were given. Statuses are only
+        written when the ranges produce one, so selection, descriptive and
+        non-numeric results keep their manual status. Statuses are written
+        with one ``write`` per distinct status, so the check stays cheap on
+        batch imports of thousands of results.
+        """
+        requests = self.with_context(medical_lab_defer_results=True)
+        to_evaluate = requests if evaluate is None else evaluate.with_context(
+            medical_lab_defer_results=True)
+        if to_evaluate:
+            by_status = {}
+            for request, status in to_evaluate._evaluate_result_status().items():
+                if status and request.result_status != status:
+                    by_status.setdefault(status, []).append(request.id)
+            for status, request_ids in by_status.items():
+                requests.browse(request_ids).write({'result_status': status})
+        critical = requests.filtered(lambda r: r.result_status == 'critical')
+        self.env['medical.lab.critical.alert']._raise_for(critical)
+        self.env['medical.lab.result.history']._sync(self.ids)
+
+    def render_custom_results(self):
+        """Fill the custom templates of a batch of results in one pass
+
+        Returns {request_id: Markup} for the requests whose test uses a
+        custom template. Templates come from the compiled cache; ages,
+        normal ranges and selection labels are resolved once for the batch.
+        Template HTML is trusted, placeholder values are escaped.
+        """
+        requests = self.filtered(lambda r: r.test_id._template_entry())
+        if not requests:
+            return {}
+        Test = self.env['medical.lab.test']
+        ages = requests.invoice_id.get_patient_ages()
+        tests = Test.browse([request.test_id.id for request in requests])
+        results = tests.get_selection_labels([request.result_value or '' for request in requests])
+        index = Test._get_range_index()
+        rendered = {}
+        for request, result in zip(requests, results):
+            test, move = request.test_id, request.invoice_id
+            patient = move.patient_id
+            age = ages.get(move.id)
+            entry = Test._lookup_range(index, test.id, patient.gender, age)
+            values = {
+                'test_name': test.name,
+                'test_code': test.code,
+                'result': result,
+                'result_status': dict(self._fields['result_status'].selection).get(
+                    request.result_status, ''),
+                'unit': test.unit,
+                'normal_range': entry and f"{entry[RANGE_MIN]:g} - {entry[RANGE_MAX]:g}",
+                'methodology': test.methodology,
+                'notes': request.notes,
+                'patient_name': patient.name,
+                'patient_code': patient.patient_id,
+                'gender': dict(patient._fields['gender'].selection).get(patient.gender, ''),
+                'age': age,
+                'collection_time': request.collection_time and tools.format_datetime(
+                    self.env, request.collection_time),
+                'diagnosis_date': request.diagnosis_date and tools.format_datetime(
+                    self.env, request.diagnosis_date),
+                'technician': request.technician_id.name,
+                'doctor': request.doctor_id.name,
+                'barcode': move.barcode_id,
+            }
+            literals, names = test._template_entry()
+            parts = [literals[0]]
+            for name, literal in zip(names, literals[1:]):
+                value = values[name]
+                parts.append(escape('' if value is None or value is False else value))
+                parts.append(literal)
+            rendered[request.id] = Markup(''.join(parts))
+        return rendered
+
+    def unlink(self):
+        test_ids = self.test_id.ids
+        request_ids = self.ids
+        res = super(MedicalLabTestRequest, self).unlink()
+        self.env['medical.lab.test']._refresh_stored_test_count(test_ids)
+        # Deleted (mis-entered) results must not linger as previous values
+        self.env['medical.lab.result.history']._purge(request_ids)
+        return res
@@ -1,8 +1,37 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from .medical_lab_test import stored_counters_enabled
+from .medical_lab_profiler import profiled
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from functools import lru_cache
+import logging
+import re
+
+_logger = logging.getLogger(__name__)
+
+LAB_BARCODE_RE = re.compile(r'^LAB\d{8,}$')
+
+# System parameter holding the date of the last stored age refresh
+AGE_REFRESH_PARAM = 'medical_lab_management.age_refresh_date'
+
+
+@lru_cache(maxsize=4096)
+def age_delta(date_of_birth, on_date):
+    """Return the relativedelta between a birth date and ``on_date``"""
+    return relativedelta(on_date, date_of_birth)
+
+
+def format_age(delta):
+    """Format an age delta as shown on patient records"""
+    if delta.years > 0:
+        return f"{delta.years} Year{'s' if delta.years > 1 else ''}"
+    elif delta.months > 0:
+        return f"{delta.months} Month{'s' if delta.months > 1 else ''}"
+    elif delta.days > 0:
+        return f"{delta.days} Day{'s' if delta.days > 1 else ''}"
+    return "0 Days"
 
 
 class ResPartner(models.Model):
@@ -33,47 +62,216 @@ class ResPartner(models.Model):
                                           string='Referred Invoices', 
                                           domain=[('is_lab_invoice', '=', True)])
     referred_invoice_count = fields.Integer('Referred Count', compute='_compute_referred_count')
+    stored_lab_invoice_count = fields.Integer('Stored Invoice Count', readonly=True, copy=False)
+    stored_referred_invoice_count = fields.Integer('Stored Referred Count', readonly=True, copy=False)
 
-    @api.model
-    def create(self, vals):
-        """Generate unique IDs for patients and doctors"""
-        if vals.get('is_patient') and not vals.get('patient_id'):
-            vals['patient_id'] = self.env['ir.sequence'].next_by_code('medical.patient.id') or '/'
-        if vals.get('is_doctor') and not vals.get('doctor_id'):
-            vals['doctor_id'] = self.env['ir.sequence'].next_by_code('medical.doctor.id') or '/'
-        return super(ResPartner, self).create(vals)
+    @api.model_create_multi
+    @profiled
+    def create(self, vals_list):
+        """Generate unique IDs for patients and doctors, one sequence call per batch"""
+        Sequence = self.env['ir.sequence']
+        for flag, field_name, code in [('is_patient', 'patient_id', 'medical.patient.id'),
+                                       ('is_doctor', 'doctor_id', 'medical.doctor.id')]:
+            missing = [vals for vals in vals_list
+                       if vals.get(flag) and not vals.get(field_name)]
+            for vals, ref in zip(missing, Sequence.next_block_by_code(code, len(missing))):
+                vals[field_name] = ref or '/'
+        return super(ResPartner, self).create(vals_list)
 
     @api.depends('date_of_birth')
+    @profiled
     def _compute_age_display(self):
-        """Calculate and format age display based on date of birth"""
+        """Calculate and format age display based on date of birth
+
+        The stored value is kept current by ``_cron_refresh_age_display``.
+        """
         today = date.today()
         for partner in self:
             if partner.date_of_birth:
-                delta = relativedelta(today, partner.date_of_birth)
-                
-                # Format age based on the duration
-                if delta.years > 0:
-                    partner.age_display = f"{delta.years} Year{'s' if delta.years > 1 else ''}"
-                elif delta.months > 0:
-                    partner.age_display = f"{delta.months} Month{'s' if delta.months > 1 else ''}"
-                elif delta.days > 0:
-                    partner.age_display = f"{delta.days} Day{'s' if delta.days > 1 else ''}"
-                else:
-                    partner.age_display = "0 Days"
+                partner.age_display = format_age(age_delta(partner.date_of_birth, today))
             else:
                 partner.age_display = False
 
+    def get_age_at(self, on_date=None):
+        """Return {partner_id: age in whole years} at ``on_date`` (default today)
+
+        Computed by one SQL expression over the recordset; partners without
+        a date of birth map to None.
+        """
+        if not self.ids:
+            return {}
+        self.flush(['date_of_birth'])
+        self.env.cr.execute("""
+            SELECT id, date_part('year', age(%s, date_of_birth))::int
+              FROM res_partner
+             WHERE id IN %s AND date_of_birth IS NOT NULL
+        """, (on_date or fields.Date.context_today(self), tuple(self.ids)))
+        ages = dict.fromkeys(self.ids)
+        ages.update(self.env.cr.fetchall())
+        return ages
+
+    @api.model
+    def _cron_refresh_age_display(self):
+        """Refresh stored ages whose displayed bucket changed since the last run
+
+        Only patients who had a birthday since the last run, or who were
+        younger than a year then (month/day display), are recomputed. The
+        first run refreshes every partner with a date of birth.
+        """
+        Param = self.env['ir.config_parameter'].sudo()
+        today = fields.Date.context_today(self)
+        last_run = fields.Date.to_date(Param.get_param(AGE_REFRESH_PARAM))
+        if last_run and last_run >= today:
+            return
+        self.flush(['date_of_birth'])
+        if last_run:
+            self.env.cr.execute("""
+                SELECT id FROM res_partner
+                 WHERE date_of_birth IS NOT NULL
+                   AND (date_part('year', age(%(today)s, date_of_birth))
+                            != date_part('year', age(%(last_run)s, date_of_birth))
+                        OR date_of_birth > %(last_run)s::date - interval '1 year')
+            """, {'today': today, 'last_run': last_run})
+        else:
+            # First run: bring every stored age up to date once
+            self.env.cr.execute("SELECT id FROM res_partner WHERE date_of_birth IS NOT NULL")
+        partners = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.env.add_to_compute(self._fields['age_display'], partners)
+        partners.flush(['age_display'])
+        Param.set_param(AGE_REFRESH_PARAM, fields.Date.to_string(today))
+        _logger.info("Refreshed stored age of %s partners", len(partners))
+
+    def _count_lab_invoices(self, field_name):
+        """Return {partner_id: lab invoice count} grouped on ``field_name``"""
+        if not self.ids:
+            return {}
+        groups = self.env['account.move'].read_group(
+            [(field_name, 'in', self.ids), ('is_lab_invoice', '=', True)],
+            [field_name], [field_name])
+        return {group[field_name][0]: group[f'{field_name}_count'] for group in groups}
+
     @api.depends('lab_invoice_ids')
+    @profiled
     def _compute_invoice_count(self):
         """Count lab invoices for patients"""
+        if stored_counters_enabled(self.env):
+            pending = self._pending_invoice_count_deltas()
+            for partner in self:
+                partner.lab_invoice_count = (partner.stored_lab_invoice_count
+                                             + pending.get(partner.id, (0, 0))[0])
+            return
+        counts = self._count_lab_invoices('patient_id')
         for partner in self:
-            partner.lab_invoice_count = len(partner.lab_invoice_ids)
+            partner.lab_invoice_count = counts.get(partner.id, 0)
 
     @api.depends('referred_invoice_ids')
+    @profiled
     def _compute_referred_count(self):
         """Count referred invoices for doctors"""
+        if stored_counters_enabled(self.env):
+            pending = self._pending_invoice_count_deltas()
+            for partner in self:
+                partner.referred_invoice_count = (partner.stored_referred_invoice_count
+                                                  + pending.get(partner.id, (0, 0))[1])
+            return
+        counts = self._count_lab_invoices('referring_doctor_id')
         for partner in self:
-            partner.referred_invoice_count = len(partner.referred_invoice_ids)
+            partner.referred_invoice_count = counts.get(partner.id, 0)
+
+    def _pending_invoice_count_deltas(self):
+        """Return {partner_id: (lab invoices, referred invoices)} not folded in yet"""
+        ids = [partner_id for partner_id in self.ids if isinstance(partner_id, int)]
+        if not ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT partner_id, SUM(lab_invoices), SUM(referred_invoices)
+              FROM medical_lab_partner_counter_delta
+             WHERE partner_id IN %s
+          GROUP BY partner_id
+        """, (tuple(ids),))
+        return {row[0]: (row[1], row[2]) for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _queue_invoice_count_deltas(self, added, removed=None):
+        """Record counter changes as ``{partner_id: [lab invoices, referred invoices]}``
+
+        Changes are appended to a log instead of updating the partner row,
+        so concurrent visits of one busy referring doctor do not wait on
+        each other; ``_cron_fold_invoice_count_deltas`` adds them up later.
+        """
+        if not stored_counters_enabled(self.env):
+            return
+        rows = []
+        for partner_id in set(added) | set(removed or {}):
+            new = added.get(partner_id, (0, 0))
+            old = (removed or {}).get(partner_id, (0, 0))
+            delta = (new[0] - old[0], new[1] - old[1])
+            if delta != (0, 0):
+                rows.append((partner_id,) + delta)
+        if not rows:
+            return
+        partner_ids, lab_invoices, referred_invoices = zip(*rows)
+        self.env.cr.execute("""
+            INSERT INTO medical_lab_partner_counter_delta
+                   (partner_id, lab_invoices, referred_invoices)
+            SELECT unnest(%s::int[]), unnest(%s::int[]), unnest(%s::int[])
+        """, (list(partner_ids), list(lab_invoices), list(referred_invoices)))
+        self.browse(partner_ids).invalidate_cache(['lab_invoice_count', 'referred_invoice_count'])
+
+    @api.model
+    def _cron_fold_invoice_count_deltas(self):
+        """Add the logged counter changes to the stored counters and drop them"""
+        self.env.cr.execute("""
+            WITH folded AS (
+                DELETE FROM medical_lab_partner_counter_delta
+                 RETURNING partner_id, lab_invoices, referred_invoices
+            )
+            UPDATE res_partner p
+               SET stored_lab_invoice_count = p.stored_lab_invoice_count + d.lab_invoices,
+                   stored_referred_invoice_count = p.stored_referred_invoice_count + d.referred_invoices
+              FROM (SELECT partner_id, SUM(lab_invoices) AS lab_invoices,
+                           SUM(referred_invoices) AS referred_invoices
+                      FROM folded GROUP BY partner_id) d
+             WHERE p.id = d.partner_id
+        """)
+        self.invalidate_cache(['stored_lab_invoice_count', 'stored_referred_invoice_count'])
+
+    @api.model
+    def _refresh_stored_invoice_counts(self, partner_ids):
+        """Recount the materialized invoice counters of the given partners"""
+        if not partner_ids:
+            return
+        self.env['account.move'].flush(['patient_id', 'referring_doctor_id', 'is_lab_invoice'])
+        self.env.cr.execute(
+            "DELETE FROM medical_lab_partner_counter_delta WHERE partner_id IN %s",
+            (tuple(partner_ids),))
+        self.env.cr.execute("""
+            UPDATE res_partner p
+               SET stored_lab_invoice_count = (
+                       SELECT COUNT(*) FROM account_move m
+                        WHERE m.patient_id = p.id AND m.is_lab_invoice),
+                   stored_referred_invoice_count = (
+                       SELECT COUNT(*) FROM account_move m
+                        WHERE m.referring_doctor_id = p.id AND m.is_lab_invoice)
+             WHERE p.id IN %s
+        """, (tuple(partner_ids),))
+        self.browse(partner_ids).invalidate_cache(
+            ['stored_lab_invoice_count', 'stored_referred_invoice_count'])
+
+    @api.model
+    def rebuild_stored_lab_counters(self):
+        """Fill every materialized lab counter, e.g. after enabling stored counters"""
+        self.env.cr.execute("""
+            SELECT id FROM res_partner WHERE is_patient OR is_doctor
+             UNION
+            SELECT patient_id FROM account_move WHERE is_lab_invoice AND patient_id IS NOT NULL
+             UNION
+            SELECT referring_doctor_id FROM account_move
+             WHERE is_lab_invoice AND referring_doctor_id IS NOT NULL
+        """)
+        self._refresh_stored_invoice_counts([row[0] for row in self.env.cr.fetchall()])
+        Test = self.env['medical.lab.test'].with_context(active_test=False)
+        Test._refresh_stored_test_count(Test.search([]).ids)
 
     def action_view_lab_invoices(self):
         """Open lab invoices for this patient"""
@@ -90,6 +288,18 @@ class ResPartner(models.Model):
         }
         return action
 
+    def action_view_archived_results(self):
+        """Open archived test results of this patient (read-only)"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Archived Results',
+            'res_model': 'medical.lab.test.request.archive',
+            'view_mode': 'tree,form',
+            'domain': [('patient_id', '=', self.id)],
+            'context': {'create': False, 'edit': False, 'delete': False},
+        }
+
     def action_view_referred_invoices(self):
         """Open referred invoices for this doctor"""
         self.ensure_one()
@@ -100,12 +310,40 @@ class ResPartner(models.Model):
         ]
         return action
 
+    def init(self):
+        """Create trigram indexes backing the patient/doctor search"""
+        super(ResPartner, self).init()
+        cr = self.env.cr
+        try:
+            with cr.savepoint():
+                cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            _logger.warning("pg_trgm is not available, patient search will not use trigram indexes")
+            return
+        for column, where in [('name', ''),
+                              ('patient_id', 'WHERE patient_id IS NOT NULL'),
+                              ('doctor_id', 'WHERE doctor_id IS NOT NULL')]:
+            cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS res_partner_{column}_trgm_idx
+                    ON res_partner USING gin ({column} gin_trgm_ops) {where}
+            """)
+
     @api.model
+    @profiled
     def name_search(self, name='', args=None, operator='ilike', limit=100):
         """Enhanced search to include patient/doctor IDs"""
         if args is None:
             args = []
-        
+        if self.env.context.get('default_is_patient'):
+            args = [('is_patient', '=', True)] + args
+        elif self.env.context.get('default_is_doctor'):
+            args = [('is_doctor', '=', True)] + args
+
+        if name and operator in ('ilike', 'like', '=ilike', '='):
+            partners = self._name_search_fast_path(name.strip(), args, limit, operator)
+            if partners:
+                return partners.name_get()
+
         domain = args + ['|', '|', 
                         ('name', operator, name),
                         ('patient_id', operator, name),
@@ -113,6 +351,32 @@ class ResPartner(models.Model):
         
         return self.search(domain, limit=limit).name_get()
 
+    @api.model
+    def _name_search_fast_path(self, name, args, limit, operator='ilike'):
+        """Resolve scanned barcodes and PAT/DOC identifiers with index lookups
+
+        Identifiers match exactly; the prefix fallback only applies to the
+        substring operators.
+        """
+        upper = name.upper()
+        if LAB_BARCODE_RE.match(upper):
+            move = self.env['account.move'].search([('barcode_id', '=', upper)], limit=1)
+            if move.patient_id:
+                return self.search(args + [('id', '=', move.patient_id.id)], limit=1)
+            return self.browse()
+        if upper.startswith('PAT/'):
+            field_name, flag = 'patient_id', 'is_patient'
+        elif upper.startswith('DOC/'):
+            field_name, flag = 'doctor_id', 'is_doctor'
+        else:
+            return self.browse()
+        scope = [(flag, '=', True)] + args
+        partners = self.search(scope + [(field_name, '=', upper)], limit=limit)
+        if not partners and operator in ('ilike', 'like'):
+            prefix = re.sub(r'([\\%_])', r'\\\1', upper)
+            partners = self.search(scope + [(field_name, '=like', prefix + '%')], limit=limit)
+        return partners
+
     def name_get(self):
         """Display patient/doctor ID with name"""
         result = []
@@ -124,4 +388,15 @@ class ResPartner(models.Model):
             else:
                 name = partner.name
             result.append((partner.id, name))
-        return result
\ No newline at end of file
+        return result
+
+
+class MedicalLabPartnerCounterDelta(models.Model):
+    _name = 'medical.lab.partner.counter.delta'
+    _description = 'Medical Lab Partner Counter Change'
+    # Append-only log folded into the partner counters by a cron
+    _log_access = False
+
+    partner_id = fields.Integer('Partner', required=True, index=True)
+    lab_invoices = fields.Integer('Lab Invoices', default=0)
+    referred_invoices = fields.Integer('Referred Invoices', default=0)
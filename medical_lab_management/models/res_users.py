@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    lab_department_ids = fields.Many2many('medical.lab.department', 'medical_lab_department_users_rel',
+                                          'user_id', 'department_id', string='Lab Departments',
+                                          help='Departments whose test requests a lab technician '
+                                               'can access. Leave empty for all departments.')
+
+    def write(self, vals):
+        res = super(ResUsers, self).write(vals)
+        if 'lab_department_ids' in vals:
+            # Record rules are cached per user and embed the department ids
+            self.env['ir.rule'].clear_caches()
+        return res
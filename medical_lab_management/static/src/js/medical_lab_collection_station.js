@@ -0,0 +1,200 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+
+const { Component, hooks, tags } = owl;
+const { useState, useRef, onMounted, onWillUnmount } = hooks;
+
+const MAX_LINES = 200;
+
+function utcNow() {
+    return new Date().toISOString().slice(0, 19).replace("T", " ");
+}
+
+/**
+ * Scanner-driven sample collection.
+ *
+ * Scans are stamped and queued locally, so the input is ready for the next
+ * tube immediately. The queue is sent to the server every ``batch_size``
+ * scans or ``flush_seconds`` seconds; repeated scans are flagged at once and
+ * unknown or wrong-state tubes as soon as their batch comes back.
+ *
+ * With the ``lab_offline`` cache, each scan shows the patient and a hint
+ * when the cached visit is not waiting for collection, patients and tests
+ * can be looked up locally, and batches that cannot reach the server are
+ * handed to the offline queue, which syncs them when the network returns.
+ */
+class CollectionStation extends Component {
+    setup() {
+        const params = this.props.action.params || {};
+        this.batchSize = params.batch_size || 20;
+        this.flushSeconds = params.flush_seconds || 2;
+        this.orm = useService("orm");
+        this.offline = useService("lab_offline");
+        this.input = useRef("scan");
+        this.state = useState({
+            lines: [],
+            pending: 0,
+            collected: 0,
+            problems: 0,
+            queued: 0,
+            found: { patients: [], tests: [] },
+        });
+        this.queue = [];
+        this.seen = new Set();
+        this.sending = Promise.resolve();
+        this.nextKey = 1;
+        onMounted(() => {
+            this.input.el.focus();
+            this.timer = setInterval(() => this.flush(), this.flushSeconds * 1000);
+        });
+        onWillUnmount(() => {
+            clearInterval(this.timer);
+            this.flush();
+        });
+    }
+
+    onKeydown(ev) {
+        if (ev.key !== "Enter") {
+            return;
+        }
+        const barcode = ev.target.value.trim();
+        ev.target.value = "";
+        if (barcode) {
+            this.scan(barcode);
+        }
+    }
+
+    scan(barcode) {
+        const duplicate = this.seen.has(barcode);
+        this.state.lines.unshift({
+            key: this.nextKey++,
+            barcode,
+            scanned_at: utcNow(),
+            result: duplicate ? "duplicate" : "pending",
+        });
+        this.state.lines.splice(MAX_LINES);
+        if (duplicate) {
+            this.state.problems++;
+            return;
+        }
+        this.seen.add(barcode);
+        const line = this.state.lines[0];
+        this.queue.push(line);
+        this.state.pending++;
+        if (this.offline) {
+            this.offline.findVisit(barcode).then((visit) => {
+                if (!visit) {
+                    return;
+                }
+                line.patient = visit.patient_id && visit.patient_id[1];
+                if (line.result === "pending" && visit.sample_status !== "invoiced") {
+                    line.hint = visit.sample_status;
+                }
+            });
+        }
+        if (this.queue.length >= this.batchSize) {
+            this.flush();
+        }
+    }
+
+    flush() {
+        if (!this.queue.length) {
+            return this.sending;
+        }
+        const batch = this.queue.splice(0);
+        this.sending = this.sending.then(async () => {
+            if (!navigator.onLine && this.offline) {
+                return this.queueOffline(batch);
+            }
+            let outcomes;
+            try {
+                outcomes = await this.orm.call("account.move", "collect_scanned_samples", [
+                    batch.map(({ barcode, scanned_at }) => ({ barcode, scanned_at })),
+                ]);
+            } catch (_error) {
+                if (this.offline) {
+                    return this.queueOffline(batch);
+                }
+                // Keep the scans (with their scan times) for the next attempt
+                this.queue.unshift(...batch);
+                return;
+            }
+            this.state.pending -= batch.length;
+            outcomes.forEach((outcome, index) => {
+                batch[index].result = outcome.result;
+                batch[index].sample_status = outcome.sample_status;
+                if (outcome.result === "collected") {
+                    this.state.collected++;
+                } else {
+                    this.state.problems++;
+                }
+            });
+        });
+        return this.sending;
+    }
+
+    async queueOffline(batch) {
+        for (const line of batch) {
+            await this.offline.queueCollection(line.barcode, line.scanned_at);
+            line.result = "queued";
+        }
+        this.state.pending -= batch.length;
+        this.state.queued += batch.length;
+    }
+
+    async onSearch(ev) {
+        const term = ev.target.value.trim();
+        if (!this.offline || term.length < 2) {
+            this.state.found = { patients: [], tests: [] };
+            return;
+        }
+        const [patients, tests] = await Promise.all([
+            this.offline.searchPatients(term, 8),
+            this.offline.searchTests(term, 8),
+        ]);
+        this.state.found = { patients, tests };
+    }
+}
+
+CollectionStation.template = tags.xml`
+    <div class="o_medical_lab_collection_station p-3 overflow-auto">
+        <input t-ref="scan" class="form-control form-control-lg mb-2"
+               placeholder="Scan tube barcode..." t-on-keydown="onKeydown"/>
+        <input t-if="offline" class="form-control mb-2" placeholder="Find patient or test (local)..."
+               t-on-input="onSearch"/>
+        <ul t-if="state.found.patients.length or state.found.tests.length" class="list-unstyled mb-2">
+            <li t-foreach="state.found.patients" t-as="patient" t-key="'p' + patient.id">
+                <t t-esc="patient.patient_id"/> <t t-esc="patient.name"/>
+            </li>
+            <li t-foreach="state.found.tests" t-as="test" t-key="'t' + test.id">
+                [<t t-esc="test.code"/>] <t t-esc="test.name"/> (<t t-esc="test.sample_type"/>)
+            </li>
+        </ul>
+        <div class="mb-2">
+            <span class="badge badge-success mr-2">Collected: <t t-esc="state.collected"/></span>
+            <span class="badge badge-info mr-2">Queued offline: <t t-esc="state.queued"/></span>
+            <span class="badge badge-secondary mr-2">Sending: <t t-esc="state.pending"/></span>
+            <span class="badge badge-danger">Problems: <t t-esc="state.problems"/></span>
+        </div>
+        <table class="table table-sm">
+            <tbody>
+                <tr t-foreach="state.lines" t-as="line" t-key="line.key"
+                    t-att-class="line.result === 'collected' ? 'table-success' : (['pending', 'queued'].includes(line.result) ? '' : 'table-danger')">
+                    <td><t t-esc="line.scanned_at"/></td>
+                    <td><t t-esc="line.barcode"/></td>
+                    <td><t t-esc="line.patient or ''"/></td>
+                    <td>
+                        <t t-esc="line.result"/>
+                        <span t-if="line.result === 'pending' and line.hint" class="text-warning">
+                            (cached: <t t-esc="line.hint"/>)
+                        </span>
+                    </td>
+                    <td><t t-esc="line.sample_status or ''"/></td>
+                </tr>
+            </tbody>
+        </table>
+    </div>`;
+
+registry.category("actions").add("medical_lab_collection_station", CollectionStation);
@@ -0,0 +1,260 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { session } from "@web/session";
+
+/**
+ * Offline cache for reception and sample collection stations.
+ *
+ * The test catalog, recent patients and today's visits are mirrored into
+ * IndexedDB so lookups stay local, and collection scans are queued locally
+ * and pushed to the server in one batched call when the network allows.
+ *
+ * Only lab reception users (and the groups implying it) get the cache. The
+ * database is tied to the session's database and user: it is wiped when
+ * another session starts in the browser and on logout.
+ */
+
+const DB_NAME = "medical_lab_offline";
+const DB_VERSION = 1;
+const STORES = ["tests", "patients", "visits", "scans", "meta"];
+const SYNC_INTERVAL = 60000;
+const SYNC_BATCH_SIZE = 200;
+const LAB_GROUP = "medical_lab_management.group_lab_reception";
+// Stores holding patient data, cleared on logout even if scans are still queued
+const PRIVATE_STORES = ["patients", "visits", "meta"];
+
+function request(req) {
+    return new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+}
+
+function openDatabase() {
+    const req = indexedDB.open(DB_NAME, DB_VERSION);
+    req.onupgradeneeded = () => {
+        const db = req.result;
+        for (const name of STORES) {
+            if (db.objectStoreNames.contains(name)) {
+                continue;
+            }
+            if (name === "scans") {
+                db.createObjectStore(name, { keyPath: "local_id", autoIncrement: true });
+            } else if (name === "meta") {
+                db.createObjectStore(name, { keyPath: "key" });
+            } else {
+                const store = db.createObjectStore(name, { keyPath: "id" });
+                store.createIndex("name", "name");
+                if (name === "visits") {
+                    store.createIndex("barcode_id", "barcode_id");
+                }
+            }
+        }
+    };
+    return request(req);
+}
+
+function deleteDatabase() {
+    return request(indexedDB.deleteDatabase(DB_NAME));
+}
+
+function clearStores(db, names) {
+    const tx = db.transaction(names, "readwrite");
+    for (const name of names) {
+        tx.objectStore(name).clear();
+    }
+    return new Promise((resolve, reject) => {
+        tx.oncomplete = resolve;
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+export const labOfflineService = {
+    dependencies: ["rpc", "notification", "user"],
+
+    async start(env, { rpc, notification, user }) {
+        if (!window.indexedDB) {
+            return null;
+        }
+        if (!(await user.hasGroup(LAB_GROUP))) {
+            // Drop whatever a previous lab user of this browser left behind
+            await deleteDatabase().catch(() => {});
+            return null;
+        }
+        const sessionKey = `${session.db}/${user.userId}`;
+        let db = await openDatabase();
+        const owner = await request(db.transaction("meta").objectStore("meta").get("session"));
+        if (owner && owner.value !== sessionKey) {
+            db.close();
+            await deleteDatabase();
+            db = await openDatabase();
+        }
+        await request(
+            db.transaction("meta", "readwrite").objectStore("meta").put({ key: "session", value: sessionKey })
+        );
+        let syncing = null;
+
+        function store(name, mode = "readonly") {
+            return db.transaction(name, mode).objectStore(name);
+        }
+
+        function putAll(name, records) {
+            const tx = db.transaction(name, "readwrite");
+            const objectStore = tx.objectStore(name);
+            for (const record of records) {
+                objectStore.put(record);
+            }
+            return new Promise((resolve, reject) => {
+                tx.oncomplete = resolve;
+                tx.onerror = () => reject(tx.error);
+            });
+        }
+
+        async function getMeta(key) {
+            const entry = await request(store("meta").get(key));
+            return entry && entry.value;
+        }
+
+        async function refresh() {
+            const since = await getMeta("server_time");
+            const data = await rpc("/medical_lab/offline/snapshot", { since });
+            await putAll("tests", data.tests);
+            await putAll("patients", data.patients);
+            await putAll("visits", data.visits);
+            // Drop visits that are no longer today's
+            const current = new Set(data.visit_ids);
+            const cached = await request(store("visits").getAllKeys());
+            const tx = db.transaction("visits", "readwrite");
+            for (const id of cached.filter((id) => !current.has(id))) {
+                tx.objectStore("visits").delete(id);
+            }
+            await new Promise((resolve, reject) => {
+                tx.oncomplete = resolve;
+                tx.onerror = () => reject(tx.error);
+            });
+            await putAll("meta", [{ key: "server_time", value: data.server_time }]);
+        }
+
+        async function search(name, term, limit = 20) {
+            const needle = (term || "").toLowerCase();
+            const records = await request(store(name).getAll());
+            return records
+                .filter((record) =>
+                    Object.values(record).some(
+                        (value) => typeof value === "string" && value.toLowerCase().includes(needle)
+                    )
+                )
+                .slice(0, limit);
+        }
+
+        async function queueCollection(barcode, scannedAt) {
+            const visit = await request(store("visits").index("barcode_id").get(barcode));
+            const scan = {
+                barcode,
+                scanned_at: scannedAt || new Date().toISOString().slice(0, 19).replace("T", " "),
+                expected_status: visit ? visit.sample_status : "invoiced",
+            };
+            await request(store("scans", "readwrite").add(scan));
+            if (visit) {
+                await putAll("visits", [{ ...visit, sample_status: "sample_collected" }]);
+            }
+            if (navigator.onLine) {
+                sync().catch(() => {});
+            }
+            return scan;
+        }
+
+        async function pushScans() {
+            const outcomes = [];
+            let pending = await request(store("scans").getAll());
+            while (pending.length) {
+                const batch = pending.slice(0, SYNC_BATCH_SIZE);
+                pending = pending.slice(SYNC_BATCH_SIZE);
+                const result = await rpc("/medical_lab/offline/sync", {
+                    scans: batch.map(({ barcode, scanned_at, expected_status }) => ({
+                        barcode,
+                        scanned_at,
+                        expected_status,
+                    })),
+                });
+                const tx = db.transaction("scans", "readwrite");
+                for (const scan of batch) {
+                    tx.objectStore("scans").delete(scan.local_id);
+                }
+                outcomes.push(...result.outcomes);
+            }
+            return outcomes;
+        }
+
+        function sync() {
+            if (!syncing) {
+                syncing = (async () => {
+                    const outcomes = await pushScans();
+                    const problems = outcomes.filter((o) => o.result !== "collected");
+                    for (const problem of problems) {
+                        notification.add(
+                            `${problem.barcode}: ${problem.result}` +
+                                (problem.sample_status ? ` (${problem.sample_status})` : ""),
+                            { type: "warning" }
+                        );
+                    }
+                    await refresh();
+                    return outcomes;
+                })().finally(() => {
+                    syncing = null;
+                });
+            }
+            return syncing;
+        }
+
+        async function wipe() {
+            // Push queued scans first; they hold no patient data and are kept if that fails
+            await sync().catch(() => {});
+            if (await request(store("scans").count())) {
+                await clearStores(db, PRIVATE_STORES);
+            } else {
+                db.close();
+                await deleteDatabase();
+            }
+        }
+
+        const logout = registry.category("user_menuitems").get("log_out", null);
+        if (logout) {
+            registry.category("user_menuitems").add(
+                "log_out",
+                (env) => {
+                    const item = logout(env);
+                    return {
+                        ...item,
+                        callback: () => wipe().finally(() => item.callback()),
+                    };
+                },
+                { force: true }
+            );
+        }
+
+        window.addEventListener("online", () => sync().catch(() => {}));
+        setInterval(() => {
+            if (navigator.onLine) {
+                // Failed syncs keep their scans queued for the next attempt
+                sync().catch(() => {});
+            }
+        }, SYNC_INTERVAL);
+        if (navigator.onLine) {
+            sync().catch(() => {});
+        }
+
+        return {
+            searchPatients: (term, limit) => search("patients", term, limit),
+            searchTests: (term, limit) => search("tests", term, limit),
+            findVisit: (barcode) => request(store("visits").index("barcode_id").get(barcode)),
+            pendingScans: () => request(store("scans").count()),
+            queueCollection,
+            refresh,
+            sync,
+        };
+    },
+};
+
+registry.category("services").add("lab_offline", labOfflineService);
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+from . import test_analyzer
+from . import test_archive
+from . import test_batch_transition
+from . import test_catalog_loader
+from . import test_category_tree
+from . import test_collection_sync
+from . import test_critical_alert
+from . import test_dashboard
+from . import test_department_rules
+from . import test_medical_lab
+from . import test_partner_counters
+from . import test_pricing
+from . import test_report_job
+from . import test_result_history
+from . import test_sequence_block
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+class MedicalLabCase(AccountTestInvoicingCommon):
+    """Two departments with one test each, a patient and a referring doctor"""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(MedicalLabCase, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.env.user.groups_id |= cls.env.ref('medical_lab_management.group_lab_manager')
+        Department = cls.env['medical.lab.department']
+        cls.hematology = Department.create({'name': 'Hematology', 'code': 'HEM'})
+        cls.chemistry = Department.create({'name': 'Chemistry', 'code': 'CHEM'})
+        Test = cls.env['medical.lab.test']
+        cls.wbc = Test.create({
+            'name': 'White Blood Cells',
+            'code': 'TEST_WBC',
+            'sample_type': 'blood',
+            'list_price': 20.0,
+            'department_id': cls.hematology.id,
+        })
+        cls.glucose = Test.create({
+            'name': 'Glucose',
+            'code': 'TEST_GLU',
+            'sample_type': 'blood',
+            'list_price': 10.0,
+            'department_id': cls.chemistry.id,
+        })
+        cls.env['medical.lab.test.range'].create({
+            'test_id': cls.glucose.id,
+            'gender': 'all',
+            'min_value': 70.0,
+            'max_value': 110.0,
+            'critical_min': 40.0,
+            'critical_max': 400.0,
+        })
+        Partner = cls.env['res.partner']
+        cls.patient = Partner.create({
+            'name': 'Test Patient',
+            'is_patient': True,
+            'gender': 'female',
+            'date_of_birth': '1980-05-17',
+        })
+        cls.doctor = Partner.create({'name': 'Test Doctor', 'is_doctor': True})
+
+    @classmethod
+    def _visit_vals(cls, tests, patient=None):
+        patient = patient or cls.patient
+        return {
+            'move_type': 'out_invoice',
+            'is_lab_invoice': True,
+            'partner_id': patient.id,
+            'patient_id': patient.id,
+            'referring_doctor_id': cls.doctor.id,
+            'invoice_line_ids': [(0, 0, {
+                'name': test.name,
+                'quantity': 1,
+                'price_unit': test.list_price,
+            }) for test in tests],
+            'lab_test_ids': [(0, 0, {'test_id': test.id}) for test in tests],
+        }
+
+    @classmethod
+    def _create_visit(cls, tests=None, post=True, patient=None):
+        """A lab invoice for ``tests`` (default: both), posted unless ``post`` is False"""
+        visit = cls.env['account.move'].create(
+            cls._visit_vals(tests or cls.wbc | cls.glucose, patient))
+        if post:
+            visit.action_post()
+        return visit
+
+    @classmethod
+    def _create_lab_user(cls, login, group, departments=None):
+        return cls.env['res.users'].create({
+            'name': login.title(),
+            'login': login,
+            'groups_id': [(6, 0, [cls.env.ref(group).id, cls.env.ref('account.group_account_invoice').id])],
+            'lab_department_ids': [(6, 0, departments.ids if departments else [])],
+            'company_id': cls.env.company.id,
+            'company_ids': [(6, 0, cls.env.company.ids)],
+        })
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from odoo.tests.common import BaseCase, TransactionCase, tagged
+
+from ..analyzer.hl7 import HL7Parser, MLLP_END, MLLP_START
+from ..analyzer.ingest import ResultIngestor, ingest_stream
+
+
+def hl7_message(control_id, barcode='LAB0001', code='GLU', value='95'):
+    return (f"MSH|^~\\&|XN|LAB|LIS|LAB|20241226101500||ORU^R01|{control_id}|P|2.5\r"
+            f"OBR|1||{barcode}|{code}\r"
+            f"OBX|1|NM|{code}||{value}|mg/dL|70-110|N|||F\r")
+
+
+class StubIngestor(ResultIngestor):
+    """Ingestor whose transactions take ``store_ms`` and never touch a database"""
+
+    def __init__(self, store_ms=1.0, fail=False, **options):
+        super(StubIngestor, self).__init__(None, 1, **options)
+        self.store_ms = store_ms
+        self.fail = fail
+        self.stored = []
+
+    def _store(self, results):
+        time.sleep(self.store_ms / 1000.0)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.stored.extend(results)
+        return {'matched': len(results), 'unmatched': 0}
+
+
+class MLLPAnalyzer(object):
+    """Stream that sends its next message only after the previous one was acknowledged"""
+
+    def __init__(self, count):
+        self.messages = [MLLP_START + hl7_message(f'MSG{n:05d}').encode() + MLLP_END
+                         for n in range(count)]
+        self.acks = []
+        self._acked = threading.Event()
+        self._acked.set()
+
+    def read(self, _size):
+        if not self.messages:
+            return b''
+        if not self._acked.wait(5):
+            raise AssertionError("No acknowledgement within 5 s")
+        self._acked.clear()
+        return self.messages.pop(0)
+
+    def reply(self, message):
+        self.acks.append(message)
+        self._acked.set()
+
+
+@tagged('post_install', '-at_install')
+class TestHL7Ingestion(BaseCase):
+
+    def _ingest(self, ingestor, count):
+        analyzer = MLLPAnalyzer(count)
+        ingestor.start()
+        try:
+            start = time.perf_counter()
+            ingest_stream(ingestor, analyzer, 'hl7', reply=analyzer.reply)
+            elapsed = time.perf_counter() - start
+        finally:
+            ingestor.stop()
+        return analyzer, elapsed
+
+    def test_ack_after_commit(self):
+        ingestor = StubIngestor()
+        analyzer, _elapsed = self._ingest(ingestor, 3)
+        self.assertEqual(len(ingestor.stored), 3)
+        self.assertEqual(analyzer.acks, [HL7Parser.ack(f'MSG{n:05d}') for n in range(3)])
+
+    def test_failed_commit_is_negatively_acknowledged(self):
+        analyzer, _elapsed = self._ingest(StubIngestor(fail=True), 2)
+        self.assertEqual(analyzer.acks, [HL7Parser.ack(f'MSG{n:05d}', 'AE') for n in range(2)])
+
+    def test_throughput_of_one_connection(self):
+        """A lock-step MLLP analyzer is not held back by the flush interval"""
+        count = 300
+        ingestor = StubIngestor(store_ms=1.0, flush_interval=1.0)
+        analyzer, elapsed = self._ingest(ingestor, count)
+        self.assertEqual(len(analyzer.acks), count)
+        self.assertGreater(count / elapsed, 100, "HL7 messages per second on one connection")
+
+
+@tagged('post_install', '-at_install')
+class TestDropFolderImport(TransactionCase):
+
+    def setUp(self):
+        super(TestDropFolderImport, self).setUp()
+        self.machine = self.env['medical.lab.machine'].create({
+            'name': 'Test Analyzer',
+            'protocol': 'hl7',
+            'import_batch_size': 2,
+        })
+        handle, self.path = tempfile.mkstemp(suffix='.hl7')
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(''.join(hl7_message(f'MSG{n}') for n in range(5)))
+        self.addCleanup(os.remove, self.path)
+
+    def test_import_file_keeps_the_caller_transaction(self):
+        with patch.object(self.env.cr, 'commit') as commit:
+            stats = self.machine._import_file(self.path)
+        commit.assert_not_called()
+        self.assertEqual(stats, {'matched': 0, 'unmatched': 5})
+
+    def test_cron_import_commits_every_batch(self):
+        with patch.object(self.env.cr, 'commit') as commit:
+            self.machine._import_file(self.path, commit=True)
+        self.assertEqual(commit.call_count, 3)
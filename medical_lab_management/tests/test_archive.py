@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestArchive(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestArchive, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.Archive = cls.env['medical.lab.test.request.archive']
+        cls.tomorrow = fields.Date.today() + timedelta(days=1)
+
+    def _deliver(self, visit, glucose='95'):
+        """Run a visit through to done"""
+        visit.action_update_sample_collected()
+        visit.action_start_diagnosis()
+        for request in visit.lab_test_ids:
+            value = glucose if request.test_id == self.glucose else '7.2'
+            request.write({'result_value': value, 'status': 'completed'})
+        visit.action_ready_to_print()
+        visit.action_mark_printed()
+        visit.action_mark_signed()
+        visit.action_mark_done()
+        return visit
+
+    def _archive(self, cutoff):
+        self.env['base'].flush()
+        moved = self.Archive._archive_chunk(cutoff, 100)
+        self.env.invalidate_all()
+        return moved
+
+    def test_done_visits_are_moved_to_the_archive(self):
+        visit = self._deliver(self._create_visit())
+        active = self._create_visit()
+        request_ids = visit.lab_test_ids.ids
+        self.assertEqual(self._archive(self.tomorrow), 2)
+        self.assertFalse(visit.lab_test_ids)
+        self.assertTrue(visit.lab_archived)
+        self.assertEqual(len(active.lab_test_ids), 2)
+        archived = self.Archive.search([('invoice_id', '=', visit.id)])
+        self.assertEqual(sorted(archived.ids), sorted(request_ids))
+        self.assertEqual(set(archived.mapped('status')), {'printed'})
+        self.assertEqual(archived.mapped('patient_id'), self.patient)
+        self.assertEqual(set(archived.mapped('barcode_id')), {visit.barcode_id})
+
+    def test_recent_visits_stay(self):
+        visit = self._deliver(self._create_visit())
+        self.assertEqual(self._archive(fields.Date.today() - timedelta(days=1)), 0)
+        self.assertEqual(len(visit.lab_test_ids), 2)
+        self.assertFalse(visit.lab_archived)
+
+    def test_critical_alerts_follow_the_archived_request(self):
+        visit = self._deliver(self._create_visit(self.glucose), glucose='500')
+        request_id = visit.lab_test_ids.id
+        alert = self.env['medical.lab.critical.alert'].search([('request_id', '=', request_id)])
+        self.assertTrue(alert)
+        self._archive(self.tomorrow)
+        self.assertFalse(alert.request_id)
+        self.assertEqual(alert.archive_request_id.id, request_id)
+        self.assertEqual(alert.archive_request_id.result_value, '500')
+
+    def test_archived_requests_keep_counting_in_turnaround_times(self):
+        self._deliver(self._create_visit(self.glucose))
+        Tat = self.env['medical.lab.tat.report']
+
+        def glucose_samples():
+            self.env['base'].flush()
+            Tat._cron_refresh()
+            Tat.invalidate_cache()
+            return sum(Tat.search([('dimension', '=', 'test'),
+                                   ('test_id', '=', self.glucose.id)]).mapped('sample_count'))
+
+        before = glucose_samples()
+        self.assertEqual(before, 1)
+        self._archive(self.tomorrow)
+        self.assertEqual(glucose_samples(), before)
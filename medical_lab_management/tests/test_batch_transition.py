@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestBatchTransition(MedicalLabCase):
+
+    def _wizard(self, action, visits=None, barcodes=None):
+        wizard = self.env['medical.lab.batch.transition.wizard'].create({
+            'action': action,
+            'move_ids': [(6, 0, visits.ids if visits else [])],
+        })
+        if barcodes:
+            wizard.scanned_barcodes = "\n".join(barcodes)
+            wizard._onchange_scanned_barcodes()
+        return wizard
+
+    def test_scanned_barcodes_are_resolved(self):
+        first, second = self._create_visit(), self._create_visit()
+        wizard = self._wizard('action_update_sample_collected', barcodes=[
+            first.barcode_id, ' %s ' % second.barcode_id, first.barcode_id, 'NO-SUCH-TUBE'])
+        self.assertEqual(wizard.move_ids, first | second)
+        self.assertEqual(wizard.unknown_barcodes, 'NO-SUCH-TUBE')
+
+    def test_apply_updates_valid_visits_and_reports_the_others(self):
+        ready = self._create_visit() | self._create_visit()
+        draft = self._create_visit(post=False)
+        wizard = self._wizard('action_update_sample_collected', ready | draft)
+        wizard.action_apply()
+        self.assertEqual(set(ready.mapped('sample_status')), {'sample_collected'})
+        self.assertEqual(set(ready.lab_test_ids.mapped('status')), {'collected'})
+        self.assertEqual(draft.sample_status, 'draft')
+        self.assertEqual(wizard.move_ids, draft)
+        self.assertIn("2 visit(s) updated.", wizard.result_log)
+        self.assertIn("Sample can only be collected after invoicing.", wizard.result_log)
+
+    def test_ready_to_print_needs_completed_tests(self):
+        visits = self._create_visit() | self._create_visit()
+        visits.action_update_sample_collected()
+        visits.action_start_diagnosis()
+        done, pending = visits
+        done.lab_test_ids.write({'result_value': '95', 'status': 'completed'})
+        wizard = self._wizard('action_ready_to_print', visits)
+        wizard.action_apply()
+        self.assertEqual(done.sample_status, 'ready_to_print')
+        self.assertEqual(pending.sample_status, 'in_diagnosis')
+        self.assertEqual(wizard.move_ids, pending)
+        self.assertIn("All tests must be completed before printing.", wizard.result_log)
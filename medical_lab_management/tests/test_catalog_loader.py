@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase, tagged
+
+CATALOG = {
+    'departments': [{'code': 'CAT_BIO', 'name': 'Biochemistry'}],
+    'machines': [{'name': 'Catalog Analyzer', 'department': 'CAT_BIO'}],
+    'categories': [
+        # Children may come before their parent
+        {'code': 'CAT_LIPIDS', 'name': 'Lipids', 'parent': 'CAT_CHEM'},
+        {'code': 'CAT_CHEM', 'name': 'Chemistry'},
+    ],
+    'tests': [{
+        'code': 'CAT_GLU',
+        'name': 'Glucose',
+        'sample_type': 'blood',
+        'list_price': 10.0,
+        'department': 'CAT_BIO',
+        'machine': 'Catalog Analyzer',
+        'categories': ['CAT_CHEM'],
+        'ranges': [{'gender': 'all', 'min_value': 70, 'max_value': 110, 'unit': 'mg/dL'}],
+        'prices': [{'pricelist': 'Catalog Partners', 'price': 8.0}],
+    }, {
+        'code': 'CAT_CHOL',
+        'name': 'Cholesterol',
+        'sample_type': 'blood',
+        'list_price': 15.0,
+        'department': 'CAT_BIO',
+        'categories': ['CAT_LIPIDS'],
+    }],
+}
+
+
+@tagged('post_install', '-at_install')
+class TestCatalogLoader(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestCatalogLoader, cls).setUpClass()
+        cls.Loader = cls.env['medical.lab.catalog.loader']
+        cls.Test = cls.env['medical.lab.test']
+        cls.pricelist = cls.env['product.pricelist'].create({'name': 'Catalog Partners'})
+
+    def _test(self, code):
+        return self.Test.search([('code', '=', code)])
+
+    def test_load_json_links_every_section(self):
+        summary = self.Loader.load_json(json.dumps(CATALOG))
+        self.assertEqual(summary['tests'], {'created': 2, 'updated': 0})
+        self.assertEqual(summary['categories'], {'created': 2, 'updated': 0})
+        glucose, cholesterol = self._test('CAT_GLU'), self._test('CAT_CHOL')
+        self.assertEqual(glucose.department_id.code, 'CAT_BIO')
+        self.assertEqual(glucose.machine_id.department_id, glucose.department_id)
+        self.assertEqual(cholesterol.category_ids.parent_id.code, 'CAT_CHEM')
+        ranges = self.env['medical.lab.test.range'].search([('test_id', '=', glucose.id)])
+        self.assertEqual((ranges.min_value, ranges.max_value, ranges.unit), (70.0, 110.0, 'mg/dL'))
+        prices = self.env['medical.lab.test.price'].search([('test_id', '=', glucose.id)])
+        self.assertEqual((prices.pricelist_id, prices.price), (self.pricelist, 8.0))
+        # The category tree search sees the freshly loaded tests
+        chemistry = cholesterol.category_ids.parent_id
+        self.assertEqual(self.Test.search([('category_tree_id', '=', chemistry.id)]),
+                         glucose | cholesterol)
+
+    def test_reload_updates_by_code_and_replaces_lines(self):
+        self.Loader.load_json(json.dumps(CATALOG))
+        catalog = json.loads(json.dumps(CATALOG))
+        catalog['tests'][0].update(list_price=12.0, ranges=[{'gender': 'all', 'min_value': 60}])
+        summary = self.Loader.load_json(json.dumps(catalog))
+        self.assertEqual(summary['tests'], {'created': 0, 'updated': 2})
+        glucose = self._test('CAT_GLU')
+        self.assertEqual(len(glucose), 1)
+        self.assertEqual(glucose.list_price, 12.0)
+        ranges = self.env['medical.lab.test.range'].search([('test_id', '=', glucose.id)])
+        self.assertEqual(ranges.mapped('min_value'), [60.0])
+
+    def test_load_without_update_leaves_existing_tests(self):
+        self.Loader.load_json(json.dumps(CATALOG))
+        catalog = json.loads(json.dumps(CATALOG))
+        catalog['tests'][0]['list_price'] = 12.0
+        summary = self.Loader.load_json(json.dumps(catalog), update=False)
+        self.assertEqual(summary['tests'], {'created': 0, 'updated': 0})
+        self.assertEqual(self._test('CAT_GLU').list_price, 10.0)
+
+    def test_load_csv(self):
+        progress = []
+        self.Loader.load_csv({
+            'departments': "code,name\nCAT_HEM,Hematology\n",
+            'tests': "code,name,sample_type,list_price,department,result_type\n"
+                     "CAT_WBC,White Blood Cells,blood,20.5,CAT_HEM,\n",
+            'ranges': "test,gender,min_value,max_value\nCAT_WBC,all,4,11\n",
+        }, progress=lambda section, done, total: progress.append((section, done, total)))
+        wbc = self._test('CAT_WBC')
+        self.assertEqual((wbc.list_price, wbc.department_id.code), (20.5, 'CAT_HEM'))
+        self.assertEqual(wbc.result_type, 'quantitative')
+        self.assertIn(('tests', 1, 1), progress)
+
+    def test_unknown_reference_is_rejected(self):
+        catalog = {'tests': [{'code': 'CAT_X', 'name': 'X', 'sample_type': 'blood',
+                              'department': 'CAT_NOWHERE'}]}
+        with self.assertRaises(UserError):
+            self.Loader.load_json(json.dumps(catalog))
+
+    def test_duplicate_codes_are_rejected(self):
+        catalog = {'departments': [{'code': 'CAT_D', 'name': 'One'}, {'code': 'CAT_D', 'name': 'Two'}]}
+        with self.assertRaises(UserError):
+            self.Loader.load_json(json.dumps(catalog))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestCategoryTree(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestCategoryTree, cls).setUpClass(chart_template_ref=chart_template_ref)
+        Category = cls.env['medical.lab.test.category']
+        cls.blood = Category.create({'name': 'Blood'})
+        cls.cells = Category.create({'name': 'Cell Counts', 'parent_id': cls.blood.id})
+        cls.wbc.category_ids = cls.cells
+        cls.glucose.category_ids = cls.blood
+
+    def test_tests_of_a_category_and_its_subcategories(self):
+        Test = self.env['medical.lab.test']
+        self.assertEqual(Test.search([('category_tree_id', '=', self.blood.id)]), self.wbc | self.glucose)
+        self.assertEqual(Test.search([('category_tree_id', '=', self.cells.id)]), self.wbc)
+        self.assertEqual(Test.search([('category_tree_id', 'ilike', 'Cell')]), self.wbc)
+
+    def test_requests_of_a_category_tree(self):
+        visit = self._create_visit()
+        Request = self.env['medical.lab.test.request']
+        requests = Request.search([('invoice_id', '=', visit.id), ('category_tree_id', '=', self.cells.id)])
+        self.assertEqual(requests.test_id, self.wbc)
+        requests = Request.search([('invoice_id', '=', visit.id), ('category_tree_id', '!=', self.cells.id)])
+        self.assertEqual(requests.test_id, self.glucose)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestCollectionSync(MedicalLabCase):
+
+    def _scan(self, visit, minute, expected_status=None):
+        scan = {'barcode': visit.barcode_id, 'scanned_at': f'2024-12-26 08:{minute:02d}:00'}
+        if expected_status:
+            scan['expected_status'] = expected_status
+        return scan
+
+    def test_scans_are_collected_with_their_scan_time(self):
+        first, second = self._create_visit(), self._create_visit()
+        outcomes = self.env['account.move'].collect_scanned_samples(
+            [self._scan(first, 5, 'invoiced'), self._scan(second, 20)])
+        self.assertEqual([o['result'] for o in outcomes], ['collected', 'collected'])
+        self.assertEqual(first.sample_collection_time, datetime(2024, 12, 26, 8, 5))
+        self.assertEqual(second.sample_collection_time, datetime(2024, 12, 26, 8, 20))
+        self.assertEqual(set((first | second).lab_test_ids.mapped('status')), {'collected'})
+
+    def test_every_scan_gets_an_outcome(self):
+        collected = self._create_visit()
+        collected.action_update_sample_collected()
+        moved_on = self._create_visit()
+        draft = self._create_visit(post=False)
+        fresh = self._create_visit()
+        scans = [
+            {'barcode': 'NO-SUCH-TUBE', 'scanned_at': '2024-12-26 08:00:00'},
+            self._scan(collected, 1),
+            self._scan(moved_on, 2, expected_status='draft'),
+            self._scan(draft, 3),
+            self._scan(fresh, 4),
+            self._scan(fresh, 5),
+        ]
+        outcomes = self.env['account.move'].collect_scanned_samples(scans)
+        self.assertEqual([o['result'] for o in outcomes],
+                         ['unknown', 'duplicate', 'conflict', 'wrong_state', 'collected', 'duplicate'])
+        self.assertEqual(outcomes[2]['sample_status'], 'invoiced')
+        self.assertEqual(moved_on.sample_status, 'invoiced')
+        self.assertEqual(draft.sample_status, 'draft')
+        # The first scan of a tube wins
+        self.assertEqual(fresh.sample_collection_time, datetime(2024, 12, 26, 8, 4))
+
+    def test_receptionist_can_sync(self):
+        receptionist = self._create_lab_user(
+            'collector', 'medical_lab_management.group_lab_reception')
+        visit = self._create_visit()
+        outcomes = self.env['account.move'].with_user(receptionist).collect_scanned_samples(
+            [self._scan(visit, 10)])
+        self.assertEqual(outcomes[0]['result'], 'collected')
+        self.assertEqual(visit.sample_status, 'sample_collected')
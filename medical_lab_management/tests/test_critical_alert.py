@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestCriticalAlerts(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestCriticalAlerts, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.receptionist = cls._create_lab_user(
+            'receptionist', 'medical_lab_management.group_lab_reception')
+        cls.chemist = cls._create_lab_user('chemist', 'medical_lab_management.group_lab_manager')
+        cls.chemistry.manager_id = cls.chemist
+        cls.Alert = cls.env['medical.lab.critical.alert']
+
+    def _enter(self, visit, value, user=None):
+        requests = visit.lab_test_ids
+        if user:
+            requests = requests.with_user(user)
+        requests.write({'result_value': value, 'status': 'completed'})
+        return visit.lab_test_ids
+
+    def test_critical_result_raises_one_alert(self):
+        request = self._enter(self._create_visit(self.glucose), '500')
+        self.assertEqual(request.result_status, 'critical')
+        alerts = self.Alert.search([('request_id', '=', request.id)])
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts.result_value, '500')
+        # Saving the same value again does not alert twice
+        request.write({'result_value': '500'})
+        self.assertEqual(self.Alert.search_count([('request_id', '=', request.id)]), 1)
+
+    def test_normal_result_raises_no_alert(self):
+        request = self._enter(self._create_visit(self.glucose), '95')
+        self.assertEqual(request.result_status, 'normal')
+        self.assertFalse(self.Alert.search([('request_id', '=', request.id)]))
+
+    def test_user_without_alert_access_can_enter_a_critical_result(self):
+        request = self._enter(self._create_visit(self.glucose), '20', user=self.receptionist)
+        self.assertEqual(request.result_status, 'critical')
+        self.assertTrue(self.Alert.search([('request_id', '=', request.id)]))
+
+    def test_doctor_without_login_is_replaced_by_the_department_manager(self):
+        visit = self._create_visit(self.glucose)
+        request = self._enter(visit, '500')
+        self.Alert._cron_notify()
+        alert = self.Alert.search([('request_id', '=', request.id)])
+        self.assertEqual(alert.state, 'notified')
+        activity = visit.activity_ids.filtered(lambda a: a.summary == "Critical lab result")
+        self.assertEqual(activity.user_id, self.chemist)
+        self.assertIn(self.chemist.partner_id, visit.message_ids[0].partner_ids)
+
+    def test_alert_message_escapes_result_values(self):
+        visit = self._create_visit(self.glucose)
+        request = self._enter(visit, '500')
+        self.Alert.sudo().search([('request_id', '=', request.id)]).write(
+            {'result_value': '<script>alert(1)</script>'})
+        self.Alert._cron_notify()
+        body = visit.message_ids[0].body
+        self.assertNotIn('<script>', body)
+        self.assertIn('&lt;script&gt;', body)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestLabDashboard(MedicalLabCase):
+
+    def _counts(self):
+        data = self.env['account.move'].get_lab_dashboard_data()
+        return {status: entry['count'] for status, entry in data['status_summary'].items()}
+
+    def test_cached_figures_follow_creates_transitions_and_deletes(self):
+        before = self._counts()
+        draft = self._create_visit(post=False)
+        self.assertEqual(self._counts()['draft'], before['draft'] + 1)
+        visit = self._create_visit()
+        self.assertEqual(self._counts()['invoiced'], before['invoiced'] + 1)
+        visit.action_update_sample_collected()
+        counts = self._counts()
+        self.assertEqual(counts['invoiced'], before['invoiced'])
+        self.assertEqual(counts['sample_collected'], before['sample_collected'] + 1)
+        draft.unlink()
+        self.assertEqual(self._counts()['draft'], before['draft'])
+
+    def test_payment_updates_the_amount_due(self):
+        visit = self._create_visit()
+        due = self.env['account.move'].get_lab_dashboard_data()['total_due']
+        self.env['account.payment.register'].with_context(
+            active_model='account.move', active_ids=visit.ids).create({})._create_payments()
+        self.assertIn(visit.payment_state, ('paid', 'in_payment'))
+        self.assertAlmostEqual(self.env['account.move'].get_lab_dashboard_data()['total_due'],
+                               due - visit.amount_total)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from odoo.exceptions import ValidationError
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestDepartmentRules(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestDepartmentRules, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.technician = cls._create_lab_user(
+            'hem_technician', 'medical_lab_management.group_lab_technician', cls.hematology)
+
+    def test_technician_sees_own_department_only(self):
+        visit = self._create_visit()
+        requests = self.env['medical.lab.test.request'].with_user(self.technician).search(
+            [('invoice_id', '=', visit.id)])
+        self.assertEqual(requests.test_id, self.wbc)
+
+    def test_visit_transitions_move_every_department(self):
+        visit = self._create_visit()
+        as_technician = visit.with_user(self.technician)
+        as_technician.action_update_sample_collected()
+        self.assertEqual(set(visit.lab_test_ids.mapped('status')), {'collected'})
+        as_technician.action_start_diagnosis()
+        self.assertEqual(set(visit.lab_test_ids.mapped('status')), {'in_progress'})
+
+    def test_ready_to_print_checks_hidden_departments(self):
+        visit = self._create_visit()
+        visit.action_update_sample_collected()
+        visit.action_start_diagnosis()
+        as_technician = visit.with_user(self.technician)
+        as_technician.lab_test_ids.write({'result_value': '7.2', 'status': 'completed'})
+        with self.assertRaises(ValidationError):
+            as_technician.action_ready_to_print()
+
+        visit.lab_test_ids.filtered(lambda r: r.test_id == self.glucose).write(
+            {'result_value': '95', 'status': 'completed'})
+        as_technician.action_ready_to_print()
+        self.assertEqual(visit.sample_status, 'ready_to_print')
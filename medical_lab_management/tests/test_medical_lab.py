@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestResultEvaluation(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestResultEvaluation, cls).setUpClass()
+        cls.test = cls.env['medical.lab.test'].create({
+            'name': 'Test Glucose',
+            'code': 'TEST_GLU',
+            'sample_type': 'blood',
+            'result_type': 'range',
+        })
+
+    def _add_range(self, **vals):
+        return self.env['medical.lab.test.range'].create(dict({
+            'test_id': self.test.id,
+            'gender': 'all',
+            'min_value': 70.0,
+            'max_value': 100.0,
+        }, **vals))
+
+    def test_range_without_critical_bounds_is_never_critical(self):
+        """Unset critical bounds are stored as 0.0 and must not classify results"""
+        self._add_range()
+        statuses = self.test.evaluate_results([-5, 0, 50, 85, 150, 100000])
+        self.assertNotIn('critical', statuses)
+        self.assertEqual(statuses, ['low', 'low', 'low', 'normal', 'high', 'high'])
+
+    def test_range_with_critical_bounds(self):
+        self._add_range(critical_min=40.0, critical_max=400.0)
+        self.assertEqual(self.test.evaluate_results([30, 50, 85, 150, 500]),
+                         ['critical', 'low', 'normal', 'high', 'critical'])
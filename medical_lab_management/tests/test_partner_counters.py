@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestStoredPartnerCounters(MedicalLabCase):
+
+    def setUp(self):
+        super(TestStoredPartnerCounters, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param(
+            'medical_lab_management.stored_counters', 'True')
+        self.env['res.partner'].rebuild_stored_lab_counters()
+        self.other_patient = self.env['res.partner'].create({'name': 'Other Patient', 'is_patient': True})
+
+    def _counts(self, partner):
+        partner.invalidate_cache()
+        return partner.lab_invoice_count, partner.referred_invoice_count
+
+    def _pending_rows(self):
+        self.env.cr.execute("SELECT COUNT(*) FROM medical_lab_partner_counter_delta")
+        return self.env.cr.fetchone()[0]
+
+    def test_counters_follow_create_write_and_unlink(self):
+        patient_before, _ = self._counts(self.patient)
+        _, doctor_before = self._counts(self.doctor)
+        visit = self._create_visit(post=False)
+        self._create_visit()
+        self.assertEqual(self._counts(self.patient)[0], patient_before + 2)
+        self.assertEqual(self._counts(self.doctor)[1], doctor_before + 2)
+
+        visit.write({'patient_id': self.other_patient.id, 'partner_id': self.other_patient.id})
+        self.assertEqual(self._counts(self.patient)[0], patient_before + 1)
+        self.assertEqual(self._counts(self.other_patient)[0], 1)
+
+        visit.unlink()
+        self.assertEqual(self._counts(self.other_patient)[0], 0)
+        self.assertEqual(self._counts(self.doctor)[1], doctor_before + 1)
+
+    def test_changes_do_not_touch_the_partner_row_until_folded(self):
+        stored = self.doctor.stored_referred_invoice_count
+        self._create_visit()
+        self.doctor.invalidate_cache()
+        self.assertEqual(self.doctor.stored_referred_invoice_count, stored)
+        self.assertTrue(self._pending_rows())
+
+        self.env['res.partner']._cron_fold_invoice_count_deltas()
+        self.assertFalse(self._pending_rows())
+        self.assertEqual(self.doctor.stored_referred_invoice_count, stored + 1)
+        self.assertEqual(self._counts(self.doctor)[1], stored + 1)
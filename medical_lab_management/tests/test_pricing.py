@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestLabPricing(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestLabPricing, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.pricelist = cls.env['product.pricelist'].create({'name': 'Insurance'})
+        Price = cls.env['medical.lab.test.price']
+        Price.create([
+            {'test_id': cls.glucose.id, 'price': 12.0, 'date_start': '2024-01-01'},
+            {'test_id': cls.glucose.id, 'price': 8.0, 'pricelist_id': cls.pricelist.id,
+             'date_start': '2024-01-01', 'date_end': '2024-06-30'},
+        ])
+
+    def _priced_visit(self, invoice_date, patient=None):
+        vals = self._visit_vals(self.wbc | self.glucose, patient)
+        del vals['invoice_line_ids']
+        vals['invoice_date'] = invoice_date
+        visit = self.env['account.move'].create(vals)
+        return {line.name: line.price_unit for line in visit.invoice_line_ids}
+
+    def test_lines_are_created_from_the_catalog(self):
+        self.assertEqual(self._priced_visit('2024-03-01'),
+                         {'White Blood Cells': 20.0, 'Glucose': 12.0})
+
+    def test_pricelist_price_applies_within_its_period(self):
+        self.patient.property_product_pricelist = self.pricelist
+        self.assertEqual(self._priced_visit('2024-03-01')['Glucose'], 8.0)
+        self.assertEqual(self._priced_visit('2024-09-01')['Glucose'], 12.0)
+
+    def test_explicit_lines_are_kept(self):
+        visit = self._create_visit(post=False)
+        self.assertEqual(sorted(visit.invoice_line_ids.mapped('price_unit')), [10.0, 20.0])
+
+    def test_new_price_clears_the_cached_intervals(self):
+        self.env['medical.lab.test.price'].create(
+            {'test_id': self.wbc.id, 'price': 25.0, 'date_start': '2024-01-01'})
+        self.assertEqual(self._priced_visit('2024-03-01')['White Blood Cells'], 25.0)
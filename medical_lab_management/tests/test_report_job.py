@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import base64
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+REPORT = 'medical_lab_management.action_report_lab_results'
+
+
+@tagged('post_install', '-at_install')
+class TestReportJobCache(MedicalLabCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super(TestReportJobCache, cls).setUpClass(chart_template_ref=chart_template_ref)
+        cls.visits = cls._create_visit() | cls._create_visit()
+        cls.Job = cls.env['medical.lab.report.job']
+
+    def _finish(self, job):
+        """Mark a queued job as rendered without running wkhtmltopdf"""
+        attachment = self.env['ir.attachment'].create({
+            'name': 'report.pdf',
+            'datas': base64.b64encode(b'%PDF-1.4'),
+            'res_model': job._name,
+            'res_id': job.id,
+        })
+        job.write({'state': 'done', 'attachment_id': attachment.id})
+
+    def test_records_are_printed_in_id_order(self):
+        job = self.Job.enqueue(REPORT, self.visits[1] | self.visits[0])
+        self.assertEqual(job.res_ids, ','.join(str(i) for i in sorted(self.visits.ids)))
+        self.assertEqual(job.cache_key, self.Job._cache_key(REPORT, self.visits.sorted('id')))
+
+    def test_done_job_is_reused_by_the_same_user(self):
+        job = self.Job.enqueue(REPORT, self.visits)
+        self._finish(job)
+        self.assertEqual(self.Job.enqueue(REPORT, self.visits[1] | self.visits[0]), job)
+
+    def test_done_job_is_not_shared_across_users_or_languages(self):
+        job = self.Job.enqueue(REPORT, self.visits)
+        self._finish(job)
+        other = self._create_lab_user('report_doctor', 'medical_lab_management.group_lab_doctor')
+        self.assertNotEqual(self.Job.with_user(other).enqueue(REPORT, self.visits.with_user(other)), job)
+        self.env['res.lang']._activate_lang('fr_FR')
+        self.assertNotEqual(self.Job.with_context(lang='fr_FR').enqueue(REPORT, self.visits), job)
+
+    def _touch(self, record):
+        """Move ``write_date`` forward; it is the transaction time for every write in a test"""
+        record.flush()
+        self.env.cr.execute(f"UPDATE {record._table} SET write_date = write_date + interval '1 second'"
+                            f" WHERE id = %s", (record.id,))
+        record.invalidate_cache()
+
+    def test_result_and_patient_changes_invalidate_the_key(self):
+        key = self.Job._cache_key(REPORT, self.visits)
+        self._touch(self.visits[0].lab_test_ids[0])
+        changed = self.Job._cache_key(REPORT, self.visits)
+        self.assertNotEqual(changed, key)
+        self._touch(self.patient)
+        self.assertNotEqual(self.Job._cache_key(REPORT, self.visits), changed)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestResultHistory(MedicalLabCase):
+
+    def _glucose_visit(self, collected, value, post=True):
+        visit = self._create_visit(self.glucose, post=post)
+        visit.write({'sample_collection_time': collected})
+        visit.lab_test_ids.write({'result_value': value, 'status': 'completed'})
+        return visit
+
+    def _history(self, requests):
+        return self.env['medical.lab.result.history'].search([('request_id', 'in', requests.ids)])
+
+    def test_previous_value_and_delta(self):
+        self._glucose_visit('2024-01-10 08:00:00', '90')
+        current = self._glucose_visit('2024-02-10 08:00:00', '120').lab_test_ids
+        self.assertEqual(current.previous_result_value, '90')
+        self.assertAlmostEqual(current.result_delta, 30.0)
+        trend = self.env['medical.lab.result.history'].get_trend(self.patient.id, self.glucose.id)
+        self.assertEqual([row['value_text'] for row in trend], ['120', '90'])
+
+    def test_deleted_request_leaves_the_history(self):
+        wrong = self._glucose_visit('2024-01-10 08:00:00', '900').lab_test_ids
+        current = self._glucose_visit('2024-02-10 08:00:00', '120').lab_test_ids
+        self.assertEqual(current.previous_result_value, '900')
+        wrong.unlink()
+        self.assertFalse(self._history(wrong))
+        current.invalidate_cache()
+        self.assertFalse(current.previous_result_value)
+        self.assertEqual(current.result_delta, 0.0)
+
+    def test_deleted_visit_leaves_the_history(self):
+        visit = self._glucose_visit('2024-01-10 08:00:00', '90', post=False)
+        requests = visit.lab_test_ids
+        self.assertTrue(self._history(requests))
+        visit.unlink()
+        self.assertFalse(self._history(requests))
+
+    def test_cleared_result_leaves_the_history(self):
+        requests = self._glucose_visit('2024-01-10 08:00:00', '90').lab_test_ids
+        requests.write({'result_value': False})
+        self.assertFalse(self._history(requests))
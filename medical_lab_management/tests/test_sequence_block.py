@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import tagged
+
+from .common import MedicalLabCase
+
+
+@tagged('post_install', '-at_install')
+class TestSequenceBlock(MedicalLabCase):
+
+    def _create_sequence(self, implementation):
+        return self.env['ir.sequence'].create({
+            'name': f'Block Test {implementation}',
+            'code': f'medical.lab.test.block.{implementation}',
+            'implementation': implementation,
+            'prefix': 'B',
+            'padding': 4,
+            'company_id': False,
+        })
+
+    def test_standard_sequence_reserves_consecutive_values(self):
+        seq = self._create_sequence('standard')
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence.next_block_by_code(seq.code, 3), ['B0001', 'B0002', 'B0003'])
+        self.assertEqual(Sequence.next_by_code(seq.code), 'B0004')
+
+    def test_no_gap_sequence_reserves_consecutive_values(self):
+        seq = self._create_sequence('no_gap')
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence.next_block_by_code(seq.code, 3), ['B0001', 'B0002', 'B0003'])
+        self.assertEqual(seq.number_next_actual, 4)
+        self.assertEqual(Sequence.next_by_code(seq.code), 'B0004')
+
+    def test_empty_or_unknown_blocks(self):
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence.next_block_by_code('medical.lab.barcode', 0), [])
+        self.assertEqual(Sequence.next_block_by_code('medical.lab.no.such.code', 2), [False, False])
+
+    def test_batch_of_visits_gets_distinct_barcodes(self):
+        visits = self.env['account.move'].create([self._visit_vals(self.wbc) for _i in range(5)])
+        barcodes = visits.mapped('barcode_id')
+        self.assertEqual(len(set(barcodes)), 5)
+        self.assertNotIn('/', barcodes)
+
+    def test_batch_of_patients_gets_distinct_ids(self):
+        patients = self.env['res.partner'].create([
+            {'name': f'Batch Patient {n}', 'is_patient': True} for n in range(4)])
+        self.assertEqual(len(set(patients.mapped('patient_id'))), 4)
+        self.assertNotIn('/', patients.mapped('patient_id'))
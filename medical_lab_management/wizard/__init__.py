@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import lab_batch_transition_wizard
+from . import sample_collection_wizard
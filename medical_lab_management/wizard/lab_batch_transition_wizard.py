@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class LabBatchTransitionWizard(models.TransientModel):
+    _name = 'medical.lab.batch.transition.wizard'
+    _description = 'Lab Rack/Batch Status Update'
+
+    action = fields.Selection([
+        ('action_update_sample_collected', 'Sample Collected'),
+        ('action_start_diagnosis', 'Start Diagnosis'),
+        ('action_ready_to_print', 'Ready to Print'),
+        ('action_mark_printed', 'Printed'),
+        ('action_mark_signed', 'Signed'),
+        ('action_mark_done', 'Done'),
+    ], string='Update To', required=True, default='action_start_diagnosis')
+    scanned_barcodes = fields.Text('Scanned Barcodes',
+                                   help='One barcode per line, as sent by the scanner')
+    move_ids = fields.Many2many('account.move', string='Lab Invoices',
+                                domain=[('is_lab_invoice', '=', True)])
+    unknown_barcodes = fields.Text('Unknown Barcodes', readonly=True)
+    result_log = fields.Text('Result', readonly=True)
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super(LabBatchTransitionWizard, self).default_get(fields_list)
+        if self.env.context.get('active_model') == 'account.move':
+            res['move_ids'] = [(6, 0, self.env.context.get('active_ids', []))]
+        return res
+
+    @api.onchange('scanned_barcodes')
+    def _onchange_scanned_barcodes(self):
+        """Resolve all scanned barcodes with one indexed search"""
+        codes = list(dict.fromkeys(
+            line.strip() for line in (self.scanned_barcodes or '').splitlines() if line.strip()
+        ))
+        if not codes:
+            return
+        moves = self.env['account.move'].search([
+            ('is_lab_invoice', '=', True),
+            ('barcode_id', 'in', codes),
+        ])
+        self.move_ids |= moves
+        found = set(moves.mapped('barcode_id'))
+        self.unknown_barcodes = "\n".join(code for code in codes if code not in found) or False
+
+    def action_apply(self):
+        """Run the transition on every valid visit and report the others"""
+        self.ensure_one()
+        moves = self.move_ids
+        failures = moves._lab_transition_failures(self.action)
+        valid = moves.filtered(lambda m: m not in failures)
+        if valid:
+            getattr(valid, self.action)()
+
+        lines = [f"{len(valid)} visit(s) updated."]
+        lines += [f"{move.barcode_id or move.name}: {reason}" for move, reason in failures.items()]
+        self.write({
+            'result_log': "\n".join(lines),
+            'scanned_barcodes': False,
+            'move_ids': [(6, 0, [move.id for move in failures])],
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class SampleCollectionWizard(models.TransientModel):
+    _name = 'medical.lab.sample.collection.wizard'
+    _description = 'Sample Collection Station'
+
+    batch_size = fields.Integer('Send Every (Scans)', default=20, required=True,
+                                help='Scans are sent to the server once this many are queued')
+    flush_seconds = fields.Integer('Send Every (Seconds)', default=2, required=True,
+                                   help='Queued scans are sent at least this often')
+    scanned_barcodes = fields.Text('Scanned Barcodes',
+                                   help='One barcode per line, as sent by the scanner')
+    result_log = fields.Text('Result', readonly=True)
+
+    def action_open_station(self):
+        """Open the full-screen collection station"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'medical_lab_collection_station',
+            'name': 'Sample Collection Station',
+            'params': {
+                'batch_size': max(self.batch_size, 1),
+                'flush_seconds': max(self.flush_seconds, 1),
+            },
+        }
+
+    def action_collect(self):
+        """Collect the pasted barcodes in one batch and report the others"""
+        self.ensure_one()
+        now = fields.Datetime.now()
+        scans = [{'barcode': line.strip(), 'scanned_at': now}
+                 for line in (self.scanned_barcodes or '').splitlines() if line.strip()]
+        outcomes = self.env['account.move'].collect_scanned_samples(scans)
+        collected = [o for o in outcomes if o['result'] == 'collected']
+        lines = [f"{len(collected)} sample(s) collected."]
+        lines += [f"{o['barcode']}: {o['result']}" for o in outcomes if o['result'] != 'collected']
+        self.write({
+            'result_log': "\n".join(lines),
+            'scanned_barcodes': False,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }